@@ -0,0 +1,111 @@
+"""Approximate search against naive enumeration of every pattern variant.
+
+Builds an index over a random sequence, samples patterns from it with a few
+substitutions, and times ``Index.search_approximate_many`` against counting
+every pattern within the mismatch budget with ``Index.count_many``. Both
+must find the same number of occurrences.
+
+    PYTHONPATH=src python benchmarks/approximate_search.py --mismatches 2
+"""
+
+import argparse
+from itertools import combinations, product
+import os
+import random
+import tempfile
+import time
+
+import DNAFMIndex as dfi
+
+LETTERS = "ACGT"
+
+
+def mismatch_variants(pattern: str, max_mismatches: int):
+    yield pattern
+    for num_mismatches in range(1, max_mismatches + 1):
+        for positions in combinations(range(len(pattern)), num_mismatches):
+            choices = [
+                [letter for letter in LETTERS if letter != pattern[i]]
+                for i in positions
+            ]
+            for letters in product(*choices):
+                variant = list(pattern)
+                for i, letter in zip(positions, letters):
+                    variant[i] = letter
+                yield "".join(variant)
+
+
+def sample_patterns(sequence: str, num_patterns: int, length: int, errors: int):
+    patterns = []
+    for _ in range(num_patterns):
+        start = random.randrange(len(sequence) - length)
+        pattern = list(sequence[start : start + length])
+        for i in random.sample(range(length), errors):
+            pattern[i] = random.choice(LETTERS.replace(pattern[i], ""))
+        patterns.append("".join(pattern))
+    return patterns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sequence-length", type=int, default=2_000_000)
+    parser.add_argument("--patterns", type=int, default=200)
+    parser.add_argument("--pattern-length", type=int, default=20)
+    parser.add_argument("--mismatches", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    sequence = "".join(random.choices(LETTERS, k=args.sequence_length))
+    patterns = sample_patterns(
+        sequence, args.patterns, args.pattern_length, args.mismatches
+    )
+    config = dfi.IndexConfiguration(8, 12, 2, True, True)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index = dfi.Index(
+            config, os.path.join(temp_dir, "bench.awfmi"), sequence, num_threads=4
+        )
+
+        start = time.perf_counter()
+        variants = [
+            variant
+            for pattern in patterns
+            for variant in mismatch_variants(pattern, args.mismatches)
+        ]
+        naive_total = sum(index.count_many(variants, num_threads=args.threads))
+        naive_seconds = time.perf_counter() - start
+
+        results = {}
+        for num_threads in sorted({1, args.threads}):
+            start = time.perf_counter()
+            hits = index.search_approximate_many(
+                patterns, args.mismatches, num_threads=num_threads
+            )
+            results[num_threads] = time.perf_counter() - start
+            total = sum(sum(pattern_hits.counts) for pattern_hits in hits)
+            if total != naive_total:
+                raise SystemExit(f"Mismatch: {total} hits, naive {naive_total}")
+
+        start = time.perf_counter()
+        index.search_approximate_many(
+            patterns, max_edits=args.mismatches, num_threads=args.threads
+        )
+        edit_seconds = time.perf_counter() - start
+
+    print(
+        f"{args.patterns} patterns of length {args.pattern_length}, "
+        f"{args.mismatches} errors, {naive_total} occurrences"
+    )
+    print(f"naive enumeration   {len(variants):>9} variants  {naive_seconds:8.3f} s")
+    for num_threads, seconds in results.items():
+        print(
+            f"backtracking        {num_threads:>9} threads   {seconds:8.3f} s"
+            f"  ({naive_seconds / seconds:.1f}x)"
+        )
+    print(f"edit distance       {args.threads:>9} threads   {edit_seconds:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Per-call overhead of the compiled fast paths against the ctypes calls.
+
+Builds a small index over a random genome, so the native work per call is
+tiny, and times single pattern ``find_search_range_for_string``, one kmer
+``count`` and ``locate`` calls and short ``read_sequence_from_file`` reads,
+once through the compiled ``_native`` module and once through ctypes.
+
+    PYTHONPATH=src python benchmarks/native_overhead.py
+"""
+
+import argparse
+from pathlib import Path
+import random
+import tempfile
+import time
+
+import DNAFMIndex as dfi
+from DNAFMIndex import _dna_fm_index_ctypes as _dfi
+
+
+def per_call(repeat: int, func, args: list) -> float:
+    """Return the fastest of ``repeat`` passes over ``args``, per call."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best / len(args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sequence-length", type=int, default=100_000)
+    parser.add_argument("--calls", type=int, default=20_000)
+    parser.add_argument("--kmer-length", type=int, default=12)
+    parser.add_argument("--read-length", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    native = _dfi._native
+    if native is None:
+        raise SystemExit("The compiled fast paths are not built.")
+    rng = random.Random(args.seed)
+    genome = "".join(rng.choices("ACGT", k=args.sequence_length))
+    starts = [
+        rng.randrange(args.sequence_length - args.kmer_length)
+        for _ in range(args.calls)
+    ]
+    kmers = [genome[start : start + args.kmer_length] for start in starts]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config = dfi.IndexConfiguration(8, 8, 2, True, True)
+        index = dfi.Index(config, str(Path(temp_dir) / "overhead.awfmi"), genome)
+        cases = {
+            "find_search_range_for_string": (
+                index.find_search_range_for_string,
+                kmers,
+            ),
+            "count": (index.count, [[kmer] for kmer in kmers]),
+            "locate": (index.locate, [[kmer] for kmer in kmers]),
+            "read_sequence_from_file": (
+                lambda start: index.read_sequence_from_file(start, args.read_length),
+                starts,
+            ),
+        }
+        print(f"{'call':<30} {'ctypes us':>10} {'native us':>10} {'speedup':>8}")
+        for name, (func, call_args) in cases.items():
+            timings = []
+            for module in (None, native):
+                _dfi._native = module
+                timings.append(per_call(args.repeat, func, call_args))
+            print(
+                f"{name:<30} {timings[0] * 1e6:10.2f} {timings[1] * 1e6:10.2f}"
+                f" {timings[0] / timings[1]:7.1f}x"
+            )
+        _dfi._native = native
+        del index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Throughput and peak memory of the Python wrapper on a synthetic genome.
+
+Writes a random genome of ``--sequence-length`` bases, then times building
+the index, loading it with ``read_index_from_file``, single pattern
+``find_search_range_for_string`` calls, ``KmerSearchList.fill``,
+``parallel_search_count`` and ``parallel_search_locate`` for every thread
+count, and ``read_sequence_from_file``, for every suffix array compression
+ratio. Locates are also timed with the suffix array left on disk, read
+straight from the file and through a ``--suffix-array-cache`` MiB page
+cache. Every case runs in a fresh interpreter so its peak RSS is its own.
+
+    PYTHONPATH=src python benchmarks/suite.py --threads 1 4 --json run.json
+    PYTHONPATH=src python benchmarks/suite.py --baseline run.json
+
+With ``--baseline`` the run is compared with an earlier ``--json`` report
+and exits with status 1 if any case got slower than ``--tolerance``.
+"""
+
+import argparse
+import json
+import mmap
+import os
+from pathlib import Path
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import DNAFMIndex as dfi
+
+LETTERS = b"ACGT"
+CHUNK_SIZE = 1 << 20
+
+
+def write_genome(path: Path, length: int, seed: int):
+    rng = random.Random(seed)
+    with open(path, "wb") as genome:
+        for start in range(0, length, CHUNK_SIZE):
+            genome.write(bytes(rng.choices(LETTERS, k=min(CHUNK_SIZE, length - start))))
+
+
+def sample_kmers(genome: bytes, num_kmers: int, length: int, seed: int):
+    rng = random.Random(seed)
+    starts = [rng.randrange(len(genome) - length) for _ in range(num_kmers)]
+    return [genome[start : start + length].decode() for start in starts]
+
+
+def best_of(repeat: int, func):
+    """Return the fastest of ``repeat`` timed calls of ``func``."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_case(case: dict) -> dict:
+    """Time one case in this process, the parent reads the peak RSS."""
+    kind = case["kind"]
+    index_path = case["index_path"]
+    repeat = case["repeat"]
+
+    if kind == "build":
+        config = dfi.IndexConfiguration(
+            case["ratio"], case["seed_kmer_length"], 2, True, True
+        )
+
+        def build():
+            dfi.Index(
+                config,
+                index_path,
+                Path(case["genome_path"]),
+                num_threads=case["threads"],
+            )
+
+        # Building twice is slow and the first build is what users see.
+        return {"seconds": best_of(1, build), "items": case["sequence_length"]}
+
+    if kind == "load":
+        seconds = best_of(repeat, lambda: dfi.read_index_from_file(index_path))
+        return {"seconds": seconds, "items": case["sequence_length"]}
+
+    on_disk = kind in ("locate_on_disk", "locate_sa_cache")
+    index = dfi.read_index_from_file(index_path, not on_disk)
+    if kind == "locate_sa_cache":
+        index.enable_suffix_array_cache(case["suffix_array_cache"] << 20)
+    with open(case["genome_path"], "rb") as genome_file:
+        with mmap.mmap(genome_file.fileno(), 0, access=mmap.ACCESS_READ) as genome:
+            kmers = sample_kmers(
+                genome, case["kmers"], case["kmer_length"], case["seed"]
+            )
+    rng = random.Random(case["seed"])
+    read_length = case["read_length"]
+    starts = [
+        rng.randrange(case["sequence_length"] - read_length)
+        for _ in range(case["kmers"])
+    ]
+
+    if kind == "find_range":
+
+        def find_ranges():
+            for kmer in kmers:
+                index.find_search_range_for_string(kmer)
+
+        seconds = best_of(repeat, find_ranges)
+        return {"seconds": seconds, "items": len(kmers)}
+
+    search_list = dfi.KmerSearchList(len(kmers))
+    if kind == "fill":
+        seconds = best_of(repeat, lambda: search_list.fill(kmers))
+        return {"seconds": seconds, "items": len(kmers)}
+
+    if kind == "count":
+        search_list.fill(kmers)
+        seconds = best_of(
+            repeat,
+            lambda: search_list.parallel_search_count(index, case["threads"]),
+        )
+        return {"seconds": seconds, "items": len(kmers)}
+
+    if kind in ("locate", "locate_on_disk", "locate_sa_cache"):
+
+        def locate():
+            # Locating consumes the loaded kmers.
+            search_list.fill(kmers)
+            search_list.parallel_search_locate(index, case["threads"])
+
+        seconds = best_of(repeat, locate)
+        return {"seconds": seconds, "items": len(kmers)}
+
+    if kind == "read_sequence":
+
+        def read_sequences():
+            for start in starts:
+                index.read_sequence_from_file(start, read_length)
+
+        seconds = best_of(repeat, read_sequences)
+        return {"seconds": seconds, "items": len(starts) * read_length}
+
+    raise ValueError(f"Unknown case {kind}")
+
+
+def spawn_case(case: dict) -> dict:
+    """Run ``case`` in a child interpreter and add its peak RSS."""
+    completed = subprocess.run(
+        [sys.executable, __file__, "--run-case", json.dumps(case)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def case_name(case: dict) -> str:
+    name = f"{case['kind']}[ratio={case['ratio']}"
+    if case["kind"] in (
+        "build",
+        "count",
+        "locate",
+        "locate_on_disk",
+        "locate_sa_cache",
+    ):
+        name += f",threads={case['threads']}"
+    return name + "]"
+
+
+def build_cases(args, genome_path: Path, temp_dir: str):
+    common = {
+        "genome_path": str(genome_path),
+        "sequence_length": args.sequence_length,
+        "seed_kmer_length": args.seed_kmer_length,
+        "kmers": args.kmers,
+        "kmer_length": args.kmer_length,
+        "read_length": args.read_length,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "suffix_array_cache": args.suffix_array_cache,
+    }
+    for ratio in args.compression_ratios:
+        index_path = os.path.join(temp_dir, f"bench_{ratio}.awfmi")
+        with_ratio = dict(common, ratio=ratio, index_path=index_path)
+        yield dict(with_ratio, kind="build", threads=max(args.threads))
+        for kind in ("load", "find_range", "fill"):
+            yield dict(with_ratio, kind=kind)
+        for kind in ("count", "locate"):
+            for num_threads in args.threads:
+                yield dict(with_ratio, kind=kind, threads=num_threads)
+        for kind in ("locate_on_disk", "locate_sa_cache"):
+            yield dict(with_ratio, kind=kind, threads=max(args.threads))
+        yield dict(with_ratio, kind="read_sequence")
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)["results"]
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {ratio:.2f}x slower than the baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sequence-length", type=int, default=4_000_000)
+    parser.add_argument("--compression-ratios", type=int, nargs="+", default=[8, 32])
+    parser.add_argument(
+        "--threads", type=int, nargs="+", default=sorted({1, os.cpu_count()})
+    )
+    parser.add_argument("--seed-kmer-length", type=int, default=12)
+    parser.add_argument("--kmers", type=int, default=100_000)
+    parser.add_argument("--kmer-length", type=int, default=20)
+    parser.add_argument("--read-length", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--suffix-array-cache",
+        type=int,
+        default=4,
+        help="suffix array page cache size in MiB",
+    )
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare with an earlier --json report")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case is not None:
+        result = run_case(json.loads(args.run_case))
+        # ru_maxrss is in KiB on Linux.
+        result["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss << 10
+        print(json.dumps(result))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        genome_path = Path(temp_dir) / "genome.txt"
+        write_genome(genome_path, args.sequence_length, args.seed)
+        print(f"{'case':<36} {'seconds':>9} {'items/s':>12} {'peak RSS':>10}")
+        for case in build_cases(args, genome_path, temp_dir):
+            result = spawn_case(case)
+            results[case_name(case)] = result
+            print(
+                f"{case_name(case):<36} {result['seconds']:9.4f}"
+                f" {result['items'] / result['seconds']:12.4g}"
+                f" {result['peak_rss'] / (1 << 20):7.1f} MiB"
+            )
+
+    if args.json is not None:
+        with open(args.json, "w") as report:
+            json.dump({"arguments": vars(args), "results": results}, report, indent=2)
+    if args.baseline is not None:
+        if regressions := compare(results, args.baseline, args.tolerance):
+            print("\n".join(regressions))
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#include <omp.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include "DfiClockTable.h"
+
+static inline uint64_t hashKey(const uint64_t key) {
+  return key * 0x9E3779B97F4A7C15ULL;
+}
+
+static inline uint32_t *findBucket(struct DfiClockShard *shard,
+                                   const uint64_t key) {
+  // buckets are twice the capacity, the low bits of the hash are weak.
+  return &shard->buckets[(hashKey(key) >> 24) %
+                         (2 * (uint64_t)shard->capacity)];
+}
+
+bool dfiClockTableInit(struct DfiClockTable *table, const uint64_t capacity,
+                       const size_t payloadSize) {
+  if (capacity == 0 ||
+      capacity > (uint64_t)(UINT32_MAX - 1) * DFI_CLOCK_TABLE_MAX_SHARDS) {
+    return false;
+  }
+  // payloads stay 8 byte aligned whatever their size.
+  table->payloadSize = (payloadSize + 7) & ~(size_t)7;
+  table->numShards = capacity < DFI_CLOCK_TABLE_MAX_SHARDS
+                         ? capacity
+                         : DFI_CLOCK_TABLE_MAX_SHARDS;
+  for (size_t i = 0; i < table->numShards; i++) {
+    struct DfiClockShard *shard = &table->shards[i];
+    omp_init_lock(&shard->lock);
+    shard->slots = NULL;
+    shard->payloads = NULL;
+    shard->buckets = NULL;
+    shard->count = 0;
+    shard->clockHand = 0;
+    shard->hits = 0;
+    shard->misses = 0;
+  }
+  for (size_t i = 0; i < table->numShards; i++) {
+    struct DfiClockShard *shard = &table->shards[i];
+    shard->capacity =
+        capacity / table->numShards + (i < capacity % table->numShards);
+    shard->slots = malloc(shard->capacity * sizeof(struct DfiClockSlot));
+    shard->payloads = malloc(shard->capacity * table->payloadSize);
+    shard->buckets = malloc(2 * (size_t)shard->capacity * sizeof(uint32_t));
+    if (shard->slots == NULL || shard->payloads == NULL ||
+        shard->buckets == NULL) {
+      dfiClockTableFree(table);
+      return false;
+    }
+    for (size_t j = 0; j < 2 * (size_t)shard->capacity; j++) {
+      shard->buckets[j] = DFI_CLOCK_TABLE_NO_SLOT;
+    }
+  }
+  return true;
+}
+
+void dfiClockTableFree(struct DfiClockTable *table) {
+  for (size_t i = 0; i < table->numShards; i++) {
+    free(table->shards[i].slots);
+    free(table->shards[i].payloads);
+    free(table->shards[i].buckets);
+    omp_destroy_lock(&table->shards[i].lock);
+  }
+  table->numShards = 0;
+}
+
+struct DfiClockShard *dfiClockTableLock(struct DfiClockTable *table,
+                                        const uint64_t key) {
+  struct DfiClockShard *shard =
+      &table->shards[(hashKey(key) >> 32) % table->numShards];
+  omp_set_lock(&shard->lock);
+  return shard;
+}
+
+void dfiClockTableUnlock(struct DfiClockShard *shard) {
+  omp_unset_lock(&shard->lock);
+}
+
+void *dfiClockTablePayload(const struct DfiClockTable *table,
+                           struct DfiClockShard *shard, const uint32_t slot) {
+  return shard->payloads + slot * table->payloadSize;
+}
+
+// slot of the key in its shard, or DFI_CLOCK_TABLE_NO_SLOT.
+static uint32_t findSlot(struct DfiClockShard *shard, const uint64_t key) {
+  uint32_t slot = *findBucket(shard, key);
+  while (slot != DFI_CLOCK_TABLE_NO_SLOT && shard->slots[slot].key != key) {
+    slot = shard->slots[slot].bucketNext;
+  }
+  return slot;
+}
+
+void *dfiClockTableFind(const struct DfiClockTable *table,
+                        struct DfiClockShard *shard, const uint64_t key) {
+  const uint32_t slot = findSlot(shard, key);
+  if (slot == DFI_CLOCK_TABLE_NO_SLOT) {
+    return NULL;
+  }
+  shard->slots[slot].referenced = true;
+  return dfiClockTablePayload(table, shard, slot);
+}
+
+// removes the slot from the chain of its bucket.
+static void unlinkSlot(struct DfiClockShard *shard, const uint32_t slot) {
+  uint32_t *link = findBucket(shard, shard->slots[slot].key);
+  while (*link != slot) {
+    link = &shard->slots[*link].bucketNext;
+  }
+  *link = shard->slots[slot].bucketNext;
+}
+
+void *dfiClockTableInsert(const struct DfiClockTable *table,
+                          struct DfiClockShard *shard, const uint64_t key,
+                          bool *inserted) {
+  uint32_t slot = findSlot(shard, key);
+  if (slot != DFI_CLOCK_TABLE_NO_SLOT) {
+    // another thread cached the key in the meantime.
+    *inserted = false;
+    return dfiClockTablePayload(table, shard, slot);
+  }
+  if (shard->count < shard->capacity) {
+    slot = shard->count++;
+  } else {
+    // CLOCK eviction: referenced slots get a second chance.
+    while (shard->slots[shard->clockHand].referenced) {
+      shard->slots[shard->clockHand].referenced = false;
+      shard->clockHand = (shard->clockHand + 1) % shard->capacity;
+    }
+    slot = shard->clockHand;
+    shard->clockHand = (shard->clockHand + 1) % shard->capacity;
+    unlinkSlot(shard, slot);
+  }
+  uint32_t *bucket = findBucket(shard, key);
+  shard->slots[slot].key = key;
+  shard->slots[slot].referenced = false;
+  shard->slots[slot].bucketNext = *bucket;
+  *bucket = slot;
+  *inserted = true;
+  return dfiClockTablePayload(table, shard, slot);
+}
@@ -0,0 +1,125 @@
+#ifndef DFI_CLOCK_TABLE_H
+#define DFI_CLOCK_TABLE_H
+
+#include <omp.h>
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+/*
+ * Sharded hash table with CLOCK eviction that backs the shim caches. Keys
+ * are uint64 values, every slot carries a fixed size payload owned by the
+ * cache built on the table. Keys are spread over independently locked
+ * shards, so threads looking up different keys rarely wait on each other.
+ * Every lookup and insert must hold the lock of the key's shard.
+ */
+
+#define DFI_CLOCK_TABLE_MAX_SHARDS 16
+#define DFI_CLOCK_TABLE_NO_SLOT UINT32_MAX
+
+struct DfiClockSlot {
+  uint64_t key;
+  uint32_t bucketNext;
+  bool referenced;
+};
+
+struct DfiClockShard {
+  struct DfiClockSlot *slots;
+  uint8_t *payloads;
+  uint32_t *buckets;
+  uint32_t capacity;
+  uint32_t count;
+  uint32_t clockHand;
+  uint64_t hits;
+  uint64_t misses;
+  omp_lock_t lock;
+};
+
+struct DfiClockTable {
+  size_t payloadSize;
+  size_t numShards;
+  struct DfiClockShard shards[DFI_CLOCK_TABLE_MAX_SHARDS];
+};
+
+/*
+ * Function:  dfiClockTableInit
+ * --------------------
+ * Allocates the shards of a table in place. Capacity is split evenly over
+ * at most DFI_CLOCK_TABLE_MAX_SHARDS shards of at least one slot each, so
+ * the table holds exactly capacity keys.
+ *
+ *  Inputs:
+ *    table: table to initialize.
+ *    capacity: maximum number of keys.
+ *    payloadSize: bytes of payload stored with every key.
+ *
+ *  Returns:
+ *    true on success, false if capacity is 0 or too large, or the
+ *    allocation failed, in which case nothing is left to free.
+ */
+bool dfiClockTableInit(struct DfiClockTable *table, const uint64_t capacity,
+                       const size_t payloadSize);
+
+/*
+ * Function:  dfiClockTableFree
+ * --------------------
+ * Frees the shards of a table initialized with dfiClockTableInit.
+ */
+void dfiClockTableFree(struct DfiClockTable *table);
+
+/*
+ * Function:  dfiClockTableLock
+ * --------------------
+ * Locks the shard of a key and returns it.
+ */
+struct DfiClockShard *dfiClockTableLock(struct DfiClockTable *table,
+                                        const uint64_t key);
+
+/*
+ * Function:  dfiClockTableUnlock
+ * --------------------
+ * Unlocks a shard returned by dfiClockTableLock.
+ */
+void dfiClockTableUnlock(struct DfiClockShard *shard);
+
+/*
+ * Function:  dfiClockTableFind
+ * --------------------
+ * Looks a key up in its locked shard and marks it as referenced.
+ *
+ *  Returns:
+ *    the payload of the key, or NULL if it is not cached.
+ */
+void *dfiClockTableFind(const struct DfiClockTable *table,
+                        struct DfiClockShard *shard, const uint64_t key);
+
+/*
+ * Function:  dfiClockTableInsert
+ * --------------------
+ * Adds a key to its locked shard. When the shard is full the clock hand
+ * evicts the first key not referenced since the hand last passed it. The
+ * new key starts unreferenced.
+ *
+ *  Inputs:
+ *    table: table of the shard.
+ *    shard: locked shard of the key.
+ *    key: key to add.
+ *    inserted: set to false if the key was already cached.
+ *
+ *  Returns:
+ *    the payload of the key, to be filled by the caller if it was inserted.
+ */
+void *dfiClockTableInsert(const struct DfiClockTable *table,
+                          struct DfiClockShard *shard, const uint64_t key,
+                          bool *inserted);
+
+/*
+ * Function:  dfiClockTablePayload
+ * --------------------
+ * Returns the payload of a slot of a locked shard, slots 0 to count - 1 are
+ * in use.
+ */
+void *dfiClockTablePayload(const struct DfiClockTable *table,
+                           struct DfiClockShard *shard, const uint32_t slot);
+
+#endif /* DFI_CLOCK_TABLE_H */
@@ -0,0 +1,765 @@
+#define _GNU_SOURCE
+
+#include <omp.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include "AwFmFile.h"
+#include "AwFmIndex.h"
+#include "AwFmIndexStruct.h"
+#include "AwFmLetter.h"
+#include "AwFmSuffixArray.h"
+#include "DfiIndex.h"
+#include "FastaVector.h"
+#include "divsufsort64.h"
+
+// number of bwt blocks handed to a thread at a time, 256Ki positions.
+#define DFI_BWT_BLOCKS_PER_CHUNK 1024
+#define DFI_BWT_CHUNK_LENGTH                                                   \
+  (DFI_BWT_BLOCKS_PER_CHUNK * AW_FM_POSITIONS_PER_FM_BLOCK)
+// baseOccurrences length of the larger (amino) block.
+#define DFI_MAX_BASE_OCCURRENCES (AW_FM_AMINO_CARDINALITY + 4)
+#define DFI_NUCLEOTIDE_SENTINEL_LETTER_INDEX 5
+#define DFI_AMINO_SENTINEL_LETTER_INDEX 21
+// upper bound on the number of prefix buckets of the external build.
+#define DFI_MAX_PREFIX_BUCKETS (1 << 20)
+#define DFI_MAX_PREFIX_LENGTH 16
+// smallest suffix array partition the external build sorts at once.
+#define DFI_MIN_PARTITION_SUFFIXES (1 << 16)
+
+static inline void reportProgress(const DfiBuildProgressCallback callback,
+                                  void *userData,
+                                  const enum DfiBuildStage stage,
+                                  const uint64_t done, const uint64_t total) {
+  if (callback != NULL) {
+    callback(stage, done, total, userData);
+  }
+}
+
+// frees whatever an unfinished index holds, without touching the file handle
+// that awFmDeallocIndex would fclose.
+static void deallocPartialIndex(struct AwFmIndex *index) {
+  if (index == NULL) {
+    return;
+  }
+  free(index->bwtBlockList.asNucleotide);
+  free(index->prefixSums);
+  free(index->kmerSeedTable);
+  free(index->suffixArray.values);
+  if (index->fastaVector != NULL) {
+    fastaVectorDealloc(index->fastaVector);
+    free(index->fastaVector);
+  }
+  free(index);
+}
+
+static void parallelSequenceSanitize(const uint8_t *_RESTRICT_ const sequence,
+                                     uint8_t *_RESTRICT_ const sanitizedCopy,
+                                     const size_t sequenceLength,
+                                     const enum AwFmAlphabetType alphabetType,
+                                     const int numThreads) {
+  if (alphabetType != AwFmAlphabetAmino) {
+#pragma omp parallel for schedule(static) num_threads(numThreads)
+    for (size_t i = 0; i < sequenceLength; i++) {
+      sanitizedCopy[i] = awFmAsciiNucleotideLetterSanitize(sequence[i]);
+    }
+  } else {
+#pragma omp parallel for schedule(static) num_threads(numThreads)
+    for (size_t i = 0; i < sequenceLength; i++) {
+      sanitizedCopy[i] = awFmAsciiAminoLetterSanitize(sequence[i]);
+    }
+  }
+}
+
+static inline uint8_t bwtLetterIndex(const uint8_t *_RESTRICT_ const sequence,
+                                     const uint64_t suffixArrayValue,
+                                     const bool isAmino) {
+  // the letter before the first character is the sentinel.
+  if (__builtin_expect(suffixArrayValue == 0, 0)) {
+    return isAmino ? DFI_AMINO_SENTINEL_LETTER_INDEX
+                   : DFI_NUCLEOTIDE_SENTINEL_LETTER_INDEX;
+  }
+  const uint8_t letter = sequence[suffixArrayValue - 1];
+  return isAmino ? awFmAsciiAminoAcidToLetterIndex(letter)
+                 : awFmAsciiNucleotideToLetterIndex(letter);
+}
+
+// suffixArray holds the values of bwt positions [start, end).
+static void countBwtLetters(const struct AwFmIndex *_RESTRICT_ const index,
+                            const uint8_t *_RESTRICT_ const sequence,
+                            const uint64_t *_RESTRICT_ const suffixArray,
+                            const uint64_t start, const uint64_t end,
+                            uint64_t *_RESTRICT_ const occurrences) {
+  const bool isAmino = index->config.alphabetType == AwFmAlphabetAmino;
+  for (uint64_t position = start; position < end; position++) {
+    occurrences[bwtLetterIndex(sequence, suffixArray[position - start],
+                               isAmino)]++;
+  }
+}
+
+// same block layout as setBwtAndPrefixSums in AwFmCreate.c, for the bwt
+// positions [start, end), starting from the given letter occurrences.
+// suffixArray holds the values of these positions.
+static void fillBwtRange(struct AwFmIndex *_RESTRICT_ const index,
+                         const uint8_t *_RESTRICT_ const sequence,
+                         const uint64_t *_RESTRICT_ const suffixArray,
+                         const uint64_t start, const uint64_t end,
+                         uint64_t *_RESTRICT_ const occurrences) {
+  const bool isAmino = index->config.alphabetType == AwFmAlphabetAmino;
+  const size_t numBaseOccurrences = isAmino
+                                        ? AW_FM_AMINO_CARDINALITY + 4
+                                        : AW_FM_NUCLEOTIDE_CARDINALITY + 4;
+  const uint8_t vectorsPerWindow = isAmino
+                                       ? AW_FM_AMINO_VECTORS_PER_WINDOW
+                                       : AW_FM_NUCLEOTIDE_VECTORS_PER_WINDOW;
+
+  for (uint64_t position = start; position < end; position++) {
+    const size_t blockIndex = position / AW_FM_POSITIONS_PER_FM_BLOCK;
+    const uint8_t positionInBlock = position % AW_FM_POSITIONS_PER_FM_BLOCK;
+    const uint8_t byteInVector = positionInBlock / 8;
+    const uint8_t bitInVectorByte = positionInBlock % 8;
+    uint8_t *letterBitVectorBytes;
+    uint64_t *baseOccurrences;
+    if (isAmino) {
+      struct AwFmAminoBlock *block = &index->bwtBlockList.asAmino[blockIndex];
+      letterBitVectorBytes = (uint8_t *)block->letterBitVectors;
+      baseOccurrences = block->baseOccurrences;
+    } else {
+      struct AwFmNucleotideBlock *block =
+          &index->bwtBlockList.asNucleotide[blockIndex];
+      letterBitVectorBytes = (uint8_t *)block->letterBitVectors;
+      baseOccurrences = block->baseOccurrences;
+    }
+
+    if (__builtin_expect(positionInBlock == 0, 0)) {
+      memcpy(baseOccurrences, occurrences,
+             numBaseOccurrences * sizeof(uint64_t));
+      memset(letterBitVectorBytes, 0,
+             sizeof(AwFmSimdVec256) * vectorsPerWindow);
+    }
+
+    const uint8_t letterIndex =
+        bwtLetterIndex(sequence, suffixArray[position - start], isAmino);
+    const uint8_t letterAsCompressedVector =
+        isAmino ? awFmAminoAcidLetterIndexToCompressedVector(letterIndex)
+                : awFmNucleotideLetterIndexToCompressedVector(letterIndex);
+    occurrences[letterIndex]++;
+    for (uint8_t vector = 0; vector < vectorsPerWindow; vector++) {
+      letterBitVectorBytes[byteInVector + 32 * vector] |=
+          ((letterAsCompressedVector >> vector) & 0x1) << bitInVectorByte;
+    }
+  }
+}
+
+// fills the bwt positions [start, end) from their suffix array values,
+// starting from and updating the letter occurrences before start.
+static bool parallelFillBwt(struct AwFmIndex *_RESTRICT_ const index,
+                            const uint8_t *_RESTRICT_ const sequence,
+                            const uint64_t *_RESTRICT_ const suffixArray,
+                            const uint64_t start, const uint64_t end,
+                            uint64_t *_RESTRICT_ const occurrences,
+                            const int numThreads,
+                            const DfiBuildProgressCallback callback,
+                            void *userData) {
+  const size_t numChunks = 1 + (end - start - 1) / DFI_BWT_CHUNK_LENGTH;
+
+  // row c + 1 first counts the letters in chunk c, and is then turned into
+  // the letter occurrences before chunk c + 1. The last row ends up holding
+  // the occurrences before end.
+  uint64_t(*chunkOccurrences)[DFI_MAX_BASE_OCCURRENCES] =
+      calloc(numChunks + 1, sizeof(*chunkOccurrences));
+  if (chunkOccurrences == NULL) {
+    return false;
+  }
+  memcpy(chunkOccurrences[0], occurrences, sizeof(*chunkOccurrences));
+
+#pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+  for (size_t chunk = 0; chunk < numChunks; chunk++) {
+    const uint64_t chunkStart = start + chunk * DFI_BWT_CHUNK_LENGTH;
+    const uint64_t chunkEnd = chunkStart + DFI_BWT_CHUNK_LENGTH < end
+                                  ? chunkStart + DFI_BWT_CHUNK_LENGTH
+                                  : end;
+    countBwtLetters(index, sequence, suffixArray + (chunkStart - start),
+                    chunkStart, chunkEnd, chunkOccurrences[chunk + 1]);
+  }
+  for (size_t chunk = 1; chunk <= numChunks; chunk++) {
+    for (size_t letter = 0; letter < DFI_MAX_BASE_OCCURRENCES; letter++) {
+      chunkOccurrences[chunk][letter] += chunkOccurrences[chunk - 1][letter];
+    }
+  }
+  memcpy(occurrences, chunkOccurrences[numChunks], sizeof(*chunkOccurrences));
+
+  size_t chunksDone = 0;
+#pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+  for (size_t chunk = 0; chunk < numChunks; chunk++) {
+    const uint64_t chunkStart = start + chunk * DFI_BWT_CHUNK_LENGTH;
+    const uint64_t chunkEnd = chunkStart + DFI_BWT_CHUNK_LENGTH < end
+                                  ? chunkStart + DFI_BWT_CHUNK_LENGTH
+                                  : end;
+    fillBwtRange(index, sequence, suffixArray + (chunkStart - start),
+                 chunkStart, chunkEnd, chunkOccurrences[chunk]);
+
+    size_t done;
+#pragma omp atomic capture
+    done = ++chunksDone;
+    // only the calling thread reports, so the callback never runs on an
+    // OpenMP worker thread. Progress is counted in bwt positions.
+    if (omp_get_thread_num() == 0 && done < numChunks) {
+      reportProgress(callback, userData, DfiBuildStageBwt,
+                     start + done * DFI_BWT_CHUNK_LENGTH, index->bwtLength);
+    }
+  }
+  reportProgress(callback, userData, DfiBuildStageBwt, end, index->bwtLength);
+
+  free(chunkOccurrences);
+  return true;
+}
+
+// sets the prefix sums from the letter occurrences of the whole bwt, the
+// sentinel counts towards the a's.
+static void setPrefixSums(struct AwFmIndex *_RESTRICT_ const index,
+                          uint64_t *_RESTRICT_ const totals) {
+  const uint8_t cardinality =
+      awFmGetAlphabetCardinality(index->config.alphabetType);
+  index->prefixSums[0] = 1;
+  totals[0]++;
+  for (uint8_t i = 1; i < cardinality + 2; i++) {
+    index->prefixSums[i] = totals[i - 1];
+    totals[i] += totals[i - 1];
+  }
+}
+
+static void populateKmerSeedTableRecursive(
+    struct AwFmIndex *_RESTRICT_ const index, struct AwFmSearchRange range,
+    const size_t currentKmerLength, const uint64_t currentKmerIndex,
+    const uint64_t letterIndexMultiplier) {
+  const uint8_t alphabetSize =
+      awFmGetAlphabetCardinality(index->config.alphabetType);
+
+  if (index->config.kmerLengthInSeedTable == currentKmerLength) {
+    index->kmerSeedTable[currentKmerIndex] = range;
+    return;
+  }
+
+  for (uint8_t extendedLetter = 0; extendedLetter < alphabetSize;
+       extendedLetter++) {
+    struct AwFmSearchRange newRange = range;
+    if (index->config.alphabetType != AwFmAlphabetAmino) {
+      awFmNucleotideIterativeStepBackwardSearch(index, &newRange,
+                                                extendedLetter);
+    } else {
+      awFmAminoIterativeStepBackwardSearch(index, &newRange, extendedLetter);
+    }
+    populateKmerSeedTableRecursive(
+        index, newRange, currentKmerLength + 1,
+        currentKmerIndex + extendedLetter * letterIndexMultiplier,
+        letterIndexMultiplier * alphabetSize);
+  }
+}
+
+// the subtrees below every two letter suffix are independent, so they are
+// filled in parallel.
+static void parallelPopulateKmerSeedTable(
+    struct AwFmIndex *_RESTRICT_ const index, const int numThreads,
+    const DfiBuildProgressCallback callback, void *userData) {
+  const uint8_t cardinality =
+      awFmGetAlphabetCardinality(index->config.alphabetType);
+
+  if (index->config.kmerLengthInSeedTable < 2) {
+    for (uint8_t i = 0; i < cardinality; i++) {
+      struct AwFmSearchRange range = {.startPtr = index->prefixSums[i],
+                                      .endPtr = index->prefixSums[i + 1] - 1};
+      populateKmerSeedTableRecursive(index, range, 1, i, cardinality);
+    }
+    reportProgress(callback, userData, DfiBuildStageKmerSeedTable, 1, 1);
+    return;
+  }
+
+  const size_t numPrefixes = (size_t)cardinality * cardinality;
+  size_t prefixesDone = 0;
+#pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+  for (size_t prefix = 0; prefix < numPrefixes; prefix++) {
+    const uint8_t lastLetter = prefix % cardinality;
+    const uint8_t extendedLetter = prefix / cardinality;
+    struct AwFmSearchRange range = {.startPtr = index->prefixSums[lastLetter],
+                                    .endPtr =
+                                        index->prefixSums[lastLetter + 1] - 1};
+    if (index->config.alphabetType != AwFmAlphabetAmino) {
+      awFmNucleotideIterativeStepBackwardSearch(index, &range, extendedLetter);
+    } else {
+      awFmAminoIterativeStepBackwardSearch(index, &range, extendedLetter);
+    }
+    populateKmerSeedTableRecursive(index, range, 2, prefix,
+                                   (uint64_t)cardinality * cardinality);
+
+    size_t done;
+#pragma omp atomic capture
+    done = ++prefixesDone;
+    if (omp_get_thread_num() == 0 && done < numPrefixes) {
+      reportProgress(callback, userData, DfiBuildStageKmerSeedTable, done,
+                     numPrefixes);
+    }
+  }
+  reportProgress(callback, userData, DfiBuildStageKmerSeedTable, numPrefixes,
+                 numPrefixes);
+}
+
+// builds the bwt, prefix sums and compressed suffix array with divsufsort64
+// and a full in memory suffix array.
+static enum AwFmReturnCode
+buildInMemory(struct AwFmIndex *_RESTRICT_ const index,
+              uint8_t *_RESTRICT_ const sanitizedSequence, const int numThreads,
+              const DfiBuildProgressCallback callback, void *userData) {
+  const uint64_t bwtLength = index->bwtLength;
+  uint64_t *suffixArray = malloc(bwtLength * sizeof(uint64_t));
+  if (suffixArray == NULL) {
+    return AwFmAllocationFailure;
+  }
+
+  // divsufsort64 is built with OpenMP and sorts the type B* substrings with
+  // as many threads as the current OpenMP setting allows.
+  reportProgress(callback, userData, DfiBuildStageSuffixArray, 0, 1);
+  const int previousNumThreads = omp_get_max_threads();
+  omp_set_num_threads(numThreads);
+  const int64_t divSufSortReturnCode =
+      divsufsort64(sanitizedSequence, (int64_t *)suffixArray, bwtLength);
+  omp_set_num_threads(previousNumThreads);
+  if (divSufSortReturnCode < 0) {
+    free(suffixArray);
+    return AwFmSuffixArrayCreationFailure;
+  }
+  reportProgress(callback, userData, DfiBuildStageSuffixArray, 1, 1);
+
+  uint64_t occurrences[DFI_MAX_BASE_OCCURRENCES] = {0};
+  if (!parallelFillBwt(index, sanitizedSequence, suffixArray, 0, bwtLength,
+                       occurrences, numThreads, callback, userData)) {
+    free(suffixArray);
+    return AwFmAllocationFailure;
+  }
+  setPrefixSums(index, occurrences);
+
+  reportProgress(callback, userData, DfiBuildStageCompressSuffixArray, 0, 1);
+  enum AwFmReturnCode returnCode = awFmInitCompressedSuffixArray(
+      suffixArray, bwtLength, &index->suffixArray,
+      index->config.suffixArrayCompressionRatio);
+  if (returnCode != AwFmSuccess) {
+    free(suffixArray);
+    return returnCode;
+  }
+  reportProgress(callback, userData, DfiBuildStageCompressSuffixArray, 1, 1);
+  return AwFmSuccess;
+}
+
+struct DfiSuffixSortContext {
+  const uint8_t *sequence;
+  uint64_t length;
+  uint8_t prefixLength;
+};
+
+// compares two suffixes of the same prefix bucket. Their first prefixLength
+// letters are equal, and the unique sentinel makes every comparison end
+// before either suffix runs out.
+static int compareBucketSuffixes(const void *a, const void *b,
+                                 void *contextPtr) {
+  const struct DfiSuffixSortContext *context = contextPtr;
+  const uint64_t i = *(const uint64_t *)a + context->prefixLength;
+  const uint64_t j = *(const uint64_t *)b + context->prefixLength;
+  const uint64_t remaining = context->length - (i > j ? i : j);
+  const int comparison =
+      memcmp(context->sequence + i, context->sequence + j, remaining);
+  if (comparison != 0) {
+    return comparison;
+  }
+  return i > j ? -1 : 1;
+}
+
+// bucket of the suffix at position, from the ranks of its first prefixLength
+// letters. Positions past the end count as rank 0. Buckets are numbered in
+// the lexicographic order of their prefixes.
+static inline uint64_t prefixBucket(const uint8_t *_RESTRICT_ const sequence,
+                                    const uint64_t length,
+                                    const uint64_t position,
+                                    const uint8_t *_RESTRICT_ const ranks,
+                                    const uint8_t prefixLength,
+                                    const uint64_t numSymbols) {
+  uint64_t bucket = 0;
+  for (uint8_t i = 0; i < prefixLength; i++) {
+    const uint64_t letterPosition = position + i;
+    bucket = bucket * numSymbols +
+             (letterPosition < length ? ranks[sequence[letterPosition]] : 0);
+  }
+  return bucket;
+}
+
+static FILE *openTemporaryFile(const char *tempDir) {
+  const char *directory = tempDir != NULL ? tempDir : "/tmp";
+  const char *name = "/dfiSuffixArrayXXXXXX";
+  char *path = malloc(strlen(directory) + strlen(name) + 1);
+  if (path == NULL) {
+    return NULL;
+  }
+  strcpy(path, directory);
+  strcat(path, name);
+  const int fileDescriptor = mkstemp(path);
+  if (fileDescriptor < 0) {
+    free(path);
+    return NULL;
+  }
+  // unlinked right away, so the file is removed however the build ends.
+  unlink(path);
+  free(path);
+  FILE *file = fdopen(fileDescriptor, "w+b");
+  if (file == NULL) {
+    close(fileDescriptor);
+  }
+  return file;
+}
+
+// ors a value into a zeroed compressed suffix array, with the bit layout
+// awFmInitCompressedSuffixArray writes.
+static void setCompressedSuffixArrayValue(
+    struct AwFmCompressedSuffixArray *_RESTRICT_ const suffixArray,
+    const size_t sampleIndex, uint64_t value) {
+  struct AwFmSuffixArrayOffset offset = awFmGetOffsetIntoSuffixArrayByteArray(
+      suffixArray->valueBitWidth, sampleIndex);
+  suffixArray->values[offset.byteOffset++] |=
+      (value << offset.bitOffset) & 0xFF;
+  int bitsRemaining = suffixArray->valueBitWidth - (8 - offset.bitOffset);
+  value >>= 8 - offset.bitOffset;
+  while (bitsRemaining > 0) {
+    suffixArray->values[offset.byteOffset++] |= value & 0xFF;
+    value >>= 8;
+    bitsRemaining -= 8;
+  }
+}
+
+// sorts the suffixes one partition of prefix buckets at a time, so at most
+// about partitionCapacity suffix array values are held in memory, and
+// appends every sorted partition to file. A single bucket larger than the
+// partition capacity is still sorted in one piece.
+static enum AwFmReturnCode writePartitionedSuffixArray(
+    const uint8_t *_RESTRICT_ const sequence, const uint64_t length,
+    uint64_t **buffer, uint64_t *bufferCapacity, FILE *file,
+    const uint8_t *_RESTRICT_ const ranks, const uint64_t numSymbols,
+    const uint8_t prefixLength, const uint64_t numBuckets,
+    const int numThreads, const DfiBuildProgressCallback callback,
+    void *userData) {
+  uint64_t *bucketCounts = calloc(numBuckets, sizeof(uint64_t));
+  uint64_t *bucketCursors = malloc(numBuckets * sizeof(uint64_t));
+  if (bucketCounts == NULL || bucketCursors == NULL) {
+    free(bucketCounts);
+    free(bucketCursors);
+    return AwFmAllocationFailure;
+  }
+
+#pragma omp parallel for schedule(static) num_threads(numThreads)
+  for (uint64_t position = 0; position < length; position++) {
+    const uint64_t bucket = prefixBucket(sequence, length, position, ranks,
+                                         prefixLength, numSymbols);
+#pragma omp atomic
+    bucketCounts[bucket]++;
+  }
+
+  const struct DfiSuffixSortContext context = {
+      .sequence = sequence, .length = length, .prefixLength = prefixLength};
+  enum AwFmReturnCode returnCode = AwFmSuccess;
+  uint64_t sortedSuffixes = 0;
+  uint64_t lastBucket;
+  for (uint64_t firstBucket = 0; firstBucket < numBuckets;
+       firstBucket = lastBucket) {
+    uint64_t partitionLength = 0;
+    lastBucket = firstBucket;
+    while (lastBucket < numBuckets &&
+           (lastBucket == firstBucket ||
+            partitionLength + bucketCounts[lastBucket] <= *bufferCapacity)) {
+      bucketCursors[lastBucket] = partitionLength;
+      partitionLength += bucketCounts[lastBucket++];
+    }
+    if (partitionLength == 0) {
+      continue;
+    }
+    if (partitionLength > *bufferCapacity) {
+      uint64_t *grownBuffer =
+          realloc(*buffer, partitionLength * sizeof(uint64_t));
+      if (grownBuffer == NULL) {
+        returnCode = AwFmAllocationFailure;
+        break;
+      }
+      *buffer = grownBuffer;
+      *bufferCapacity = partitionLength;
+    }
+    uint64_t *partition = *buffer;
+
+#pragma omp parallel for schedule(static) num_threads(numThreads)
+    for (uint64_t position = 0; position < length; position++) {
+      const uint64_t bucket = prefixBucket(sequence, length, position, ranks,
+                                           prefixLength, numSymbols);
+      if (bucket >= firstBucket && bucket < lastBucket) {
+        uint64_t slot;
+#pragma omp atomic capture
+        slot = bucketCursors[bucket]++;
+        partition[slot] = position;
+      }
+    }
+
+    // the cursors now point at the end of their buckets.
+#pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+    for (uint64_t bucket = firstBucket; bucket < lastBucket; bucket++) {
+      if (bucketCounts[bucket] > 1) {
+        qsort_r(partition + bucketCursors[bucket] - bucketCounts[bucket],
+                bucketCounts[bucket], sizeof(uint64_t), compareBucketSuffixes,
+                (void *)&context);
+      }
+    }
+
+    if (fwrite(partition, sizeof(uint64_t), partitionLength, file) !=
+        partitionLength) {
+      returnCode = AwFmFileWriteFail;
+      break;
+    }
+    sortedSuffixes += partitionLength;
+    reportProgress(callback, userData, DfiBuildStageSuffixArray,
+                   sortedSuffixes, length);
+  }
+
+  free(bucketCounts);
+  free(bucketCursors);
+  return returnCode;
+}
+
+// builds the bwt, prefix sums and compressed suffix array without ever
+// holding the full suffix array. The suffix array is sorted in partitions
+// of prefix buckets sized to fit memoryLimit, spilled to a temporary file
+// in tempDir, and streamed back in to fill the bwt and the sampled suffix
+// array.
+static enum AwFmReturnCode
+buildExternal(struct AwFmIndex *_RESTRICT_ const index,
+              const uint8_t *_RESTRICT_ const sanitizedSequence,
+              const int numThreads, const uint64_t memoryLimit,
+              const char *tempDir, const DfiBuildProgressCallback callback,
+              void *userData) {
+  const uint64_t bwtLength = index->bwtLength;
+  const uint8_t samplingRatio = index->config.suffixArrayCompressionRatio;
+
+  // rank the letters that occur in the sequence in byte order, the same
+  // order divsufsort64 sorts by.
+  bool letterPresent[256] = {false};
+#pragma omp parallel num_threads(numThreads)
+  {
+    bool threadLetterPresent[256] = {false};
+#pragma omp for schedule(static)
+    for (uint64_t position = 0; position < bwtLength; position++) {
+      threadLetterPresent[sanitizedSequence[position]] = true;
+    }
+#pragma omp critical(dfiLetterPresent)
+    for (size_t letter = 0; letter < 256; letter++) {
+      letterPresent[letter] |= threadLetterPresent[letter];
+    }
+  }
+  uint8_t ranks[256] = {0};
+  uint64_t numSymbols = 0;
+  for (size_t letter = 0; letter < 256; letter++) {
+    if (letterPresent[letter]) {
+      ranks[letter] = numSymbols++;
+    }
+  }
+  uint8_t prefixLength = 1;
+  uint64_t numBuckets = numSymbols;
+  while (prefixLength < DFI_MAX_PREFIX_LENGTH &&
+         numBuckets * numSymbols <= DFI_MAX_PREFIX_BUCKETS) {
+    numBuckets *= numSymbols;
+    prefixLength++;
+  }
+
+  // whatever the limit leaves after the sanitized sequence, bwt, seed table,
+  // compressed suffix array and bucket arrays goes to the partition buffer.
+  const size_t bytesPerBwtBlock =
+      index->config.alphabetType == AwFmAlphabetAmino
+          ? sizeof(struct AwFmAminoBlock)
+          : sizeof(struct AwFmNucleotideBlock);
+  const size_t compressedByteLength =
+      awFmComputeCompressedSaSizeInBytes(bwtLength, samplingRatio);
+  const uint64_t fixedBytes =
+      bwtLength + awFmNumBlocksFromBwtLength(bwtLength) * bytesPerBwtBlock +
+      awFmGetKmerTableLength(index) * sizeof(struct AwFmSearchRange) +
+      compressedByteLength + 2 * numBuckets * sizeof(uint64_t);
+  uint64_t bufferCapacity = memoryLimit > fixedBytes
+                                ? (memoryLimit - fixedBytes) / sizeof(uint64_t)
+                                : 0;
+  if (bufferCapacity < DFI_MIN_PARTITION_SUFFIXES) {
+    bufferCapacity = DFI_MIN_PARTITION_SUFFIXES;
+  }
+  if (bufferCapacity > bwtLength) {
+    bufferCapacity = bwtLength;
+  }
+
+  uint64_t *buffer = malloc(bufferCapacity * sizeof(uint64_t));
+  if (buffer == NULL) {
+    return AwFmAllocationFailure;
+  }
+  FILE *file = openTemporaryFile(tempDir);
+  if (file == NULL) {
+    free(buffer);
+    return AwFmFileOpenFail;
+  }
+
+  reportProgress(callback, userData, DfiBuildStageSuffixArray, 0, bwtLength);
+  enum AwFmReturnCode returnCode = writePartitionedSuffixArray(
+      sanitizedSequence, bwtLength, &buffer, &bufferCapacity, file, ranks,
+      numSymbols, prefixLength, numBuckets, numThreads, callback, userData);
+  if (returnCode != AwFmSuccess) {
+    free(buffer);
+    fclose(file);
+    return returnCode;
+  }
+
+  index->suffixArray.valueBitWidth =
+      awFmComputeSuffixArrayValueMinWidth(bwtLength);
+  index->suffixArray.compressedByteLength = compressedByteLength;
+  index->suffixArray.values = calloc(compressedByteLength, 1);
+  if (index->suffixArray.values == NULL) {
+    free(buffer);
+    fclose(file);
+    return AwFmAllocationFailure;
+  }
+
+  reportProgress(callback, userData, DfiBuildStageCompressSuffixArray, 0, 1);
+  const size_t numSamples =
+      awFmGetSampledSuffixArrayLength(bwtLength, samplingRatio);
+  uint64_t occurrences[DFI_MAX_BASE_OCCURRENCES] = {0};
+  rewind(file);
+  for (uint64_t start = 0; start < bwtLength; start += bufferCapacity) {
+    const uint64_t end =
+        start + bufferCapacity < bwtLength ? start + bufferCapacity : bwtLength;
+    if (fread(buffer, sizeof(uint64_t), end - start, file) != end - start) {
+      returnCode = AwFmFileReadFail;
+      break;
+    }
+    if (!parallelFillBwt(index, sanitizedSequence, buffer, start, end,
+                         occurrences, numThreads, callback, userData)) {
+      returnCode = AwFmAllocationFailure;
+      break;
+    }
+    const uint64_t firstSample =
+        (start + samplingRatio - 1) / samplingRatio * samplingRatio;
+    for (uint64_t position = firstSample;
+         position < end && position / samplingRatio < numSamples;
+         position += samplingRatio) {
+      setCompressedSuffixArrayValue(&index->suffixArray,
+                                    position / samplingRatio,
+                                    buffer[position - start]);
+    }
+  }
+  free(buffer);
+  fclose(file);
+  if (returnCode != AwFmSuccess) {
+    return returnCode;
+  }
+  setPrefixSums(index, occurrences);
+  reportProgress(callback, userData, DfiBuildStageCompressSuffixArray, 1, 1);
+  return AwFmSuccess;
+}
+
+enum AwFmReturnCode
+dfiCreateIndex(struct AwFmIndex *_RESTRICT_ *index,
+               const struct AwFmIndexConfiguration *_RESTRICT_ const config,
+               const uint8_t *sequence, size_t sequenceLength,
+               const char *fastaSrc, const char *_RESTRICT_ const fileSrc,
+               uint32_t numThreads, const uint64_t memoryLimit,
+               const char *tempDir, const DfiBuildProgressCallback callback,
+               void *userData) {
+  if (config == NULL || fileSrc == NULL) {
+    return AwFmNullPtrError;
+  }
+  if (sequence == NULL && fastaSrc == NULL) {
+    return AwFmNullPtrError;
+  }
+  *index = NULL;
+  if (numThreads == 0) {
+    numThreads = omp_get_max_threads();
+  }
+
+  struct FastaVector *fastaVector = NULL;
+  if (fastaSrc != NULL) {
+    fastaVector = malloc(sizeof(struct FastaVector));
+    if (fastaVector == NULL) {
+      return AwFmAllocationFailure;
+    }
+    if (fastaVectorInit(fastaVector) == FASTA_VECTOR_ALLOCATION_FAIL) {
+      free(fastaVector);
+      return AwFmAllocationFailure;
+    }
+    enum FastaVectorReturnCode fastaVectorReturnCode =
+        fastaVectorReadFasta(fastaSrc, fastaVector);
+    if (fastaVectorReturnCode != FASTA_VECTOR_OK) {
+      fastaVectorDealloc(fastaVector);
+      free(fastaVector);
+      return fastaVectorReturnCode == FASTA_VECTOR_FILE_OPEN_FAIL
+                 ? AwFmFileOpenFail
+                 : AwFmAllocationFailure;
+    }
+    sequence = (const uint8_t *)fastaVector->sequence.charData;
+    sequenceLength = fastaVector->sequence.count;
+  }
+
+  const size_t bwtLength = sequenceLength + 1;
+  reportProgress(callback, userData, DfiBuildStageSanitize, 0, 1);
+  uint8_t *sanitizedSequenceCopy = malloc(bwtLength);
+  struct AwFmIndex *indexData = awFmIndexAlloc(config, bwtLength);
+  if (sanitizedSequenceCopy == NULL || indexData == NULL) {
+    free(sanitizedSequenceCopy);
+    deallocPartialIndex(indexData);
+    if (fastaVector != NULL) {
+      fastaVectorDealloc(fastaVector);
+      free(fastaVector);
+    }
+    return AwFmAllocationFailure;
+  }
+  indexData->versionNumber = AW_FM_CURRENT_VERSION_NUMBER;
+  indexData->featureFlags =
+      fastaVector != NULL ? 1 << AW_FM_FEATURE_FLAG_BIT_FASTA_VECTOR : 0;
+  indexData->fastaVector = fastaVector;
+  indexData->suffixArray.values = NULL;
+
+  parallelSequenceSanitize(sequence, sanitizedSequenceCopy, sequenceLength,
+                           config->alphabetType, numThreads);
+  sanitizedSequenceCopy[bwtLength - 1] = '$';
+  reportProgress(callback, userData, DfiBuildStageSanitize, 1, 1);
+
+  enum AwFmReturnCode returnCode =
+      memoryLimit == 0
+          ? buildInMemory(indexData, sanitizedSequenceCopy, numThreads,
+                          callback, userData)
+          : buildExternal(indexData, sanitizedSequenceCopy, numThreads,
+                          memoryLimit, tempDir, callback, userData);
+  // after generating the bwt, the sequence copy is no longer needed.
+  free(sanitizedSequenceCopy);
+  if (returnCode != AwFmSuccess) {
+    deallocPartialIndex(indexData);
+    return returnCode;
+  }
+
+  parallelPopulateKmerSeedTable(indexData, numThreads, callback, userData);
+
+  indexData->suffixArrayFileOffset = awFmGetSuffixArrayFileOffset(indexData);
+  indexData->sequenceFileOffset = awFmGetSequenceFileOffset(indexData);
+
+  reportProgress(callback, userData, DfiBuildStageWriteFile, 0, 1);
+  returnCode =
+      awFmWriteIndexToFile(indexData, sequence, sequenceLength, fileSrc);
+  reportProgress(callback, userData, DfiBuildStageWriteFile, 1, 1);
+
+  if (!config->keepSuffixArrayInMemory) {
+    free(indexData->suffixArray.values);
+    indexData->suffixArray.values = NULL;
+  }
+  if (fastaVector != NULL && !config->storeOriginalSequence) {
+    fastaVectorStringDealloc(&fastaVector->sequence);
+  }
+
+  *index = indexData;
+  return returnCode;
+}
@@ -0,0 +1,1008 @@
+#ifndef DFI_INDEX_H
+#define DFI_INDEX_H
+
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include "AwFmIndex.h"
+
+/*
+ * Native helpers for the DNAFMIndex Python wrapper.
+ *
+ * These functions are compiled into libawfmindex alongside the
+ * AvxWindowFmIndex sources and operate on the same structs. They exist to
+ * move per-element work out of Python, so every function here handles a
+ * whole search list (or a whole batch of queries) in a single call.
+ */
+
+// matches the initial position list capacity used by awFmCreateKmerSearchList
+#define DFI_DEFAULT_POSITION_LIST_CAPACITY 4
+
+/*
+ * Function:  dfiKmerSearchListTotalPositions
+ * --------------------
+ * Sums the position list counts of every populated kmer in the search list.
+ *
+ *  Inputs:
+ *    searchList: search list that has been searched with
+ *      awFmParallelSearchLocate.
+ *
+ *  Returns:
+ *    Total number of located positions in the search list.
+ */
+uint64_t dfiKmerSearchListTotalPositions(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList);
+
+/*
+ * Function:  dfiKmerSearchListFlattenPositions
+ * --------------------
+ * Copies all position lists of the search list into one flat array, CSR
+ * style. The positions of kmer i are written to
+ * positions[offsets[i]] .. positions[offsets[i + 1] - 1].
+ *
+ *  Inputs:
+ *    searchList: search list that has been searched with
+ *      awFmParallelSearchLocate.
+ *    positions: output array, must hold at least
+ *      dfiKmerSearchListTotalPositions(searchList) values.
+ *    offsets: output array, must hold at least searchList->count + 1 values.
+ */
+void dfiKmerSearchListFlattenPositions(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    uint64_t *_RESTRICT_ const positions, uint64_t *_RESTRICT_ const offsets);
+
+/*
+ * Function:  dfiOffsetPositions
+ * --------------------
+ * Adds the same offset to every position of an array in place, to move the
+ * positions of a shard into the coordinates of the whole database.
+ *
+ *  Inputs:
+ *    positions: array of positions to offset.
+ *    count: number of positions in the array.
+ *    offset: value added to every position.
+ */
+void dfiOffsetPositions(uint64_t *_RESTRICT_ const positions,
+                        const uint64_t count, const uint64_t offset);
+
+/*
+ * Function:  dfiKmerSearchListFillPacked
+ * --------------------
+ * Points the kmer strings of the search list into one packed buffer of
+ * concatenated kmers, and sets the search list count. No kmer data is
+ * copied, so the buffer must outlive any search made with the list.
+ *
+ *  Inputs:
+ *    searchList: search list to fill. Its capacity must be at least count.
+ *    buffer: packed kmer characters.
+ *    bufferLength: length of the buffer in bytes.
+ *    offsets: byte offset of each kmer in the buffer. If NULL, kmers are
+ *      taken to be stored back to back in the order given by lengths.
+ *    lengths: length of each kmer.
+ *    count: number of kmers to load into the search list.
+ *
+ *  Returns:
+ *    false if any kmer extends past the end of the buffer, in which case the
+ *    search list count is set to 0. true otherwise.
+ */
+bool dfiKmerSearchListFillPacked(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList, char *const buffer,
+    const size_t bufferLength, const uint64_t *_RESTRICT_ const offsets,
+    const uint64_t *_RESTRICT_ const lengths, const size_t count);
+
+/*
+ * Function:  dfiKmerSearchListFillFixedLength
+ * --------------------
+ * Points the kmer strings of the search list into a buffer of back to back
+ * kmers that all share the same length, and sets the search list count.
+ *
+ *  Inputs:
+ *    searchList: search list to fill. Its capacity must be at least count.
+ *    buffer: packed kmer characters, at least count * kmerLength bytes.
+ *    kmerLength: length of every kmer in the buffer.
+ *    count: number of kmers to load into the search list.
+ */
+void dfiKmerSearchListFillFixedLength(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList, char *const buffer,
+    const uint64_t kmerLength, const size_t count);
+
+/*
+ * Function:  dfiKmerSearchListReserve
+ * --------------------
+ * Grows the search list so it can hold at least newCapacity kmers. The
+ * kmerSearchData array is reallocated, but the position lists of the
+ * existing entries are kept as they are, so buffers that grew during earlier
+ * searches are reused. New entries get a default sized position list.
+ *
+ *  Inputs:
+ *    searchList: search list to grow.
+ *    newCapacity: requested capacity. Nothing happens if it is not larger
+ *      than the current capacity.
+ *
+ *  Returns:
+ *    false if memory could not be allocated, in which case the search list is
+ *    left unchanged. true otherwise.
+ */
+bool dfiKmerSearchListReserve(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    const size_t newCapacity);
+
+/*
+ * Function:  dfiKmerSearchListTrim
+ * --------------------
+ * Shrinks every position list whose capacity exceeds maxPositionListCapacity
+ * back to that capacity. This bounds the memory a reused search list keeps
+ * after a batch that located highly repetitive kmers.
+ *
+ *  Inputs:
+ *    searchList: search list to trim.
+ *    maxPositionListCapacity: largest position list capacity to keep.
+ *      Values below DFI_DEFAULT_POSITION_LIST_CAPACITY are raised to it.
+ *
+ *  Returns:
+ *    Number of bytes released.
+ */
+uint64_t dfiKmerSearchListTrim(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    uint32_t maxPositionListCapacity);
+
+/*
+ * Function:  dfiKmerSearchListFillWindows
+ * --------------------
+ * Loads every overlapping kmer of a batch of reads into the search list,
+ * read by read and in the order they occur in each read. The kmer strings
+ * point into the packed read buffer, so no kmer is copied. Reads shorter
+ * than kmerLength contribute no kmers.
+ *
+ *  Inputs:
+ *    searchList: search list to fill. Its capacity must be at least the
+ *      total number of kmers in the batch.
+ *    buffer: packed read sequences.
+ *    readOffsets: byte offset of each read in the buffer.
+ *    readLengths: length of each read.
+ *    numReads: number of reads in the batch.
+ *    kmerLength: length of the kmers to cut from the reads.
+ *
+ *  Returns:
+ *    Number of kmers loaded into the search list.
+ */
+size_t dfiKmerSearchListFillWindows(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList, char *const buffer,
+    const uint64_t *_RESTRICT_ const readOffsets,
+    const uint64_t *_RESTRICT_ const readLengths, const size_t numReads,
+    const uint64_t kmerLength);
+
+/*
+ * Function:  dfiKmerSearchListGetCounts
+ * --------------------
+ * Copies the count of every populated kmer in the search list into an
+ * array. After awFmParallelSearchCount these are the search range lengths,
+ * after awFmParallelSearchLocate the position list lengths.
+ *
+ *  Inputs:
+ *    searchList: searched search list.
+ *    counts: output array, must hold at least searchList->count values.
+ */
+void dfiKmerSearchListGetCounts(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    uint64_t *_RESTRICT_ const counts);
+
+/*
+ * Function:  dfiKmerSearchListTotalKmerLength
+ * --------------------
+ *  Returns:
+ *    the summed length of all populated kmers in the search list.
+ */
+uint64_t dfiKmerSearchListTotalKmerLength(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList);
+
+/*
+ * Function:  dfiKmerSearchListAddReverseComplements
+ * --------------------
+ * Interleaves every nucleotide kmer of the search list with its reverse
+ * complement, so kmer i moves to entry 2i and its reverse complement is
+ * entry 2i + 1, and both orientations land in the same search block.
+ * Letters other than ACGTU complement to N.
+ *
+ *  Inputs:
+ *    searchList: filled search list with a capacity of at least twice its
+ *      count.
+ *    reverseComplements: buffer of dfiKmerSearchListTotalKmerLength bytes
+ *      the reverse complements are written to. It must outlive the search.
+ */
+void dfiKmerSearchListAddReverseComplements(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    char *_RESTRICT_ const reverseComplements);
+
+/*
+ * Function:  dfiKmerSearchListFlattenStrandPositions
+ * --------------------
+ * Like dfiKmerSearchListFlattenPositions for a search list interleaved by
+ * dfiKmerSearchListAddReverseComplements, merging the positions of both
+ * orientations of every kmer and tagging each position with its strand.
+ *
+ *  Inputs:
+ *    searchList: located search list.
+ *    positions: output array of dfiKmerSearchListTotalPositions values.
+ *    offsets: output array of searchList->count / 2 + 1 values, the
+ *      positions of kmer i are positions[offsets[i]] to
+ *      positions[offsets[i + 1]], forward strand first.
+ *    strands: output array with 0 for every forward and 1 for every
+ *      reverse complement position.
+ */
+void dfiKmerSearchListFlattenStrandPositions(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    uint64_t *_RESTRICT_ const positions, uint64_t *_RESTRICT_ const offsets,
+    uint8_t *_RESTRICT_ const strands);
+
+/*
+ * Function:  dfiReadIndexFromFileMapped
+ * --------------------
+ * Loads an index from file by memory mapping it instead of reading it into
+ * private memory. The bwt, kmer seed table and compressed suffix array point
+ * straight into a read-only shared mapping of the file, so loading takes
+ * constant time and every process that maps the same file shares the same
+ * physical pages through the page cache. Only the prefix sums and the
+ * FastaVector metadata are copied.
+ *
+ * An index loaded this way must be freed with dfiDeallocMappedIndex, not
+ * awFmDeallocIndex.
+ *
+ *  Inputs:
+ *    index: out-argument set to the loaded index.
+ *    fileSrc: path to the .awfmi file.
+ *    willNeed: advise the kernel to read the whole file ahead
+ *      (MADV_WILLNEED).
+ *    hugePages: advise the kernel to back the mapping with transparent huge
+ *      pages where supported (MADV_HUGEPAGE).
+ *    mappingLength: out-argument set to the length of the mapping, which
+ *      must be given back to dfiDeallocMappedIndex.
+ *
+ *  Returns:
+ *    AwFmReturnCode representing the result of the read. Same codes as
+ *    awFmReadIndexFromFile.
+ */
+enum AwFmReturnCode
+dfiReadIndexFromFileMapped(struct AwFmIndex *_RESTRICT_ *_RESTRICT_ index,
+                           const char *fileSrc, const bool willNeed,
+                           const bool hugePages,
+                           size_t *_RESTRICT_ const mappingLength);
+
+/*
+ * Function:  dfiDeallocMappedIndex
+ * --------------------
+ * Unmaps and deallocates an index loaded with dfiReadIndexFromFileMapped.
+ *
+ *  Inputs:
+ *    index: index to deallocate.
+ *    mappingLength: mapping length reported by dfiReadIndexFromFileMapped.
+ */
+void dfiDeallocMappedIndex(struct AwFmIndex *index, const size_t mappingLength);
+
+// stages of dfiCreateIndex, reported through DfiBuildProgressCallback.
+enum DfiBuildStage {
+  DfiBuildStageSanitize = 0,
+  DfiBuildStageSuffixArray = 1,
+  DfiBuildStageBwt = 2,
+  DfiBuildStageKmerSeedTable = 3,
+  DfiBuildStageCompressSuffixArray = 4,
+  DfiBuildStageWriteFile = 5
+};
+
+/*
+ * Progress callback for dfiCreateIndex. Called with the current stage and
+ * how many of its work items are done out of total. The bwt stage counts
+ * bwt positions, so does the suffix array stage of a bounded memory build. It is only ever called
+ * from the thread that called dfiCreateIndex.
+ */
+typedef void (*DfiBuildProgressCallback)(enum DfiBuildStage stage,
+                                         uint64_t done, uint64_t total,
+                                         void *userData);
+
+/*
+ * Function:  dfiCreateIndex
+ * --------------------
+ * Builds an index like awFmCreateIndex and awFmCreateIndexFromFasta, using
+ * numThreads OpenMP threads. The sequence is sanitized in parallel, the
+ * suffix array is built by the OpenMP enabled divsufsort64, the bwt blocks
+ * are filled chunk by chunk after a parallel letter count gives every chunk
+ * its starting occurrences, and the kmer seed table is filled one two letter
+ * suffix subtree per task. The resulting file is identical to the one the
+ * single threaded functions write.
+ *
+ * With a non-zero memoryLimit the full suffix array is never held in memory.
+ * Suffixes are grouped into buckets by their first few letters, and runs of
+ * buckets that fit the limit are sorted one partition at a time and spilled
+ * to an unlinked temporary file in tempDir. The file is then streamed back
+ * to fill the bwt and the sampled suffix array. This needs the sanitized
+ * sequence, bwt, seed table and sampled suffix array in memory, plus the
+ * partition buffer, instead of 8 bytes per position for the suffix array.
+ * It reads the sequence once per partition, so it is slower than the in
+ * memory build. The limit is a target: a single bucket larger than it is
+ * still sorted in one piece.
+ *
+ *  Inputs:
+ *    index: out-argument set to the created index.
+ *    config: fully initialized index configuration.
+ *    sequence: database sequence. Ignored if fastaSrc is given.
+ *    sequenceLength: length of the sequence.
+ *    fastaSrc: path to a fasta file to build the index from, or NULL to
+ *      build from sequence.
+ *    fileSrc: file path to write the index file to.
+ *    numThreads: number of threads to use, 0 for the OpenMP default.
+ *    memoryLimit: memory budget of the build in bytes, or 0 to build the
+ *      suffix array in memory.
+ *    tempDir: directory for the temporary suffix array file of a bounded
+ *      memory build, NULL for /tmp.
+ *    callback: progress callback, may be NULL.
+ *    userData: passed through to the callback.
+ *
+ *  Returns:
+ *    AwFmReturnCode representing the result of the build. Same codes as
+ *    awFmCreateIndex.
+ */
+enum AwFmReturnCode
+dfiCreateIndex(struct AwFmIndex *_RESTRICT_ *index,
+               const struct AwFmIndexConfiguration *_RESTRICT_ const config,
+               const uint8_t *sequence, size_t sequenceLength,
+               const char *fastaSrc, const char *_RESTRICT_ const fileSrc,
+               uint32_t numThreads, const uint64_t memoryLimit,
+               const char *tempDir, const DfiBuildProgressCallback callback,
+               void *userData);
+
+/*
+ * Counters of the native work done by the searches and reads that take a
+ * stats argument. Counters are only updated when a stats struct is given,
+ * with atomic adds, so one struct may be shared by concurrent calls.
+ *
+ *    kmersSearched: kmers searched for their range.
+ *    seedTableHits: kmers whose range started from the kmer seed table
+ *      instead of a full backward search.
+ *    tracebackSteps: LF mapping steps taken to reach a sampled row.
+ *    suffixArrayReads: sampled suffix array values read.
+ *    bytesRead: bytes read from the index file, for the suffix array and
+ *      the stored sequence.
+ */
+struct DfiStats {
+  uint64_t kmersSearched;
+  uint64_t seedTableHits;
+  uint64_t tracebackSteps;
+  uint64_t suffixArrayReads;
+  uint64_t bytesRead;
+};
+
+/*
+ * Function:  dfiParallelSearchRanges
+ * --------------------
+ * Searches every kmer of the search list like awFmParallelSearchCount, in
+ * interleaved blocks of AW_FM_NUM_CONCURRENT_QUERIES, and writes out the
+ * full search range and the 64 bit count of every kmer. The counts in the
+ * search data are set as awFmParallelSearchCount sets them.
+ *
+ *  Inputs:
+ *    index: index to search.
+ *    searchList: filled search list.
+ *    ranges: output array of searchList->count ranges, or NULL. Empty
+ *      ranges have startPtr > endPtr.
+ *    counts: output array of searchList->count counts, or NULL.
+ *    stats: counters to update, or NULL.
+ *    numThreads: number of threads to search with.
+ */
+void dfiParallelSearchRanges(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    struct AwFmSearchRange *_RESTRICT_ const ranges,
+    uint64_t *_RESTRICT_ const counts, struct DfiStats *stats,
+    const uint32_t numThreads);
+
+// bounded cache of located BWT rows, see dfiCreateLocateCache.
+struct DfiLocateCache;
+
+/*
+ * Function:  dfiCreateLocateCache
+ * --------------------
+ * Allocates a cache mapping BWT rows to their resolved sequence positions,
+ * so rows that are located again skip the backtrace to a sampled suffix
+ * array entry. The cache is split into independently locked shards with
+ * CLOCK eviction and is safe to share between threads.
+ *
+ *  Inputs:
+ *    capacity: maximum number of cached rows.
+ *
+ *  Returns:
+ *    the cache, or NULL if capacity is 0 or the allocation failed.
+ */
+struct DfiLocateCache *dfiCreateLocateCache(const uint64_t capacity);
+
+/*
+ * Function:  dfiDeallocLocateCache
+ * --------------------
+ * Deallocates a locate cache.
+ *
+ *  Inputs:
+ *    cache: cache to deallocate, may be NULL.
+ */
+void dfiDeallocLocateCache(struct DfiLocateCache *cache);
+
+/*
+ * Function:  dfiLocateCacheGet
+ * --------------------
+ * Looks up the position of a BWT row and counts the hit or miss.
+ *
+ *  Inputs:
+ *    cache: cache to search.
+ *    row: BWT row to look up.
+ *    position: out-argument for the position of the row on a hit.
+ *
+ *  Returns:
+ *    true if the row was cached.
+ */
+bool dfiLocateCacheGet(struct DfiLocateCache *cache, const uint64_t row,
+                       uint64_t *_RESTRICT_ const position);
+
+/*
+ * Function:  dfiLocateCachePut
+ * --------------------
+ * Caches the position of a BWT row, evicting a row that was not looked up
+ * since the clock hand last passed it when the cache is full.
+ *
+ *  Inputs:
+ *    cache: cache to add to.
+ *    row: located BWT row.
+ *    position: position of the row in the sequence.
+ */
+void dfiLocateCachePut(struct DfiLocateCache *cache, const uint64_t row,
+                       const uint64_t position);
+
+/*
+ * Function:  dfiLocateCacheStats
+ * --------------------
+ * Sums the hits and misses of all shards of the cache.
+ *
+ *  Inputs:
+ *    cache: cache to report on.
+ *    hits: out-argument for the number of cache hits.
+ *    misses: out-argument for the number of cache misses.
+ */
+void dfiLocateCacheStats(struct DfiLocateCache *cache,
+                         uint64_t *_RESTRICT_ const hits,
+                         uint64_t *_RESTRICT_ const misses);
+
+// paged cache of the compressed suffix array, see
+// dfiCreateSuffixArrayCache.
+struct DfiSuffixArrayCache;
+
+/*
+ * Function:  dfiCreateSuffixArrayCache
+ * --------------------
+ * Allocates a cache of fixed size pages of the compressed suffix array, for
+ * indices that keep the suffix array on disk. Locates read the sampled
+ * values through it, so hot regions are served from memory without holding
+ * the whole suffix array. The cache is split into independently locked
+ * shards with CLOCK eviction and is safe to share between threads.
+ *
+ *  Inputs:
+ *    pageSize: length of every cached page in bytes.
+ *    maxPages: maximum number of cached pages.
+ *    readaheadPages: missing pages at most this many pages apart are read
+ *      with one pread, together with the pages between them.
+ *
+ *  Returns:
+ *    the cache, or NULL if pageSize or maxPages is 0 or the allocation
+ *    failed.
+ */
+struct DfiSuffixArrayCache *
+dfiCreateSuffixArrayCache(const uint64_t pageSize, const uint64_t maxPages,
+                          const uint64_t readaheadPages);
+
+/*
+ * Function:  dfiDeallocSuffixArrayCache
+ * --------------------
+ * Deallocates a suffix array cache and all of its pages.
+ *
+ *  Inputs:
+ *    cache: cache to deallocate, may be NULL.
+ */
+void dfiDeallocSuffixArrayCache(struct DfiSuffixArrayCache *cache);
+
+/*
+ * Function:  dfiSuffixArrayCacheStats
+ * --------------------
+ * Reports how many sampled values locates found on resident pages and how
+ * many had to read a page from the index file.
+ *
+ *  Inputs:
+ *    cache: cache to report on.
+ *    hits: out-argument for the number of cache hits.
+ *    misses: out-argument for the number of cache misses.
+ */
+void dfiSuffixArrayCacheStats(struct DfiSuffixArrayCache *cache,
+                              uint64_t *_RESTRICT_ const hits,
+                              uint64_t *_RESTRICT_ const misses);
+
+/*
+ * Function:  dfiSuffixArrayCacheReadPositions
+ * --------------------
+ * Like awFmReadPositionsFromSuffixArray for an index that keeps the suffix
+ * array on disk, reading through the cache. The missing pages of the whole
+ * batch are read first, in page order.
+ *
+ *  Inputs:
+ *    index: index to read from.
+ *    cache: cache to read through.
+ *    stats: counters to update, or NULL.
+ *    positions: sampled BWT rows on input, replaced by their suffix array
+ *      values.
+ *    numPositions: number of rows.
+ *
+ *  Returns:
+ *    AwFmFileReadOkay on success, AwFmFileReadFail or AwFmAllocationFailure.
+ */
+enum AwFmReturnCode
+dfiSuffixArrayCacheReadPositions(const struct AwFmIndex *_RESTRICT_ const index,
+                                 struct DfiSuffixArrayCache *cache,
+                                 struct DfiStats *stats,
+                                 uint64_t *_RESTRICT_ const positions,
+                                 const uint64_t numPositions);
+
+/*
+ * Function:  dfiSuffixArrayCacheWarm
+ * --------------------
+ * Reads pages into the cache ahead of any locate, such as the pages of a
+ * profile saved with dfiSuffixArrayCacheProfile. Pages past the end of the
+ * suffix array are ignored.
+ *
+ *  Inputs:
+ *    index: index to read from.
+ *    cache: cache to fill.
+ *    pages: indices of the pages to read.
+ *    numPages: number of pages.
+ *
+ *  Returns:
+ *    AwFmSuccess, AwFmFileReadFail or AwFmAllocationFailure.
+ */
+enum AwFmReturnCode
+dfiSuffixArrayCacheWarm(const struct AwFmIndex *_RESTRICT_ const index,
+                        struct DfiSuffixArrayCache *cache,
+                        const uint64_t *_RESTRICT_ const pages,
+                        const uint64_t numPages);
+
+/*
+ * Function:  dfiSuffixArrayCacheProfile
+ * --------------------
+ * Lists the resident pages of the cache with the number of values read
+ * from each since it was cached.
+ *
+ *  Inputs:
+ *    cache: cache to report on.
+ *    pages: output array of page indices.
+ *    accesses: output array of the reads of every page.
+ *    maxPages: capacity of both output arrays.
+ *
+ *  Returns:
+ *    the number of pages written.
+ */
+uint64_t dfiSuffixArrayCacheProfile(struct DfiSuffixArrayCache *cache,
+                                    uint64_t *_RESTRICT_ const pages,
+                                    uint64_t *_RESTRICT_ const accesses,
+                                    const uint64_t maxPages);
+
+/*
+ * Function:  dfiParallelSearchLocateLimited
+ * --------------------
+ * Like awFmParallelSearchLocate, but backtraces at most maxHits positions
+ * per kmer, picked by dfiSelectSearchRangeRows. Position lists only grow to
+ * the capped size, and the count in the search data is the number of
+ * positions actually located.
+ *
+ *  Inputs:
+ *    index: index to search.
+ *    searchList: filled search list.
+ *    maxHits: maximum number of positions to locate per kmer.
+ *    sample: whether to locate a random subset of the rows instead of the
+ *      first maxHits rows of each range.
+ *    seed: seed of the sampling.
+ *    cache: locate cache to consult and fill, or NULL.
+ *    suffixArrayCache: suffix array page cache to read through, or NULL.
+ *    counts: output array of the full occurrence count of every kmer, or
+ *      NULL.
+ *    stats: counters to update, or NULL.
+ *    numThreads: number of threads to search with.
+ *
+ *  Returns:
+ *    AwFmSuccess, AwFmFileReadFail if the suffix array could not be read,
+ *    or AwFmAllocationFailure if a position list could not grow.
+ */
+enum AwFmReturnCode dfiParallelSearchLocateLimited(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    const uint64_t maxHits, const bool sample, const uint64_t seed,
+    struct DfiLocateCache *cache, struct DfiSuffixArrayCache *suffixArrayCache,
+    uint64_t *_RESTRICT_ const counts, struct DfiStats *stats,
+    const uint32_t numThreads);
+
+/*
+ * Function:  dfiExtendSearchRange
+ * --------------------
+ * Prepends letters to the pattern of a search range with one backward search
+ * step per letter, consuming them from last to first. The empty pattern is
+ * the full range, startPtr 0 to bwtLength - 1. Letters outside the index
+ * alphabet make the range empty, and empty ranges stay empty.
+ *
+ *  Inputs:
+ *    index: index to search.
+ *    range: range of the current pattern, updated in place.
+ *    letters: ascii letters to prepend.
+ *    length: number of letters.
+ *
+ *  Returns:
+ *    true if the extended range is not empty.
+ */
+bool dfiExtendSearchRange(const struct AwFmIndex *_RESTRICT_ const index,
+                          struct AwFmSearchRange *_RESTRICT_ const range,
+                          const char *_RESTRICT_ const letters,
+                          const uint64_t length);
+
+/*
+ * Function:  dfiFindSearchRangePositions
+ * --------------------
+ * Like awFmFindDatabaseHitPositions, but writes the positions of every BWT
+ * position in the range into a caller owned array.
+ *
+ *  Inputs:
+ *    index: index to search.
+ *    range: range to locate.
+ *    positions: output array of awFmSearchRangeLength(range) positions.
+ *
+ *  Returns:
+ *    AwFmFileReadOkay on success, AwFmFileReadFail if the suffix array could
+ *    not be read, or AwFmAllocationFailure.
+ */
+enum AwFmReturnCode
+dfiFindSearchRangePositions(const struct AwFmIndex *_RESTRICT_ const index,
+                            const struct AwFmSearchRange *_RESTRICT_ const range,
+                            uint64_t *_RESTRICT_ const positions);
+
+/*
+ * Function:  dfiLocateBwtRows
+ * --------------------
+ * Backtraces arbitrary BWT rows to their positions in the sequence. Rows
+ * found in the cache skip the backtrace, the others are added to it.
+ *
+ *  Inputs:
+ *    index: index to search.
+ *    cache: locate cache to consult and fill, or NULL.
+ *    suffixArrayCache: suffix array page cache to read through, or NULL.
+ *    stats: counters to update, or NULL.
+ *    positions: the BWT rows on input, replaced by their positions.
+ *    numPositions: number of rows.
+ *
+ *  Returns:
+ *    AwFmFileReadOkay on success, AwFmFileReadFail if the suffix array could
+ *    not be read, or AwFmAllocationFailure.
+ */
+enum AwFmReturnCode
+dfiLocateBwtRows(const struct AwFmIndex *_RESTRICT_ const index,
+                 struct DfiLocateCache *cache,
+                 struct DfiSuffixArrayCache *suffixArrayCache,
+                 struct DfiStats *stats, uint64_t *_RESTRICT_ const positions,
+                 const uint64_t numPositions);
+
+/*
+ * Function:  dfiSelectSearchRangeRows
+ * --------------------
+ * Picks at most maxRows BWT rows of a search range, in row order. Without
+ * sampling these are the first rows of the range, with sampling a uniform
+ * random subset drawn from a stream seeded by seed and the range itself, so
+ * the same pattern and seed always give the same rows.
+ *
+ *  Inputs:
+ *    range: range to pick rows from.
+ *    maxRows: maximum number of rows.
+ *    sample: whether to draw a random subset instead of the first rows.
+ *    seed: seed of the random stream.
+ *    rows: output array of at least min(maxRows, range length) rows.
+ *
+ *  Returns:
+ *    the number of rows written.
+ */
+uint64_t dfiSelectSearchRangeRows(
+    const struct AwFmSearchRange *_RESTRICT_ const range,
+    const uint64_t maxRows, const bool sample, const uint64_t seed,
+    uint64_t *_RESTRICT_ const rows);
+
+// approximate matches of a batch of patterns, see dfiSearchApproximate.
+struct DfiApproximateResults;
+
+/*
+ * Function:  dfiSearchApproximate
+ * --------------------
+ * Finds every text string within maxErrors errors of each pattern, by
+ * backtracking over backward search steps. Without indels errors are
+ * mismatches, with indels they are edits (substitutions, insertions and
+ * deletions). Branches are pruned once the errors so far plus a lower bound
+ * for the rest of the pattern exceed maxErrors. Every text string is
+ * reported once, as its range and its lowest number of errors, with the
+ * hits of a pattern sorted by range.
+ *
+ *  Inputs:
+ *    index: index to search.
+ *    buffer: packed pattern letters.
+ *    offsets: offset of every pattern in the buffer.
+ *    lengths: length of every pattern.
+ *    numPatterns: number of patterns.
+ *    maxErrors: largest number of errors of a hit, below 255.
+ *    allowIndels: count edits instead of mismatches.
+ *    numThreads: number of threads to search the patterns with.
+ *
+ *  Returns:
+ *    the results, to be freed with dfiDeallocApproximateResults, or NULL on
+ *    allocation failure.
+ */
+struct DfiApproximateResults *
+dfiSearchApproximate(const struct AwFmIndex *_RESTRICT_ const index,
+                     const char *_RESTRICT_ const buffer,
+                     const uint64_t *_RESTRICT_ const offsets,
+                     const uint64_t *_RESTRICT_ const lengths,
+                     const size_t numPatterns, const uint8_t maxErrors,
+                     const bool allowIndels, const uint32_t numThreads);
+
+/*
+ * Function:  dfiApproximateResultsTotalHits
+ * --------------------
+ *  Returns:
+ *    the number of hits of all patterns together.
+ */
+uint64_t dfiApproximateResultsTotalHits(
+    const struct DfiApproximateResults *_RESTRICT_ const results);
+
+/*
+ * Function:  dfiApproximateResultsFlatten
+ * --------------------
+ * Copies the hits of all patterns out in pattern order.
+ *
+ *  Inputs:
+ *    results: results of dfiSearchApproximate.
+ *    ranges: output array of one range per hit.
+ *    errors: output array of the errors of every hit.
+ *    counts: output array of the number of positions of every hit.
+ *    offsets: output array of numPatterns + 1 entries, the hits of pattern i
+ *      are hits offsets[i] to offsets[i + 1].
+ *
+ *  Returns:
+ *    the number of positions of all hits together.
+ */
+uint64_t dfiApproximateResultsFlatten(
+    const struct DfiApproximateResults *_RESTRICT_ const results,
+    struct AwFmSearchRange *_RESTRICT_ const ranges,
+    uint64_t *_RESTRICT_ const errors, uint64_t *_RESTRICT_ const counts,
+    uint64_t *_RESTRICT_ const offsets);
+
+/*
+ * Function:  dfiApproximateResultsLocate
+ * --------------------
+ * Locates every hit, writing the positions of all hits back to back in the
+ * order of dfiApproximateResultsFlatten.
+ *
+ *  Inputs:
+ *    index: index that was searched.
+ *    results: results of dfiSearchApproximate.
+ *    positions: output array of the total number of positions.
+ *    numThreads: number of threads to locate with.
+ *
+ *  Returns:
+ *    AwFmFileReadOkay on success, AwFmFileReadFail if the suffix array could
+ *    not be read, or AwFmAllocationFailure.
+ */
+enum AwFmReturnCode dfiApproximateResultsLocate(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    const struct DfiApproximateResults *_RESTRICT_ const results,
+    uint64_t *_RESTRICT_ const positions, const uint32_t numThreads);
+
+/*
+ * Function:  dfiDeallocApproximateResults
+ * --------------------
+ * Deallocates the results of dfiSearchApproximate.
+ *
+ *  Inputs:
+ *    results: results to deallocate, may be NULL.
+ */
+void dfiDeallocApproximateResults(struct DfiApproximateResults *results);
+
+// an exact match of read[queryOffset, queryOffset + length) in the index.
+struct DfiMem {
+  uint64_t queryOffset;
+  uint64_t length;
+  uint64_t startPtr;
+  uint64_t endPtr;
+};
+
+// maximal exact matches of a batch of reads, see dfiFindMems.
+struct DfiMemResults;
+
+/*
+ * Function:  dfiFindMems
+ * --------------------
+ * Finds the maximal exact matches of every read with backward search,
+ * looking up the last letters of a match in the kmer seed table where it
+ * can.
+ *
+ * Super-maximal matches are the substrings of the read that occur in the
+ * index but are not contained in a longer substring that occurs. Each one
+ * costs a galloping search over its end plus its length in steps.
+ *
+ * Otherwise every read position j reports the longest match ending at j if
+ * at least one of its occurrences can't be extended to the right. These are
+ * found between the super-maximal matches by bisecting for the ends where
+ * the count of the match drops.
+ *
+ *  Inputs:
+ *    index: index to search.
+ *    buffer: packed read letters.
+ *    offsets: offset of every read in the buffer.
+ *    lengths: length of every read.
+ *    numReads: number of reads.
+ *    minLength: shortest match to report, at least 1.
+ *    superMaximal: find super-maximal matches only.
+ *    numThreads: number of threads to search the reads with.
+ *
+ *  Returns:
+ *    the matches of every read in read order, to be freed with
+ *    dfiDeallocMemResults, or NULL on allocation failure.
+ */
+struct DfiMemResults *dfiFindMems(const struct AwFmIndex *_RESTRICT_ const index,
+                                  const char *_RESTRICT_ const buffer,
+                                  const uint64_t *_RESTRICT_ const offsets,
+                                  const uint64_t *_RESTRICT_ const lengths,
+                                  const size_t numReads,
+                                  const uint64_t minLength,
+                                  const bool superMaximal,
+                                  const uint32_t numThreads);
+
+/*
+ * Function:  dfiMemResultsTotal
+ * --------------------
+ *  Returns:
+ *    the number of matches of all reads together.
+ */
+uint64_t dfiMemResultsTotal(const struct DfiMemResults *_RESTRICT_ const results);
+
+/*
+ * Function:  dfiMemResultsFlatten
+ * --------------------
+ * Copies the matches of all reads out in read order.
+ *
+ *  Inputs:
+ *    results: results of dfiFindMems.
+ *    mems: output array of all matches.
+ *    offsets: output array of numReads + 1 entries, the matches of read i
+ *      are mems offsets[i] to offsets[i + 1].
+ */
+void dfiMemResultsFlatten(const struct DfiMemResults *_RESTRICT_ const results,
+                          struct DfiMem *_RESTRICT_ const mems,
+                          uint64_t *_RESTRICT_ const offsets);
+
+/*
+ * Function:  dfiDeallocMemResults
+ * --------------------
+ * Deallocates the results of dfiFindMems.
+ *
+ *  Inputs:
+ *    results: results to deallocate, may be NULL.
+ */
+void dfiDeallocMemResults(struct DfiMemResults *results);
+
+/*
+ * Function:  dfiGetLocalSequencePositions
+ * --------------------
+ * Batched awFmGetLocalSequencePositionFromIndexPosition, translating global
+ * positions into the sequence number and the offset within that sequence
+ * for indices built from a fasta file.
+ *
+ *  Inputs:
+ *    index: index built from a fasta file.
+ *    globalPositions: positions to translate.
+ *    count: number of positions.
+ *    sequenceNumbers: output array of count sequence numbers, UINT64_MAX
+ *      for positions past the end of the last sequence.
+ *    localPositions: output array of count offsets into the sequences.
+ *    numThreads: number of threads to translate with.
+ *
+ *  Returns:
+ *    AwFmSuccess, AwFmIllegalPositionError if any position lies past the
+ *    last sequence, or AwFmUnsupportedVersionError if the index has no
+ *    sequence metadata.
+ */
+enum AwFmReturnCode dfiGetLocalSequencePositions(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    const uint64_t *_RESTRICT_ const globalPositions, const size_t count,
+    uint64_t *_RESTRICT_ const sequenceNumbers,
+    uint64_t *_RESTRICT_ const localPositions, const uint32_t numThreads);
+
+// LRU block cache of the stored sequence, see dfiReadSequences.
+struct DfiSequenceCache;
+
+/*
+ * Function:  dfiCreateSequenceCache
+ * --------------------
+ * Allocates an LRU cache of fixed size blocks of the stored sequence for
+ * dfiReadSequences. The cache is safe to share between threads.
+ *
+ *  Inputs:
+ *    blockSize: length of every cached block in bytes.
+ *    maxBlocks: number of blocks kept before the least recently used is
+ *      evicted.
+ *
+ *  Returns:
+ *    the cache, or NULL if either argument is 0 or the allocation failed.
+ */
+struct DfiSequenceCache *dfiCreateSequenceCache(const uint64_t blockSize,
+                                                const size_t maxBlocks);
+
+/*
+ * Function:  dfiDeallocSequenceCache
+ * --------------------
+ * Deallocates a sequence cache and all of its blocks.
+ *
+ *  Inputs:
+ *    cache: cache to deallocate, may be NULL.
+ */
+void dfiDeallocSequenceCache(struct DfiSequenceCache *cache);
+
+/*
+ * Function:  dfiSequenceCacheStats
+ * --------------------
+ * Reports how many block lookups the cache served and how many read the
+ * index file.
+ *
+ *  Inputs:
+ *    cache: cache to report on.
+ *    hits: out-argument for the number of cache hits.
+ *    misses: out-argument for the number of cache misses.
+ */
+void dfiSequenceCacheStats(const struct DfiSequenceCache *_RESTRICT_ cache,
+                           uint64_t *_RESTRICT_ const hits,
+                           uint64_t *_RESTRICT_ const misses);
+
+/*
+ * Function:  dfiReadSequences
+ * --------------------
+ * Batched awFmReadSequenceFromFile, copying many segments of the stored
+ * sequence back to back into one output buffer. Segments come from the
+ * sequence argument when it is given, else through the cache when it is
+ * given, and else straight from the index file, where segments within
+ * maxGap of each other are coalesced into a single pread.
+ *
+ *  Inputs:
+ *    index: index to read from.
+ *    sequence: in memory or memory mapped copy of the stored sequence, or
+ *      NULL.
+ *    cache: block cache to read through, or NULL.
+ *    starts: start position of every segment.
+ *    lengths: length of every segment.
+ *    count: number of segments.
+ *    maxGap: largest gap between two segments that are read together.
+ *    output: output buffer of the summed lengths. It is not null
+ *      terminated.
+ *    offsets: output array of count + 1 values, segment i is output
+ *      offsets[i] to offsets[i + 1].
+ *    stats: counters to update, or NULL.
+ *    numThreads: number of threads to read with.
+ *
+ *  Returns:
+ *    AwFmFileReadOkay on success, AwFmIllegalPositionError if a segment
+ *    reaches past the end of the sequence, AwFmUnsupportedVersionError if
+ *    the index does not store the sequence, AwFmFileReadFail or
+ *    AwFmAllocationFailure.
+ */
+enum AwFmReturnCode
+dfiReadSequences(const struct AwFmIndex *_RESTRICT_ const index,
+                 const char *_RESTRICT_ const sequence,
+                 struct DfiSequenceCache *cache,
+                 const uint64_t *_RESTRICT_ const starts,
+                 const uint64_t *_RESTRICT_ const lengths, const size_t count,
+                 const uint64_t maxGap, char *_RESTRICT_ const output,
+                 uint64_t *_RESTRICT_ const offsets, struct DfiStats *stats,
+                 const uint32_t numThreads);
+
+#endif /* end of include guard: DFI_INDEX_H */
@@ -0,0 +1,70 @@
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include "AwFmIndex.h"
+#include "DfiClockTable.h"
+#include "DfiIndex.h"
+
+// maps rows to their positions, the payload of every row is its position.
+struct DfiLocateCache {
+  struct DfiClockTable table;
+};
+
+struct DfiLocateCache *dfiCreateLocateCache(const uint64_t capacity) {
+  struct DfiLocateCache *cache = calloc(1, sizeof(struct DfiLocateCache));
+  if (cache == NULL) {
+    return NULL;
+  }
+  if (!dfiClockTableInit(&cache->table, capacity, sizeof(uint64_t))) {
+    free(cache);
+    return NULL;
+  }
+  return cache;
+}
+
+void dfiDeallocLocateCache(struct DfiLocateCache *cache) {
+  if (cache == NULL) {
+    return;
+  }
+  dfiClockTableFree(&cache->table);
+  free(cache);
+}
+
+bool dfiLocateCacheGet(struct DfiLocateCache *cache, const uint64_t row,
+                       uint64_t *_RESTRICT_ const position) {
+  struct DfiClockShard *shard = dfiClockTableLock(&cache->table, row);
+  const uint64_t *cached = dfiClockTableFind(&cache->table, shard, row);
+  if (cached != NULL) {
+    *position = *cached;
+    shard->hits++;
+  } else {
+    shard->misses++;
+  }
+  dfiClockTableUnlock(shard);
+  return cached != NULL;
+}
+
+void dfiLocateCachePut(struct DfiLocateCache *cache, const uint64_t row,
+                       const uint64_t position) {
+  struct DfiClockShard *shard = dfiClockTableLock(&cache->table, row);
+  bool inserted;
+  uint64_t *cached = dfiClockTableInsert(&cache->table, shard, row, &inserted);
+  if (inserted) {
+    *cached = position;
+  }
+  dfiClockTableUnlock(shard);
+}
+
+void dfiLocateCacheStats(struct DfiLocateCache *cache,
+                         uint64_t *_RESTRICT_ const hits,
+                         uint64_t *_RESTRICT_ const misses) {
+  *hits = 0;
+  *misses = 0;
+  for (size_t i = 0; i < cache->table.numShards; i++) {
+    struct DfiClockShard *shard = &cache->table.shards[i];
+    omp_set_lock(&shard->lock);
+    *hits += shard->hits;
+    *misses += shard->misses;
+    omp_unset_lock(&shard->lock);
+  }
+}
@@ -0,0 +1,244 @@
+#define _DEFAULT_SOURCE
+
+#include <fcntl.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include "AwFmFile.h"
+#include "AwFmIndex.h"
+#include "AwFmIndexStruct.h"
+#include "AwFmSuffixArray.h"
+#include "DfiIndex.h"
+#include "FastaVector.h"
+
+#define DFI_INDEX_FILE_ID_HEADER "AwFmIndex\n"
+#define DFI_INDEX_FILE_ID_HEADER_LENGTH 10
+// id header, version number, feature flags, 4 config bytes and bwt length.
+#define DFI_BWT_FILE_OFFSET (DFI_INDEX_FILE_ID_HEADER_LENGTH + 12 + 8)
+
+static void deallocPartialMappedIndex(struct AwFmIndex *index,
+                                      uint8_t *mapping,
+                                      const size_t mappingLength) {
+  munmap(mapping, mappingLength);
+  if (index != NULL) {
+    free(index->prefixSums);
+    if (index->fastaVector != NULL) {
+      fastaVectorDealloc(index->fastaVector);
+      free(index->fastaVector);
+    }
+    free(index);
+  }
+}
+
+static enum AwFmReturnCode
+readMappedFastaVector(struct AwFmIndex *_RESTRICT_ const index,
+                      const uint8_t *_RESTRICT_ const mapping,
+                      const size_t mappingLength) {
+  const size_t fastaVectorOffset = awFmGetFastaVectorFileOffset(index);
+  if (fastaVectorOffset + 2 * sizeof(size_t) > mappingLength) {
+    return AwFmFileReadFail;
+  }
+  size_t headerLength;
+  size_t metadataLength;
+  memcpy(&headerLength, mapping + fastaVectorOffset, sizeof(size_t));
+  memcpy(&metadataLength, mapping + fastaVectorOffset + sizeof(size_t),
+         sizeof(size_t));
+  const uint8_t *headerData = mapping + fastaVectorOffset + 2 * sizeof(size_t);
+  const uint8_t *metadata = headerData + headerLength;
+  if (metadata + metadataLength * sizeof(struct FastaVectorMetadata) >
+      mapping + mappingLength) {
+    return AwFmFileReadFail;
+  }
+
+  // the header strings and metadata are small, so they are copied into a
+  // regular FastaVector, the same way awFmReadIndexFromFile does it.
+  struct FastaVector *fastaVector = malloc(sizeof(struct FastaVector));
+  if (fastaVector == NULL) {
+    return AwFmAllocationFailure;
+  }
+  if (fastaVectorInit(fastaVector) == FASTA_VECTOR_ALLOCATION_FAIL) {
+    free(fastaVector);
+    return AwFmAllocationFailure;
+  }
+  fastaVectorStringDealloc(&fastaVector->sequence);
+  fastaVector->sequence.charData = NULL;
+  fastaVector->sequence.capacity = 0;
+  fastaVector->sequence.count = 0;
+  index->fastaVector = fastaVector;
+
+  char *header = realloc(fastaVector->header.charData, headerLength);
+  if (header == NULL && headerLength > 0) {
+    return AwFmAllocationFailure;
+  }
+  fastaVector->header.charData = header;
+  memcpy(header, headerData, headerLength);
+  fastaVector->header.count = headerLength;
+  fastaVector->header.capacity = headerLength;
+
+  struct FastaVectorMetadata *metadataVector =
+      realloc(fastaVector->metadata.data,
+              metadataLength * sizeof(struct FastaVectorMetadata));
+  if (metadataVector == NULL && metadataLength > 0) {
+    return AwFmAllocationFailure;
+  }
+  fastaVector->metadata.data = metadataVector;
+  memcpy(metadataVector, metadata,
+         metadataLength * sizeof(struct FastaVectorMetadata));
+  fastaVector->metadata.count = metadataLength;
+  fastaVector->metadata.capacity = metadataLength;
+  return AwFmSuccess;
+}
+
+enum AwFmReturnCode
+dfiReadIndexFromFileMapped(struct AwFmIndex *_RESTRICT_ *_RESTRICT_ index,
+                           const char *fileSrc, const bool willNeed,
+                           const bool hugePages,
+                           size_t *_RESTRICT_ const mappingLength) {
+  if (__builtin_expect(fileSrc == NULL, 0)) {
+    return AwFmNoFileSrcGiven;
+  }
+
+  FILE *fileHandle = fopen(fileSrc, "r");
+  if (!fileHandle) {
+    return AwFmFileOpenFail;
+  }
+  const int fileDescriptor = fileno(fileHandle);
+
+  struct stat fileStat;
+  if (fstat(fileDescriptor, &fileStat) != 0 ||
+      (size_t)fileStat.st_size < DFI_BWT_FILE_OFFSET) {
+    fclose(fileHandle);
+    return AwFmFileReadFail;
+  }
+  const size_t fileLength = fileStat.st_size;
+
+  uint8_t *mapping =
+      mmap(NULL, fileLength, PROT_READ, MAP_SHARED, fileDescriptor, 0);
+  if (mapping == MAP_FAILED) {
+    fclose(fileHandle);
+    return AwFmFileReadFail;
+  }
+
+  if (strncmp(DFI_INDEX_FILE_ID_HEADER, (const char *)mapping,
+              DFI_INDEX_FILE_ID_HEADER_LENGTH) != 0) {
+    deallocPartialMappedIndex(NULL, mapping, fileLength);
+    fclose(fileHandle);
+    return AwFmFileFormatError;
+  }
+
+  // parse the fixed size header, laid out as written by awFmWriteIndexToFile.
+  const uint8_t *header = mapping + DFI_INDEX_FILE_ID_HEADER_LENGTH;
+  uint32_t versionNumber;
+  uint32_t featureFlags;
+  uint64_t bwtLength;
+  memcpy(&versionNumber, header, sizeof(uint32_t));
+  memcpy(&featureFlags, header + 4, sizeof(uint32_t));
+  memcpy(&bwtLength, header + 12, sizeof(uint64_t));
+  if (!awFmIndexIsVersionValid(versionNumber)) {
+    deallocPartialMappedIndex(NULL, mapping, fileLength);
+    fclose(fileHandle);
+    return AwFmUnsupportedVersionError;
+  }
+
+  struct AwFmIndex *indexData = calloc(1, sizeof(struct AwFmIndex));
+  if (indexData == NULL) {
+    deallocPartialMappedIndex(NULL, mapping, fileLength);
+    fclose(fileHandle);
+    return AwFmAllocationFailure;
+  }
+  indexData->versionNumber = versionNumber;
+  indexData->featureFlags = featureFlags;
+  indexData->bwtLength = bwtLength;
+  indexData->config.suffixArrayCompressionRatio = header[8];
+  indexData->config.kmerLengthInSeedTable = header[9];
+  indexData->config.alphabetType = header[10];
+  indexData->config.storeOriginalSequence = !!header[11];
+  // the suffix array is read from the mapping, so it counts as in memory.
+  indexData->config.keepSuffixArrayInMemory = true;
+  indexData->suffixArray.compressedByteLength =
+      awFmComputeCompressedSaSizeInBytes(
+          bwtLength, indexData->config.suffixArrayCompressionRatio);
+  indexData->suffixArray.valueBitWidth =
+      awFmComputeSuffixArrayValueMinWidth(bwtLength);
+
+  const size_t bytesPerBwtBlock =
+      indexData->config.alphabetType == AwFmAlphabetAmino
+          ? sizeof(struct AwFmAminoBlock)
+          : sizeof(struct AwFmNucleotideBlock);
+  const size_t prefixSumsOffset =
+      DFI_BWT_FILE_OFFSET +
+      awFmNumBlocksFromBwtLength(bwtLength) * bytesPerBwtBlock;
+  const size_t prefixSumsLength =
+      awFmGetPrefixSumsLength(indexData->config.alphabetType);
+  const size_t kmerSeedTableOffset =
+      prefixSumsOffset + prefixSumsLength * sizeof(uint64_t);
+  indexData->suffixArrayFileOffset = awFmGetSuffixArrayFileOffset(indexData);
+  indexData->sequenceFileOffset = awFmGetSequenceFileOffset(indexData);
+
+  if (indexData->suffixArrayFileOffset +
+          indexData->suffixArray.compressedByteLength >
+      fileLength) {
+    deallocPartialMappedIndex(indexData, mapping, fileLength);
+    fclose(fileHandle);
+    return AwFmFileFormatError;
+  }
+
+  // the prefix sums are tiny and hit on every step, so they get a private
+  // aligned copy. Everything else points into the shared mapping.
+  indexData->prefixSums = malloc(prefixSumsLength * sizeof(uint64_t));
+  if (indexData->prefixSums == NULL) {
+    deallocPartialMappedIndex(indexData, mapping, fileLength);
+    fclose(fileHandle);
+    return AwFmAllocationFailure;
+  }
+  memcpy(indexData->prefixSums, mapping + prefixSumsOffset,
+         prefixSumsLength * sizeof(uint64_t));
+  indexData->bwtBlockList.asNucleotide =
+      (struct AwFmNucleotideBlock *)(mapping + DFI_BWT_FILE_OFFSET);
+  indexData->kmerSeedTable =
+      (struct AwFmSearchRange *)(mapping + kmerSeedTableOffset);
+  indexData->suffixArray.values = mapping + indexData->suffixArrayFileOffset;
+
+  if (awFmIndexContainsFastaVector(indexData)) {
+    enum AwFmReturnCode rc =
+        readMappedFastaVector(indexData, mapping, fileLength);
+    if (rc != AwFmSuccess) {
+      deallocPartialMappedIndex(indexData, mapping, fileLength);
+      fclose(fileHandle);
+      return rc;
+    }
+  }
+
+  if (willNeed) {
+    madvise(mapping, fileLength, MADV_WILLNEED);
+  }
+#ifdef MADV_HUGEPAGE
+  if (hugePages) {
+    madvise(mapping, fileLength, MADV_HUGEPAGE);
+  }
+#else
+  (void)hugePages;
+#endif
+
+  indexData->fileHandle = fileHandle;
+  indexData->fileDescriptor = fileDescriptor;
+  *mappingLength = fileLength;
+  *index = indexData;
+  return AwFmFileReadOkay;
+}
+
+void dfiDeallocMappedIndex(struct AwFmIndex *index,
+                           const size_t mappingLength) {
+  if (index == NULL) {
+    return;
+  }
+  uint8_t *mapping =
+      (uint8_t *)index->bwtBlockList.asNucleotide - DFI_BWT_FILE_OFFSET;
+  fclose(index->fileHandle);
+  deallocPartialMappedIndex(index, mapping, mappingLength);
+}
@@ -0,0 +1,298 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include "AwFmIndex.h"
+#include "DfiIndex.h"
+
+/*
+ * Compiled fast paths of the DNAFMIndex wrapper, for the calls where ctypes
+ * argument conversion dominates: single pattern searches, batched counts
+ * and locates of a list of patterns, and single sequence reads. The Python
+ * side owns the index and the caches and passes them as integer addresses.
+ * Patterns are str or bytes objects, used in place without copying. The
+ * module is optional, the wrapper falls back to ctypes without it.
+ */
+
+static bool checkArgumentCount(const char *name, const Py_ssize_t nargs,
+                               const Py_ssize_t expected) {
+  if (nargs != expected) {
+    PyErr_Format(PyExc_TypeError, "%s() takes %zd arguments (%zd given)", name,
+                 expected, nargs);
+    return false;
+  }
+  return true;
+}
+
+// an address argument, None is NULL.
+static bool addressArgument(PyObject *arg, void **address) {
+  if (arg == Py_None) {
+    *address = NULL;
+    return true;
+  }
+  *address = PyLong_AsVoidPtr(arg);
+  return !(*address == NULL && PyErr_Occurred());
+}
+
+// the ascii bytes of a str or bytes pattern, valid while the object lives.
+static bool patternData(PyObject *pattern, const char **data,
+                        Py_ssize_t *length) {
+  if (PyUnicode_Check(pattern)) {
+    *data = PyUnicode_AsUTF8AndSize(pattern, length);
+    return *data != NULL;
+  }
+  if (PyBytes_Check(pattern)) {
+    *data = PyBytes_AS_STRING(pattern);
+    *length = PyBytes_GET_SIZE(pattern);
+    return true;
+  }
+  PyErr_Format(PyExc_TypeError, "patterns must be str or bytes, not %.200s",
+               Py_TYPE(pattern)->tp_name);
+  return false;
+}
+
+// points a search list at the patterns of a tuple, without position lists.
+static bool fillSearchList(PyObject *patterns,
+                           struct AwFmKmerSearchList *searchList) {
+  const Py_ssize_t count = PyTuple_GET_SIZE(patterns);
+  searchList->capacity = count;
+  searchList->count = count;
+  searchList->kmerSearchData =
+      calloc(count > 0 ? count : 1, sizeof(struct AwFmKmerSearchData));
+  if (searchList->kmerSearchData == NULL) {
+    PyErr_NoMemory();
+    return false;
+  }
+  for (Py_ssize_t i = 0; i < count; i++) {
+    const char *data;
+    Py_ssize_t length;
+    if (!patternData(PyTuple_GET_ITEM(patterns, i), &data, &length)) {
+      free(searchList->kmerSearchData);
+      return false;
+    }
+    searchList->kmerSearchData[i].kmerString = (char *)data;
+    searchList->kmerSearchData[i].kmerLength = length;
+  }
+  return true;
+}
+
+static void freeSearchList(struct AwFmKmerSearchList *searchList) {
+  for (size_t i = 0; i < searchList->count; i++) {
+    free(searchList->kmerSearchData[i].positionList);
+  }
+  free(searchList->kmerSearchData);
+}
+
+// find_search_range(index, pattern) -> (start_ptr, end_ptr)
+static PyObject *findSearchRange(PyObject *module, PyObject *const *args,
+                                 Py_ssize_t nargs) {
+  (void)module;
+  struct AwFmIndex *index;
+  const char *kmer;
+  Py_ssize_t length;
+  if (!checkArgumentCount("find_search_range", nargs, 2) ||
+      !addressArgument(args[0], (void **)&index) ||
+      !patternData(args[1], &kmer, &length)) {
+    return NULL;
+  }
+  struct AwFmSearchRange range;
+  Py_BEGIN_ALLOW_THREADS
+  range = awFmFindSearchRangeForString(index, kmer, length);
+  Py_END_ALLOW_THREADS
+
+  PyObject *startPtr = PyLong_FromUnsignedLongLong(range.startPtr);
+  PyObject *endPtr = PyLong_FromUnsignedLongLong(range.endPtr);
+  if (startPtr == NULL || endPtr == NULL) {
+    Py_XDECREF(startPtr);
+    Py_XDECREF(endPtr);
+    return NULL;
+  }
+  PyObject *result = PyTuple_Pack(2, startPtr, endPtr);
+  Py_DECREF(startPtr);
+  Py_DECREF(endPtr);
+  return result;
+}
+
+// search_ranges(index, patterns, ranges, counts, num_threads) -> None
+static PyObject *searchRanges(PyObject *module, PyObject *const *args,
+                              Py_ssize_t nargs) {
+  (void)module;
+  struct AwFmIndex *index;
+  if (!checkArgumentCount("search_ranges", nargs, 5) ||
+      !addressArgument(args[0], (void **)&index)) {
+    return NULL;
+  }
+  const unsigned long numThreads = PyLong_AsUnsignedLong(args[4]);
+  if (numThreads == (unsigned long)-1 && PyErr_Occurred()) {
+    return NULL;
+  }
+  PyObject *patterns = PySequence_Tuple(args[1]);
+  if (patterns == NULL) {
+    return NULL;
+  }
+  const Py_ssize_t count = PyTuple_GET_SIZE(patterns);
+  Py_buffer ranges = {.buf = NULL};
+  Py_buffer counts = {.buf = NULL};
+  struct AwFmKmerSearchList searchList;
+  PyObject *result = NULL;
+  if ((args[2] != Py_None &&
+       PyObject_GetBuffer(args[2], &ranges, PyBUF_WRITABLE) < 0) ||
+      PyObject_GetBuffer(args[3], &counts, PyBUF_WRITABLE) < 0) {
+    goto done;
+  }
+  if ((ranges.buf != NULL &&
+       ranges.len < count * (Py_ssize_t)sizeof(struct AwFmSearchRange)) ||
+      counts.len < count * (Py_ssize_t)sizeof(uint64_t)) {
+    PyErr_SetString(PyExc_ValueError, "Output buffer is too small.");
+    goto done;
+  }
+  if (!fillSearchList(patterns, &searchList)) {
+    goto done;
+  }
+  Py_BEGIN_ALLOW_THREADS
+  dfiParallelSearchRanges(index, &searchList, ranges.buf, counts.buf, NULL,
+                          numThreads);
+  Py_END_ALLOW_THREADS
+  freeSearchList(&searchList);
+  result = Py_NewRef(Py_None);
+
+done:
+  if (ranges.buf != NULL) {
+    PyBuffer_Release(&ranges);
+  }
+  if (counts.buf != NULL) {
+    PyBuffer_Release(&counts);
+  }
+  Py_DECREF(patterns);
+  return result;
+}
+
+// locate(index, patterns, locate_cache, suffix_array_cache, num_threads)
+// -> (positions, offsets) as bytearrays of uint64 values.
+static PyObject *locate(PyObject *module, PyObject *const *args,
+                        Py_ssize_t nargs) {
+  (void)module;
+  struct AwFmIndex *index;
+  struct DfiLocateCache *cache;
+  struct DfiSuffixArrayCache *suffixArrayCache;
+  if (!checkArgumentCount("locate", nargs, 5) ||
+      !addressArgument(args[0], (void **)&index) ||
+      !addressArgument(args[2], (void **)&cache) ||
+      !addressArgument(args[3], (void **)&suffixArrayCache)) {
+    return NULL;
+  }
+  const unsigned long numThreads = PyLong_AsUnsignedLong(args[4]);
+  if (numThreads == (unsigned long)-1 && PyErr_Occurred()) {
+    return NULL;
+  }
+  PyObject *patterns = PySequence_Tuple(args[1]);
+  if (patterns == NULL) {
+    return NULL;
+  }
+  struct AwFmKmerSearchList searchList;
+  if (!fillSearchList(patterns, &searchList)) {
+    Py_DECREF(patterns);
+    return NULL;
+  }
+
+  enum AwFmReturnCode returnCode;
+  Py_BEGIN_ALLOW_THREADS
+  if (cache != NULL || suffixArrayCache != NULL) {
+    returnCode = dfiParallelSearchLocateLimited(
+        index, &searchList, UINT32_MAX, false, 0, cache, suffixArrayCache,
+        NULL, NULL, numThreads);
+  } else {
+    returnCode = awFmParallelSearchLocate(index, &searchList, numThreads);
+  }
+  Py_END_ALLOW_THREADS
+
+  PyObject *result = NULL;
+  if (returnCode == AwFmFileReadFail) {
+    PyErr_SetString(PyExc_Exception, "The file could not be read sucessfully.");
+  } else if (returnCode == AwFmAllocationFailure) {
+    PyErr_SetString(PyExc_MemoryError, "Could not grow the position lists.");
+  } else {
+    const uint64_t totalPositions = dfiKmerSearchListTotalPositions(&searchList);
+    PyObject *positions =
+        PyByteArray_FromStringAndSize(NULL, totalPositions * sizeof(uint64_t));
+    PyObject *offsets = PyByteArray_FromStringAndSize(
+        NULL, (searchList.count + 1) * sizeof(uint64_t));
+    if (positions != NULL && offsets != NULL) {
+      dfiKmerSearchListFlattenPositions(
+          &searchList, (uint64_t *)PyByteArray_AS_STRING(positions),
+          (uint64_t *)PyByteArray_AS_STRING(offsets));
+      result = PyTuple_Pack(2, positions, offsets);
+    }
+    Py_XDECREF(positions);
+    Py_XDECREF(offsets);
+  }
+  freeSearchList(&searchList);
+  Py_DECREF(patterns);
+  return result;
+}
+
+// read_sequence(index, start, length) -> str, ending early at a NUL byte
+// like a C string.
+static PyObject *readSequence(PyObject *module, PyObject *const *args,
+                              Py_ssize_t nargs) {
+  (void)module;
+  struct AwFmIndex *index;
+  if (!checkArgumentCount("read_sequence", nargs, 3) ||
+      !addressArgument(args[0], (void **)&index)) {
+    return NULL;
+  }
+  const unsigned long long start = PyLong_AsUnsignedLongLong(args[1]);
+  const unsigned long long length = PyLong_AsUnsignedLongLong(args[2]);
+  if (PyErr_Occurred()) {
+    return NULL;
+  }
+  // awFmReadSequenceFromFile writes a terminating NUL after the segment.
+  char *buffer = PyMem_Malloc(length + 1);
+  if (buffer == NULL) {
+    return PyErr_NoMemory();
+  }
+  enum AwFmReturnCode returnCode;
+  Py_BEGIN_ALLOW_THREADS
+  returnCode = awFmReadSequenceFromFile(index, start, length, buffer);
+  Py_END_ALLOW_THREADS
+
+  PyObject *result = NULL;
+  if (returnCode == AwFmFileReadFail) {
+    PyErr_SetString(PyExc_OSError, "Could not read the index file.");
+  } else if (returnCode == AwFmIllegalPositionError) {
+    PyErr_SetString(PyExc_ValueError,
+                    "The start position is not less than the end position.");
+  } else if (returnCode == AwFmUnsupportedVersionError) {
+    PyErr_SetString(
+        PyExc_Exception,
+        "The index was configured to not store the original sequence.");
+  } else {
+    result = PyUnicode_DecodeUTF8(buffer, strlen(buffer), NULL);
+  }
+  PyMem_Free(buffer);
+  return result;
+}
+
+static PyMethodDef nativeMethods[] = {
+    {"find_search_range", (PyCFunction)(void (*)(void))findSearchRange,
+     METH_FASTCALL, "Return the (start_ptr, end_ptr) range of a pattern."},
+    {"search_ranges", (PyCFunction)(void (*)(void))searchRanges, METH_FASTCALL,
+     "Search a sequence of patterns into range and count buffers."},
+    {"locate", (PyCFunction)(void (*)(void))locate, METH_FASTCALL,
+     "Locate a sequence of patterns as CSR positions and offsets."},
+    {"read_sequence", (PyCFunction)(void (*)(void))readSequence, METH_FASTCALL,
+     "Read a segment of the stored sequence."},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef nativeModule = {
+    .m_base = PyModuleDef_HEAD_INIT,
+    .m_name = "_native",
+    .m_doc = "Compiled fast paths of DNAFMIndex.",
+    .m_size = -1,
+    .m_methods = nativeMethods,
+};
+
+PyMODINIT_FUNC PyInit__native(void) { return PyModule_Create(&nativeModule); }
@@ -0,0 +1,902 @@
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include "AwFmIndex.h"
+#include "AwFmIndexStruct.h"
+#include "AwFmKmerTable.h"
+#include "AwFmLetter.h"
+#include "AwFmSearch.h"
+#include "AwFmSuffixArray.h"
+#include "DfiIndex.h"
+
+#define DFI_NUM_NUCLEOTIDE_LETTERS 4
+#define DFI_NUM_AMINO_LETTERS 20
+#define DFI_INITIAL_HIT_CAPACITY 4
+#define DFI_INITIAL_MEM_CAPACITY 16
+
+static inline bool searchRangeIsEmpty(const struct AwFmSearchRange *range) {
+  return range->startPtr > range->endPtr;
+}
+
+static inline void setSearchRangeEmpty(struct AwFmSearchRange *range) {
+  range->startPtr = 1;
+  range->endPtr = 0;
+}
+
+static inline void stepSearchRange(const struct AwFmIndex *_RESTRICT_ index,
+                                   struct AwFmSearchRange *_RESTRICT_ range,
+                                   const uint8_t letterIndex,
+                                   const bool isAmino) {
+  // only the empty pattern's range starts at the sentinel row, and the step
+  // can't query the position before it.
+  if (range->startPtr == 0) {
+    range->startPtr = index->prefixSums[letterIndex];
+    range->endPtr = index->prefixSums[letterIndex + 1] - 1;
+  } else if (isAmino) {
+    awFmAminoIterativeStepBackwardSearch(index, range, letterIndex);
+  } else {
+    awFmNucleotideIterativeStepBackwardSearch(index, range, letterIndex);
+  }
+}
+
+bool dfiExtendSearchRange(const struct AwFmIndex *_RESTRICT_ const index,
+                          struct AwFmSearchRange *_RESTRICT_ const range,
+                          const char *_RESTRICT_ const letters,
+                          const uint64_t length) {
+  const bool isAmino = index->config.alphabetType == AwFmAlphabetAmino;
+  const uint8_t numLetters =
+      isAmino ? DFI_NUM_AMINO_LETTERS : DFI_NUM_NUCLEOTIDE_LETTERS;
+
+  // backward search prepends, so the letters are consumed last to first.
+  for (uint64_t i = length; i > 0; i--) {
+    if (searchRangeIsEmpty(range)) {
+      return false;
+    }
+    const uint8_t letter = letters[i - 1];
+    const uint8_t letterIndex = isAmino
+                                    ? awFmAsciiAminoAcidToLetterIndex(letter)
+                                    : awFmAsciiNucleotideToLetterIndex(letter);
+    if (letterIndex >= numLetters) {
+      setSearchRangeEmpty(range);
+      return false;
+    }
+
+    stepSearchRange(index, range, letterIndex, isAmino);
+  }
+  return !searchRangeIsEmpty(range);
+}
+
+enum AwFmReturnCode
+dfiFindSearchRangePositions(const struct AwFmIndex *_RESTRICT_ const index,
+                            const struct AwFmSearchRange *_RESTRICT_ const range,
+                            uint64_t *_RESTRICT_ const positions) {
+  const uint64_t numPositions = awFmSearchRangeLength(range);
+  for (uint64_t i = 0; i < numPositions; i++) {
+    positions[i] = range->startPtr + i;
+  }
+  return dfiLocateBwtRows(index, NULL, NULL, NULL, positions, numPositions);
+}
+
+// adds the work of one dfiLocateBwtRows call to the stats, before the
+// sampled rows are replaced by their values. Reads through a suffix array
+// cache count their own bytes.
+static void addLocateStats(const struct AwFmIndex *_RESTRICT_ const index,
+                           struct DfiStats *stats,
+                           const uint64_t *_RESTRICT_ const sampledRows,
+                           const uint64_t numSampledRows,
+                           const uint64_t tracebackSteps,
+                           const bool readsThroughCache) {
+  uint64_t bytesRead = 0;
+  if (!index->config.keepSuffixArrayInMemory && !readsThroughCache) {
+    // the bytes awFmGetSuffixArrayValueFromFile reads for every value.
+    const uint8_t valueBitWidth = index->suffixArray.valueBitWidth;
+    for (uint64_t i = 0; i < numSampledRows; i++) {
+      const struct AwFmSuffixArrayOffset offset =
+          awFmGetOffsetIntoSuffixArrayByteArray(
+              valueBitWidth,
+              sampledRows[i] / index->config.suffixArrayCompressionRatio);
+      bytesRead += (offset.bitOffset + valueBitWidth + 7) / 8;
+    }
+  }
+#pragma omp atomic
+  stats->tracebackSteps += tracebackSteps;
+#pragma omp atomic
+  stats->suffixArrayReads += numSampledRows;
+#pragma omp atomic
+  stats->bytesRead += bytesRead;
+}
+
+enum AwFmReturnCode
+dfiLocateBwtRows(const struct AwFmIndex *_RESTRICT_ const index,
+                 struct DfiLocateCache *cache,
+                 struct DfiSuffixArrayCache *suffixArrayCache,
+                 struct DfiStats *stats, uint64_t *_RESTRICT_ const positions,
+                 const uint64_t numPositions) {
+  if (numPositions == 0) {
+    return AwFmFileReadOkay;
+  }
+  // the sampled rows, their backtrace offsets and where they go in positions,
+  // for every row that the cache can't resolve.
+  uint64_t *sampledRows = malloc(3 * numPositions * sizeof(uint64_t));
+  if (sampledRows == NULL) {
+    return AwFmAllocationFailure;
+  }
+  uint64_t *offsets = sampledRows + numPositions;
+  uint64_t *indices = offsets + numPositions;
+
+  const bool isAmino = index->config.alphabetType == AwFmAlphabetAmino;
+  uint64_t numUncached = 0;
+  uint64_t tracebackSteps = 0;
+  for (uint64_t i = 0; i < numPositions; i++) {
+    if (cache != NULL &&
+        dfiLocateCacheGet(cache, positions[i], &positions[i])) {
+      continue;
+    }
+    uint64_t backtracePosition = positions[i];
+    uint64_t offset = 0;
+    while (!awFmBwtPositionIsSampled(index, backtracePosition)) {
+      backtracePosition =
+          isAmino ? awFmAminoBacktraceBwtPosition(index, backtracePosition)
+                  : awFmNucleotideBacktraceBwtPosition(index, backtracePosition);
+      offset++;
+    }
+    sampledRows[numUncached] = backtracePosition;
+    offsets[numUncached] = offset;
+    indices[numUncached] = i;
+    numUncached++;
+    tracebackSteps += offset;
+  }
+  // an in memory suffix array is always faster than the cache.
+  if (index->config.keepSuffixArrayInMemory) {
+    suffixArrayCache = NULL;
+  }
+  if (stats != NULL) {
+    addLocateStats(index, stats, sampledRows, numUncached, tracebackSteps,
+                   suffixArrayCache != NULL);
+  }
+
+  const enum AwFmReturnCode rc =
+      suffixArrayCache != NULL
+          ? dfiSuffixArrayCacheReadPositions(index, suffixArrayCache, stats,
+                                             sampledRows, numUncached)
+          : awFmReadPositionsFromSuffixArray(index, sampledRows, numUncached);
+  if (rc == AwFmFileReadFail || rc == AwFmAllocationFailure) {
+    free(sampledRows);
+    return rc;
+  }
+  for (uint64_t i = 0; i < numUncached; i++) {
+    // mod by the length so that the sentinel wraps to zero.
+    const uint64_t position = (sampledRows[i] + offsets[i]) % index->bwtLength;
+    if (cache != NULL) {
+      dfiLocateCachePut(cache, positions[indices[i]], position);
+    }
+    positions[indices[i]] = position;
+  }
+  free(sampledRows);
+  return AwFmFileReadOkay;
+}
+
+static inline uint64_t mix64(uint64_t x) {
+  // splitmix64 finalizer.
+  x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9ULL;
+  x = (x ^ (x >> 27)) * 0x94D049BB133111EBULL;
+  return x ^ (x >> 31);
+}
+
+static inline uint64_t nextRandom(uint64_t *state) {
+  *state += 0x9E3779B97F4A7C15ULL;
+  return mix64(*state);
+}
+
+uint64_t dfiSelectSearchRangeRows(
+    const struct AwFmSearchRange *_RESTRICT_ const range,
+    const uint64_t maxRows, const bool sample, const uint64_t seed,
+    uint64_t *_RESTRICT_ const rows) {
+  const uint64_t numRows = awFmSearchRangeLength(range);
+  const uint64_t numSelected = numRows < maxRows ? numRows : maxRows;
+  if (!sample || numSelected == numRows) {
+    for (uint64_t i = 0; i < numSelected; i++) {
+      rows[i] = range->startPtr + i;
+    }
+    return numSelected;
+  }
+
+  // the stream depends on the range, so a pattern samples the same rows
+  // wherever it is searched. Selection sampling keeps the rows in order.
+  uint64_t state = seed ^ mix64(range->startPtr ^ mix64(range->endPtr));
+  uint64_t selected = 0;
+  for (uint64_t row = 0; selected < numSelected; row++) {
+    const uint64_t remainingRows = numRows - row;
+    const uint64_t draw =
+        (uint64_t)(((unsigned __int128)nextRandom(&state) * remainingRows) >>
+                   64);
+    if (draw < numSelected - selected) {
+      rows[selected++] = range->startPtr + row;
+    }
+  }
+  return numSelected;
+}
+
+enum DfiEditOperation {
+  DfiEditMatch,
+  DfiEditSubstitution,
+  DfiEditTextInsertion,
+  DfiEditPatternDeletion
+};
+
+struct DfiApproximateHit {
+  uint64_t startPtr;
+  uint64_t endPtr;
+  uint8_t errors;
+};
+
+struct DfiApproximateHitVector {
+  struct DfiApproximateHit *hits;
+  size_t count;
+  size_t capacity;
+};
+
+struct DfiApproximateResults {
+  struct DfiApproximateHitVector *vectors;
+  size_t count;
+};
+
+struct DfiApproximateSearch {
+  const struct AwFmIndex *index;
+  const uint8_t *letterIndices;
+  // lowerBounds[i] is a lower bound on the errors of the first i letters.
+  const uint8_t *lowerBounds;
+  uint8_t maxErrors;
+  bool allowIndels;
+  bool isAmino;
+  uint8_t numLetters;
+  struct DfiApproximateHitVector *hits;
+  bool allocationFailed;
+};
+
+static void addApproximateHit(struct DfiApproximateSearch *search,
+                              const struct AwFmSearchRange *range,
+                              const uint8_t errors) {
+  struct DfiApproximateHitVector *hits = search->hits;
+  if (hits->count == hits->capacity) {
+    const size_t capacity =
+        hits->capacity ? 2 * hits->capacity : DFI_INITIAL_HIT_CAPACITY;
+    struct DfiApproximateHit *grown =
+        realloc(hits->hits, capacity * sizeof(struct DfiApproximateHit));
+    if (grown == NULL) {
+      search->allocationFailed = true;
+      return;
+    }
+    hits->hits = grown;
+    hits->capacity = capacity;
+  }
+  struct DfiApproximateHit *hit = &hits->hits[hits->count++];
+  hit->startPtr = range->startPtr;
+  hit->endPtr = range->endPtr;
+  hit->errors = errors;
+}
+
+/*
+ * Backtracks over the unmatched prefix pattern[0, remaining). Each call
+ * either reports the range or tries every letter in front of it, as a match,
+ * a substitution or, with indels, an extra text letter, and with indels also
+ * skips the next pattern letter. An insertion directly after a deletion (or
+ * the other way around) is the same as a substitution and is not tried.
+ */
+static void searchApproximateRecursive(struct DfiApproximateSearch *search,
+                                       const struct AwFmSearchRange *range,
+                                       const uint64_t remaining,
+                                       const uint64_t patternLength,
+                                       const uint8_t errors,
+                                       const enum DfiEditOperation lastEdit) {
+  if (search->allocationFailed ||
+      errors + search->lowerBounds[remaining] > search->maxErrors) {
+    return;
+  }
+  if (remaining == 0) {
+    // a pattern deleted as a whole matches no text at all.
+    if (range->startPtr != 0) {
+      addApproximateHit(search, range, errors);
+    }
+    return;
+  }
+
+  const uint8_t patternLetter = search->letterIndices[remaining - 1];
+  const bool canEdit = errors < search->maxErrors;
+  for (uint8_t letter = 0; letter < search->numLetters; letter++) {
+    if (letter != patternLetter && !canEdit) {
+      continue;
+    }
+    struct AwFmSearchRange extended = *range;
+    stepSearchRange(search->index, &extended, letter, search->isAmino);
+    if (searchRangeIsEmpty(&extended)) {
+      continue;
+    }
+    if (letter == patternLetter) {
+      searchApproximateRecursive(search, &extended, remaining - 1,
+                                 patternLength, errors, DfiEditMatch);
+    } else {
+      searchApproximateRecursive(search, &extended, remaining - 1,
+                                 patternLength, errors + 1,
+                                 DfiEditSubstitution);
+    }
+    // an extra text letter after the end of the pattern never helps.
+    if (search->allowIndels && canEdit && remaining < patternLength &&
+        lastEdit != DfiEditPatternDeletion) {
+      searchApproximateRecursive(search, &extended, remaining, patternLength,
+                                 errors + 1, DfiEditTextInsertion);
+    }
+  }
+  if (search->allowIndels && canEdit && lastEdit != DfiEditTextInsertion) {
+    searchApproximateRecursive(search, range, remaining - 1, patternLength,
+                               errors + 1, DfiEditPatternDeletion);
+  }
+}
+
+/*
+ * Greedily splits pattern[0, i) from the right into maximal pieces that occur
+ * in the text. Every piece that does not occur needs an error of its own, so
+ * their number bounds the errors of any match of that prefix.
+ */
+static void computeLowerBounds(const struct DfiApproximateSearch *search,
+                               uint8_t *lowerBounds,
+                               const uint64_t patternLength) {
+  lowerBounds[0] = 0;
+  for (uint64_t i = 1; i <= patternLength; i++) {
+    struct AwFmSearchRange range = {0, search->index->bwtLength - 1};
+    uint8_t bound = 0;
+    for (uint64_t j = i; j > 0 && bound <= search->maxErrors; j--) {
+      const uint8_t letter = search->letterIndices[j - 1];
+      if (letter < search->numLetters) {
+        stepSearchRange(search->index, &range, letter, search->isAmino);
+      }
+      if (letter >= search->numLetters || searchRangeIsEmpty(&range)) {
+        bound++;
+        range.startPtr = 0;
+        range.endPtr = search->index->bwtLength - 1;
+      }
+    }
+    lowerBounds[i] = bound;
+  }
+}
+
+static int compareApproximateHits(const void *a, const void *b) {
+  const struct DfiApproximateHit *hitA = a;
+  const struct DfiApproximateHit *hitB = b;
+  if (hitA->startPtr != hitB->startPtr) {
+    return hitA->startPtr < hitB->startPtr ? -1 : 1;
+  }
+  if (hitA->endPtr != hitB->endPtr) {
+    return hitA->endPtr < hitB->endPtr ? -1 : 1;
+  }
+  return (int)hitA->errors - (int)hitB->errors;
+}
+
+// different edit paths can spell the same text string, keep its best one.
+static void deduplicateHits(struct DfiApproximateHitVector *hits) {
+  if (hits->count < 2) {
+    return;
+  }
+  qsort(hits->hits, hits->count, sizeof(struct DfiApproximateHit),
+        compareApproximateHits);
+  size_t kept = 1;
+  for (size_t i = 1; i < hits->count; i++) {
+    const struct DfiApproximateHit *last = &hits->hits[kept - 1];
+    if (hits->hits[i].startPtr != last->startPtr ||
+        hits->hits[i].endPtr != last->endPtr) {
+      hits->hits[kept++] = hits->hits[i];
+    }
+  }
+  hits->count = kept;
+}
+
+static bool searchApproximateSingle(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    const char *_RESTRICT_ const pattern, const uint64_t patternLength,
+    const uint8_t maxErrors, const bool allowIndels,
+    struct DfiApproximateHitVector *_RESTRICT_ const hits) {
+  uint8_t *letterIndices = malloc(2 * patternLength + 1);
+  if (letterIndices == NULL) {
+    return false;
+  }
+  uint8_t *lowerBounds = letterIndices + patternLength;
+
+  struct DfiApproximateSearch search;
+  search.index = index;
+  search.letterIndices = letterIndices;
+  search.lowerBounds = lowerBounds;
+  search.maxErrors = maxErrors;
+  search.allowIndels = allowIndels;
+  search.isAmino = index->config.alphabetType == AwFmAlphabetAmino;
+  search.numLetters =
+      search.isAmino ? DFI_NUM_AMINO_LETTERS : DFI_NUM_NUCLEOTIDE_LETTERS;
+  search.hits = hits;
+  search.allocationFailed = false;
+
+  for (uint64_t i = 0; i < patternLength; i++) {
+    letterIndices[i] = search.isAmino
+                           ? awFmAsciiAminoAcidToLetterIndex(pattern[i])
+                           : awFmAsciiNucleotideToLetterIndex(pattern[i]);
+  }
+  computeLowerBounds(&search, lowerBounds, patternLength);
+
+  const struct AwFmSearchRange fullRange = {0, index->bwtLength - 1};
+  searchApproximateRecursive(&search, &fullRange, patternLength, patternLength,
+                             0, DfiEditMatch);
+  free(letterIndices);
+  if (search.allocationFailed) {
+    return false;
+  }
+  deduplicateHits(hits);
+  return true;
+}
+
+void dfiDeallocApproximateResults(struct DfiApproximateResults *results) {
+  if (results == NULL) {
+    return;
+  }
+  for (size_t i = 0; i < results->count; i++) {
+    free(results->vectors[i].hits);
+  }
+  free(results->vectors);
+  free(results);
+}
+
+struct DfiApproximateResults *
+dfiSearchApproximate(const struct AwFmIndex *_RESTRICT_ const index,
+                     const char *_RESTRICT_ const buffer,
+                     const uint64_t *_RESTRICT_ const offsets,
+                     const uint64_t *_RESTRICT_ const lengths,
+                     const size_t numPatterns, const uint8_t maxErrors,
+                     const bool allowIndels, const uint32_t numThreads) {
+  struct DfiApproximateResults *results =
+      malloc(sizeof(struct DfiApproximateResults));
+  if (results == NULL) {
+    return NULL;
+  }
+  results->count = numPatterns;
+  results->vectors = calloc(numPatterns, sizeof(struct DfiApproximateHitVector));
+  if (results->vectors == NULL && numPatterns > 0) {
+    free(results);
+    return NULL;
+  }
+
+  bool succeeded = true;
+#pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+  for (size_t i = 0; i < numPatterns; i++) {
+    if (!searchApproximateSingle(index, buffer + offsets[i], lengths[i],
+                                 maxErrors, allowIndels,
+                                 &results->vectors[i])) {
+#pragma omp atomic write
+      succeeded = false;
+    }
+  }
+  if (!succeeded) {
+    dfiDeallocApproximateResults(results);
+    return NULL;
+  }
+  return results;
+}
+
+uint64_t dfiApproximateResultsTotalHits(
+    const struct DfiApproximateResults *_RESTRICT_ const results) {
+  uint64_t totalHits = 0;
+  for (size_t i = 0; i < results->count; i++) {
+    totalHits += results->vectors[i].count;
+  }
+  return totalHits;
+}
+
+uint64_t dfiApproximateResultsFlatten(
+    const struct DfiApproximateResults *_RESTRICT_ const results,
+    struct AwFmSearchRange *_RESTRICT_ const ranges,
+    uint64_t *_RESTRICT_ const errors, uint64_t *_RESTRICT_ const counts,
+    uint64_t *_RESTRICT_ const offsets) {
+  uint64_t hitIndex = 0;
+  uint64_t totalPositions = 0;
+  for (size_t i = 0; i < results->count; i++) {
+    const struct DfiApproximateHitVector *hits = &results->vectors[i];
+    offsets[i] = hitIndex;
+    for (size_t j = 0; j < hits->count; j++, hitIndex++) {
+      const struct DfiApproximateHit *hit = &hits->hits[j];
+      ranges[hitIndex].startPtr = hit->startPtr;
+      ranges[hitIndex].endPtr = hit->endPtr;
+      errors[hitIndex] = hit->errors;
+      counts[hitIndex] = hit->endPtr - hit->startPtr + 1;
+      totalPositions += counts[hitIndex];
+    }
+  }
+  offsets[results->count] = hitIndex;
+  return totalPositions;
+}
+
+enum AwFmReturnCode dfiApproximateResultsLocate(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    const struct DfiApproximateResults *_RESTRICT_ const results,
+    uint64_t *_RESTRICT_ const positions, const uint32_t numThreads) {
+  uint64_t *patternOffsets = malloc(results->count * sizeof(uint64_t));
+  if (patternOffsets == NULL && results->count > 0) {
+    return AwFmAllocationFailure;
+  }
+  uint64_t offset = 0;
+  for (size_t i = 0; i < results->count; i++) {
+    patternOffsets[i] = offset;
+    for (size_t j = 0; j < results->vectors[i].count; j++) {
+      const struct DfiApproximateHit *hit = &results->vectors[i].hits[j];
+      offset += hit->endPtr - hit->startPtr + 1;
+    }
+  }
+
+  enum AwFmReturnCode rc = AwFmFileReadOkay;
+#pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+  for (size_t i = 0; i < results->count; i++) {
+    uint64_t *patternPositions = positions + patternOffsets[i];
+    for (size_t j = 0; j < results->vectors[i].count; j++) {
+      const struct DfiApproximateHit *hit = &results->vectors[i].hits[j];
+      const struct AwFmSearchRange range = {hit->startPtr, hit->endPtr};
+      const enum AwFmReturnCode hitRc =
+          dfiFindSearchRangePositions(index, &range, patternPositions);
+      if (hitRc != AwFmFileReadOkay) {
+#pragma omp atomic write
+        rc = hitRc;
+      }
+      patternPositions += hit->endPtr - hit->startPtr + 1;
+    }
+  }
+  free(patternOffsets);
+  return rc;
+}
+
+struct DfiMemVector {
+  struct DfiMem *mems;
+  size_t count;
+  size_t capacity;
+};
+
+struct DfiMemResults {
+  struct DfiMemVector *vectors;
+  size_t count;
+};
+
+struct DfiMemSearch {
+  const struct AwFmIndex *index;
+  const char *read;
+  const uint8_t *letterIndices;
+  uint64_t minLength;
+  bool isAmino;
+  uint8_t numLetters;
+  struct DfiMemVector *mems;
+  bool allocationFailed;
+};
+
+static void addMem(struct DfiMemSearch *search, const uint64_t start,
+                   const uint64_t end, const struct AwFmSearchRange *range) {
+  if (end - start < search->minLength) {
+    return;
+  }
+  struct DfiMemVector *mems = search->mems;
+  if (mems->count == mems->capacity) {
+    const size_t capacity =
+        mems->capacity ? 2 * mems->capacity : DFI_INITIAL_MEM_CAPACITY;
+    struct DfiMem *grown = realloc(mems->mems, capacity * sizeof(struct DfiMem));
+    if (grown == NULL) {
+      search->allocationFailed = true;
+      return;
+    }
+    mems->mems = grown;
+    mems->capacity = capacity;
+  }
+  struct DfiMem *mem = &mems->mems[mems->count++];
+  mem->queryOffset = start;
+  mem->length = end - start;
+  mem->startPtr = range->startPtr;
+  mem->endPtr = range->endPtr;
+}
+
+/*
+ * Extends the range of read[start, end) to the left for as long as it stays
+ * non-empty, and returns the new start.
+ */
+static uint64_t extendMatchLeft(const struct DfiMemSearch *search,
+                                struct AwFmSearchRange *range,
+                                uint64_t start) {
+  while (start > 0) {
+    const uint8_t letter = search->letterIndices[start - 1];
+    if (letter >= search->numLetters) {
+      break;
+    }
+    struct AwFmSearchRange extended = *range;
+    stepSearchRange(search->index, &extended, letter, search->isAmino);
+    if (searchRangeIsEmpty(&extended)) {
+      break;
+    }
+    *range = extended;
+    start--;
+  }
+  return start;
+}
+
+/*
+ * Range of read[start, end), jump-started from the kmer seed table when its
+ * last letters allow it. Returns false if the substring does not occur.
+ */
+static bool findSubstringRange(const struct DfiMemSearch *search,
+                               const uint64_t start, const uint64_t end,
+                               struct AwFmSearchRange *range) {
+  const struct AwFmIndex *index = search->index;
+  const uint64_t length = end - start;
+  range->startPtr = 0;
+  range->endPtr = index->bwtLength - 1;
+  uint64_t position = end;
+  if (awFmQueryCanUseKmerTable(index, search->read + start, length)) {
+    *range = search->isAmino ? awFmAminoKmerSeedRangeFromTable(
+                                   index, search->read + start, length)
+                             : awFmNucleotideKmerSeedRangeFromTable(
+                                   index, search->read + start, length);
+    position -= index->config.kmerLengthInSeedTable;
+  }
+  for (; position > start; position--) {
+    if (searchRangeIsEmpty(range)) {
+      return false;
+    }
+    const uint8_t letter = search->letterIndices[position - 1];
+    if (letter >= search->numLetters) {
+      return false;
+    }
+    stepSearchRange(index, range, letter, search->isAmino);
+  }
+  return !searchRangeIsEmpty(range);
+}
+
+/*
+ * Range of the longest match ending at end, returning its start. The last
+ * seed length letters are looked up in the seed table if they occur.
+ */
+static uint64_t longestMatchEndingAt(const struct DfiMemSearch *search,
+                                     const uint64_t end,
+                                     struct AwFmSearchRange *range) {
+  const uint64_t seedLength = search->index->config.kmerLengthInSeedTable;
+  if (end >= seedLength &&
+      findSubstringRange(search, end - seedLength, end, range)) {
+    return extendMatchLeft(search, range, end - seedLength);
+  }
+  range->startPtr = 0;
+  range->endPtr = search->index->bwtLength - 1;
+  return extendMatchLeft(search, range, end);
+}
+
+/*
+ * Reports read[start, j) for every j in [low, high) that occurs more often
+ * than read[start, j + 1), given the ranges of read[start, low) and
+ * read[start, high). The counts can only fall as j grows, so a piece with
+ * equal counts at both ends is skipped without searching it.
+ */
+static void addMemsWhereCountDrops(struct DfiMemSearch *search,
+                                   const uint64_t start, const uint64_t low,
+                                   const uint64_t high,
+                                   const struct AwFmSearchRange *lowRange,
+                                   const struct AwFmSearchRange *highRange) {
+  if (awFmSearchRangeLength(lowRange) == awFmSearchRangeLength(highRange)) {
+    return;
+  }
+  if (high - low == 1) {
+    addMem(search, start, low, lowRange);
+    return;
+  }
+  const uint64_t middle = low + (high - low) / 2;
+  struct AwFmSearchRange middleRange;
+  findSubstringRange(search, start, middle, &middleRange);
+  addMemsWhereCountDrops(search, start, low, middle, lowRange, &middleRange);
+  addMemsWhereCountDrops(search, start, middle, high, &middleRange, highRange);
+}
+
+/*
+ * Reports the matches of the ends (previousEnd, end] of the super-maximal
+ * match read[start, end). Every one of these ends has its longest match
+ * start at start, so only the ends where the count drops are maximal.
+ */
+static void addMemsOfSmem(struct DfiMemSearch *search, const uint64_t start,
+                          const uint64_t end, const uint64_t previousEnd,
+                          const struct AwFmSearchRange *range) {
+  addMem(search, start, end, range);
+  uint64_t low = previousEnd + 1;
+  if (low < start + search->minLength) {
+    low = start + search->minLength;
+  }
+  if (low >= end) {
+    return;
+  }
+  struct AwFmSearchRange lowRange;
+  findSubstringRange(search, start, low, &lowRange);
+  addMemsWhereCountDrops(search, start, low, end, &lowRange, range);
+}
+
+/*
+ * The super-maximal matches are read[s(j), j) for the ends j where the
+ * longest match ending at j can't be extended to the right, so s(j) is the
+ * same for all ends up to the next such j. After one is found at
+ * [start, end), the next one ends at the largest j with read[start - 1, j)
+ * in the text, found by galloping over j.
+ */
+static void findSmems(struct DfiMemSearch *search, const uint64_t readLength,
+                      const bool addAllMems) {
+  struct AwFmSearchRange range;
+  uint64_t end = readLength;
+  uint64_t start = longestMatchEndingAt(search, end, &range);
+  struct AwFmSearchRange smemRange;
+  uint64_t smemStart = 0;
+  uint64_t smemEnd = 0;
+  bool haveSmem = false;
+  while (!search->allocationFailed) {
+    if (!addAllMems) {
+      addMem(search, start, end, &range);
+    } else {
+      if (haveSmem) {
+        addMemsOfSmem(search, smemStart, smemEnd, end, &smemRange);
+      }
+      smemStart = start;
+      smemEnd = end;
+      smemRange = range;
+      haveSmem = true;
+    }
+    if (start == 0) {
+      break;
+    }
+    const uint64_t anchor = start - 1;
+    struct AwFmSearchRange probe;
+    if (!findSubstringRange(search, anchor, anchor + 1, &range)) {
+      end = anchor;
+      start = longestMatchEndingAt(search, end, &range);
+      continue;
+    }
+
+    // read[anchor, anchor + 1) occurs and read[anchor, end) does not.
+    uint64_t found = anchor + 1;
+    uint64_t missing = end;
+    for (uint64_t step = 1; found + step < missing; step *= 2) {
+      if (findSubstringRange(search, anchor, found + step, &probe)) {
+        found += step;
+        range = probe;
+      } else {
+        missing = found + step;
+        break;
+      }
+    }
+    while (missing - found > 1) {
+      const uint64_t middle = found + (missing - found) / 2;
+      if (findSubstringRange(search, anchor, middle, &probe)) {
+        found = middle;
+        range = probe;
+      } else {
+        missing = middle;
+      }
+    }
+    end = found;
+    start = extendMatchLeft(search, &range, anchor);
+  }
+  if (haveSmem && !search->allocationFailed) {
+    addMemsOfSmem(search, smemStart, smemEnd, 0, &smemRange);
+  }
+}
+
+static int compareMems(const void *a, const void *b) {
+  const struct DfiMem *memA = a;
+  const struct DfiMem *memB = b;
+  if (memA->queryOffset != memB->queryOffset) {
+    return memA->queryOffset < memB->queryOffset ? -1 : 1;
+  }
+  if (memA->length != memB->length) {
+    return memA->length < memB->length ? -1 : 1;
+  }
+  return 0;
+}
+
+static bool findMemsSingle(const struct AwFmIndex *_RESTRICT_ const index,
+                           const char *_RESTRICT_ const read,
+                           const uint64_t readLength, const uint64_t minLength,
+                           const bool superMaximal,
+                           struct DfiMemVector *_RESTRICT_ const mems) {
+  if (readLength == 0) {
+    return true;
+  }
+  uint8_t *letterIndices = malloc(readLength);
+  if (letterIndices == NULL) {
+    return false;
+  }
+
+  struct DfiMemSearch search;
+  search.index = index;
+  search.read = read;
+  search.letterIndices = letterIndices;
+  search.minLength = minLength;
+  search.isAmino = index->config.alphabetType == AwFmAlphabetAmino;
+  search.numLetters =
+      search.isAmino ? DFI_NUM_AMINO_LETTERS : DFI_NUM_NUCLEOTIDE_LETTERS;
+  search.mems = mems;
+  search.allocationFailed = false;
+  for (uint64_t i = 0; i < readLength; i++) {
+    letterIndices[i] = search.isAmino
+                           ? awFmAsciiAminoAcidToLetterIndex(read[i])
+                           : awFmAsciiNucleotideToLetterIndex(read[i]);
+  }
+
+  findSmems(&search, readLength, !superMaximal);
+  free(letterIndices);
+  if (search.allocationFailed) {
+    return false;
+  }
+  // matches were found from the end of the read, report them in read order.
+  qsort(mems->mems, mems->count, sizeof(struct DfiMem), compareMems);
+  return true;
+}
+
+void dfiDeallocMemResults(struct DfiMemResults *results) {
+  if (results == NULL) {
+    return;
+  }
+  for (size_t i = 0; i < results->count; i++) {
+    free(results->vectors[i].mems);
+  }
+  free(results->vectors);
+  free(results);
+}
+
+struct DfiMemResults *dfiFindMems(const struct AwFmIndex *_RESTRICT_ const index,
+                                  const char *_RESTRICT_ const buffer,
+                                  const uint64_t *_RESTRICT_ const offsets,
+                                  const uint64_t *_RESTRICT_ const lengths,
+                                  const size_t numReads,
+                                  const uint64_t minLength,
+                                  const bool superMaximal,
+                                  const uint32_t numThreads) {
+  struct DfiMemResults *results = malloc(sizeof(struct DfiMemResults));
+  if (results == NULL) {
+    return NULL;
+  }
+  results->count = numReads;
+  results->vectors = calloc(numReads, sizeof(struct DfiMemVector));
+  if (results->vectors == NULL && numReads > 0) {
+    free(results);
+    return NULL;
+  }
+
+  bool succeeded = true;
+#pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+  for (size_t i = 0; i < numReads; i++) {
+    if (!findMemsSingle(index, buffer + offsets[i], lengths[i], minLength,
+                        superMaximal, &results->vectors[i])) {
+#pragma omp atomic write
+      succeeded = false;
+    }
+  }
+  if (!succeeded) {
+    dfiDeallocMemResults(results);
+    return NULL;
+  }
+  return results;
+}
+
+uint64_t
+dfiMemResultsTotal(const struct DfiMemResults *_RESTRICT_ const results) {
+  uint64_t total = 0;
+  for (size_t i = 0; i < results->count; i++) {
+    total += results->vectors[i].count;
+  }
+  return total;
+}
+
+void dfiMemResultsFlatten(const struct DfiMemResults *_RESTRICT_ const results,
+                          struct DfiMem *_RESTRICT_ const mems,
+                          uint64_t *_RESTRICT_ const offsets) {
+  uint64_t offset = 0;
+  for (size_t i = 0; i < results->count; i++) {
+    const struct DfiMemVector *vector = &results->vectors[i];
+    offsets[i] = offset;
+    if (vector->count > 0) {
+      memcpy(&mems[offset], vector->mems, vector->count * sizeof(struct DfiMem));
+    }
+    offset += vector->count;
+  }
+  offsets[results->count] = offset;
+}
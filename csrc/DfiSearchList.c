@@ -0,0 +1,434 @@
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include "AwFmIndex.h"
+#include "AwFmIndexStruct.h"
+#include "AwFmKmerTable.h"
+#include "DfiIndex.h"
+
+// block search steps of awFmParallelSearchCount, from AwFmParallelSearch.c.
+void parallelSearchFindKmerSeedsForBlock(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    struct AwFmSearchRange *_RESTRICT_ const ranges,
+    const size_t threadBlockStartIndex, const size_t threadBlockEndIndex);
+
+void parallelSearchExtendKmersInBlock(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    struct AwFmSearchRange *_RESTRICT_ const ranges,
+    const size_t threadBlockStartIndex, const size_t threadBlockEndIndex);
+
+bool setPositionListCount(
+    struct AwFmKmerSearchData *_RESTRICT_ const searchData, uint32_t count);
+
+uint64_t dfiKmerSearchListTotalPositions(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList) {
+  uint64_t totalPositions = 0;
+  for (size_t i = 0; i < searchList->count; i++) {
+    totalPositions += searchList->kmerSearchData[i].count;
+  }
+  return totalPositions;
+}
+
+void dfiKmerSearchListFlattenPositions(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    uint64_t *_RESTRICT_ const positions, uint64_t *_RESTRICT_ const offsets) {
+  uint64_t offset = 0;
+  for (size_t i = 0; i < searchList->count; i++) {
+    const struct AwFmKmerSearchData *searchData =
+        &searchList->kmerSearchData[i];
+    offsets[i] = offset;
+    if (searchData->count > 0) {
+      memcpy(&positions[offset], searchData->positionList,
+             searchData->count * sizeof(uint64_t));
+    }
+    offset += searchData->count;
+  }
+  offsets[searchList->count] = offset;
+}
+
+void dfiOffsetPositions(uint64_t *_RESTRICT_ const positions,
+                        const uint64_t count, const uint64_t offset) {
+  for (uint64_t i = 0; i < count; i++) {
+    positions[i] += offset;
+  }
+}
+
+bool dfiKmerSearchListFillPacked(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList, char *const buffer,
+    const size_t bufferLength, const uint64_t *_RESTRICT_ const offsets,
+    const uint64_t *_RESTRICT_ const lengths, const size_t count) {
+  uint64_t offset = 0;
+  for (size_t i = 0; i < count; i++) {
+    struct AwFmKmerSearchData *searchData = &searchList->kmerSearchData[i];
+    if (offsets != NULL) {
+      offset = offsets[i];
+    }
+    if (offset > bufferLength || lengths[i] > bufferLength - offset) {
+      searchList->count = 0;
+      return false;
+    }
+    searchData->kmerString = buffer + offset;
+    searchData->kmerLength = lengths[i];
+    offset += lengths[i];
+  }
+  searchList->count = count;
+  return true;
+}
+
+void dfiKmerSearchListFillFixedLength(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList, char *const buffer,
+    const uint64_t kmerLength, const size_t count) {
+  for (size_t i = 0; i < count; i++) {
+    struct AwFmKmerSearchData *searchData = &searchList->kmerSearchData[i];
+    searchData->kmerString = buffer + i * kmerLength;
+    searchData->kmerLength = kmerLength;
+  }
+  searchList->count = count;
+}
+
+bool dfiKmerSearchListReserve(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    const size_t newCapacity) {
+  const size_t oldCapacity = searchList->capacity;
+  if (newCapacity <= oldCapacity) {
+    return true;
+  }
+
+  struct AwFmKmerSearchData *kmerSearchData =
+      realloc(searchList->kmerSearchData,
+              newCapacity * sizeof(struct AwFmKmerSearchData));
+  if (kmerSearchData == NULL) {
+    return false;
+  }
+  searchList->kmerSearchData = kmerSearchData;
+
+  for (size_t i = oldCapacity; i < newCapacity; i++) {
+    kmerSearchData[i].kmerString = NULL;
+    kmerSearchData[i].kmerLength = 0;
+    kmerSearchData[i].count = 0;
+    kmerSearchData[i].capacity = DFI_DEFAULT_POSITION_LIST_CAPACITY;
+    kmerSearchData[i].positionList =
+        malloc(DFI_DEFAULT_POSITION_LIST_CAPACITY * sizeof(uint64_t));
+
+    if (kmerSearchData[i].positionList == NULL) {
+      // roll back to the old capacity, the enlarged array is still usable.
+      for (size_t j = oldCapacity; j < i; j++) {
+        free(kmerSearchData[j].positionList);
+      }
+      return false;
+    }
+  }
+
+  searchList->capacity = newCapacity;
+  return true;
+}
+
+uint64_t dfiKmerSearchListTrim(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    uint32_t maxPositionListCapacity) {
+  if (maxPositionListCapacity < DFI_DEFAULT_POSITION_LIST_CAPACITY) {
+    maxPositionListCapacity = DFI_DEFAULT_POSITION_LIST_CAPACITY;
+  }
+
+  uint64_t releasedBytes = 0;
+  for (size_t i = 0; i < searchList->capacity; i++) {
+    struct AwFmKmerSearchData *searchData = &searchList->kmerSearchData[i];
+    if (searchData->capacity <= maxPositionListCapacity) {
+      continue;
+    }
+    uint64_t *positionList = realloc(
+        searchData->positionList, maxPositionListCapacity * sizeof(uint64_t));
+    if (positionList == NULL) {
+      // shrinking failed, keep the larger buffer.
+      continue;
+    }
+    releasedBytes +=
+        (searchData->capacity - maxPositionListCapacity) * sizeof(uint64_t);
+    searchData->positionList = positionList;
+    searchData->capacity = maxPositionListCapacity;
+    if (searchData->count > maxPositionListCapacity) {
+      searchData->count = maxPositionListCapacity;
+    }
+  }
+  return releasedBytes;
+}
+
+size_t dfiKmerSearchListFillWindows(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList, char *const buffer,
+    const uint64_t *_RESTRICT_ const readOffsets,
+    const uint64_t *_RESTRICT_ const readLengths, const size_t numReads,
+    const uint64_t kmerLength) {
+  size_t kmerIndex = 0;
+  for (size_t readIndex = 0; readIndex < numReads; readIndex++) {
+    if (readLengths[readIndex] < kmerLength) {
+      continue;
+    }
+    char *read = buffer + readOffsets[readIndex];
+    const uint64_t numWindows = readLengths[readIndex] - kmerLength + 1;
+    for (uint64_t windowIndex = 0; windowIndex < numWindows; windowIndex++) {
+      struct AwFmKmerSearchData *searchData =
+          &searchList->kmerSearchData[kmerIndex++];
+      searchData->kmerString = read + windowIndex;
+      searchData->kmerLength = kmerLength;
+    }
+  }
+  searchList->count = kmerIndex;
+  return kmerIndex;
+}
+
+void dfiKmerSearchListGetCounts(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    uint64_t *_RESTRICT_ const counts) {
+  for (size_t i = 0; i < searchList->count; i++) {
+    counts[i] = searchList->kmerSearchData[i].count;
+  }
+}
+
+uint64_t dfiKmerSearchListTotalKmerLength(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList) {
+  uint64_t totalLength = 0;
+  for (size_t i = 0; i < searchList->count; i++) {
+    totalLength += searchList->kmerSearchData[i].kmerLength;
+  }
+  return totalLength;
+}
+
+static inline char complementNucleotide(const char letter) {
+  switch (letter) {
+  case 'A':
+    return 'T';
+  case 'C':
+    return 'G';
+  case 'G':
+    return 'C';
+  case 'T':
+  case 'U':
+    return 'A';
+  case 'a':
+    return 't';
+  case 'c':
+    return 'g';
+  case 'g':
+    return 'c';
+  case 't':
+  case 'u':
+    return 'a';
+  default:
+    return 'N';
+  }
+}
+
+void dfiKmerSearchListAddReverseComplements(
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    char *_RESTRICT_ const reverseComplements) {
+  const size_t numKmers = searchList->count;
+  struct AwFmKmerSearchData *searchData = searchList->kmerSearchData;
+
+  // write the reverse complements first, while the kmers are still in place.
+  uint64_t offset = 0;
+  for (size_t i = 0; i < numKmers; i++) {
+    const char *kmer = searchData[i].kmerString;
+    const uint64_t kmerLength = searchData[i].kmerLength;
+    for (uint64_t j = 0; j < kmerLength; j++) {
+      reverseComplements[offset + j] =
+          complementNucleotide(kmer[kmerLength - 1 - j]);
+    }
+    offset += kmerLength;
+  }
+
+  // spread out back to front, so no kmer is overwritten before it moved.
+  for (size_t i = numKmers; i > 0; i--) {
+    const uint64_t kmerLength = searchData[i - 1].kmerLength;
+    offset -= kmerLength;
+    searchData[2 * (i - 1)].kmerString = searchData[i - 1].kmerString;
+    searchData[2 * (i - 1)].kmerLength = kmerLength;
+    searchData[2 * (i - 1) + 1].kmerString = reverseComplements + offset;
+    searchData[2 * (i - 1) + 1].kmerLength = kmerLength;
+  }
+  searchList->count = 2 * numKmers;
+}
+
+void dfiKmerSearchListFlattenStrandPositions(
+    const struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    uint64_t *_RESTRICT_ const positions, uint64_t *_RESTRICT_ const offsets,
+    uint8_t *_RESTRICT_ const strands) {
+  uint64_t offset = 0;
+  for (size_t i = 0; i < searchList->count; i++) {
+    const struct AwFmKmerSearchData *searchData =
+        &searchList->kmerSearchData[i];
+    if (i % 2 == 0) {
+      offsets[i / 2] = offset;
+    }
+    if (searchData->count > 0) {
+      memcpy(&positions[offset], searchData->positionList,
+             searchData->count * sizeof(uint64_t));
+      memset(&strands[offset], i % 2, searchData->count);
+    }
+    offset += searchData->count;
+  }
+  offsets[searchList->count / 2] = offset;
+}
+
+// counts the kmers of a block, and those seeded from the kmer seed table
+// the way parallelSearchFindKmerSeedsForBlock decides it.
+static void addSearchStats(const struct AwFmIndex *_RESTRICT_ const index,
+                           const struct AwFmKmerSearchList *_RESTRICT_ const
+                               searchList,
+                           struct DfiStats *stats, const size_t blockStartIndex,
+                           const size_t blockEndIndex) {
+  uint64_t seedTableHits = 0;
+  for (size_t i = blockStartIndex; i < blockEndIndex; i++) {
+    const struct AwFmKmerSearchData *searchData =
+        &searchList->kmerSearchData[i];
+    seedTableHits += awFmQueryCanUseKmerTable(index, searchData->kmerString,
+                                              searchData->kmerLength);
+  }
+#pragma omp atomic
+  stats->kmersSearched += blockEndIndex - blockStartIndex;
+#pragma omp atomic
+  stats->seedTableHits += seedTableHits;
+}
+
+static void searchRangesInBlock(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    struct AwFmSearchRange *_RESTRICT_ const ranges,
+    uint64_t *_RESTRICT_ const counts, struct DfiStats *stats,
+    const size_t blockStartIndex) {
+  const size_t blockEndIndex =
+      blockStartIndex + AW_FM_NUM_CONCURRENT_QUERIES > searchList->count
+          ? searchList->count
+          : blockStartIndex + AW_FM_NUM_CONCURRENT_QUERIES;
+  struct AwFmSearchRange blockRanges[AW_FM_NUM_CONCURRENT_QUERIES];
+  if (stats != NULL) {
+    addSearchStats(index, searchList, stats, blockStartIndex, blockEndIndex);
+  }
+
+  parallelSearchFindKmerSeedsForBlock(index, searchList, blockRanges,
+                                      blockStartIndex, blockEndIndex);
+  parallelSearchExtendKmersInBlock(index, searchList, blockRanges,
+                                   blockStartIndex, blockEndIndex);
+
+  for (size_t i = blockStartIndex; i < blockEndIndex; i++) {
+    const struct AwFmSearchRange *range = &blockRanges[i - blockStartIndex];
+    const uint64_t count = awFmSearchRangeLength(range);
+    searchList->kmerSearchData[i].count = count;
+    if (ranges != NULL) {
+      ranges[i] = *range;
+    }
+    if (counts != NULL) {
+      counts[i] = count;
+    }
+  }
+}
+
+void dfiParallelSearchRanges(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    struct AwFmSearchRange *_RESTRICT_ const ranges,
+    uint64_t *_RESTRICT_ const counts, struct DfiStats *stats,
+    const uint32_t numThreads) {
+  const size_t searchListCount = searchList->count;
+  if (numThreads > 1) {
+#pragma omp parallel for num_threads(numThreads)
+    for (size_t blockStartIndex = 0; blockStartIndex < searchListCount;
+         blockStartIndex += AW_FM_NUM_CONCURRENT_QUERIES) {
+      searchRangesInBlock(index, searchList, ranges, counts, stats,
+                          blockStartIndex);
+    }
+  } else {
+    for (size_t blockStartIndex = 0; blockStartIndex < searchListCount;
+         blockStartIndex += AW_FM_NUM_CONCURRENT_QUERIES) {
+      searchRangesInBlock(index, searchList, ranges, counts, stats,
+                          blockStartIndex);
+    }
+  }
+}
+
+static enum AwFmReturnCode
+locateLimitedInBlock(const struct AwFmIndex *_RESTRICT_ const index,
+                     struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+                     const uint64_t maxHits, const bool sample,
+                     const uint64_t seed, struct DfiLocateCache *cache,
+                     struct DfiSuffixArrayCache *suffixArrayCache,
+                     uint64_t *_RESTRICT_ const counts, struct DfiStats *stats,
+                     const size_t blockStartIndex) {
+  const size_t blockEndIndex =
+      blockStartIndex + AW_FM_NUM_CONCURRENT_QUERIES > searchList->count
+          ? searchList->count
+          : blockStartIndex + AW_FM_NUM_CONCURRENT_QUERIES;
+  struct AwFmSearchRange blockRanges[AW_FM_NUM_CONCURRENT_QUERIES];
+  if (stats != NULL) {
+    addSearchStats(index, searchList, stats, blockStartIndex, blockEndIndex);
+  }
+
+  parallelSearchFindKmerSeedsForBlock(index, searchList, blockRanges,
+                                      blockStartIndex, blockEndIndex);
+  parallelSearchExtendKmersInBlock(index, searchList, blockRanges,
+                                   blockStartIndex, blockEndIndex);
+
+  for (size_t i = blockStartIndex; i < blockEndIndex; i++) {
+    const struct AwFmSearchRange *range = &blockRanges[i - blockStartIndex];
+    struct AwFmKmerSearchData *searchData = &searchList->kmerSearchData[i];
+    const uint64_t count = awFmSearchRangeLength(range);
+    const uint64_t numHits = count < maxHits ? count : maxHits;
+    if (counts != NULL) {
+      counts[i] = count;
+    }
+    if (!setPositionListCount(searchData, numHits)) {
+      return AwFmAllocationFailure;
+    }
+    dfiSelectSearchRangeRows(range, maxHits, sample, seed,
+                             searchData->positionList);
+    const enum AwFmReturnCode rc =
+        dfiLocateBwtRows(index, cache, suffixArrayCache, stats,
+                         searchData->positionList, numHits);
+    if (awFmReturnCodeIsFailure(rc)) {
+      return rc;
+    }
+  }
+  return AwFmSuccess;
+}
+
+enum AwFmReturnCode dfiParallelSearchLocateLimited(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    struct AwFmKmerSearchList *_RESTRICT_ const searchList,
+    const uint64_t maxHits, const bool sample, const uint64_t seed,
+    struct DfiLocateCache *cache, struct DfiSuffixArrayCache *suffixArrayCache,
+    uint64_t *_RESTRICT_ const counts, struct DfiStats *stats,
+    const uint32_t numThreads) {
+  const size_t searchListCount = searchList->count;
+  // position list counts are 32 bit.
+  const uint64_t hitLimit = maxHits < UINT32_MAX ? maxHits : UINT32_MAX;
+  enum AwFmReturnCode returnCode = AwFmSuccess;
+  if (numThreads > 1) {
+#pragma omp parallel for num_threads(numThreads)
+    for (size_t blockStartIndex = 0; blockStartIndex < searchListCount;
+         blockStartIndex += AW_FM_NUM_CONCURRENT_QUERIES) {
+      const enum AwFmReturnCode rc =
+          locateLimitedInBlock(index, searchList, hitLimit, sample, seed,
+                               cache, suffixArrayCache, counts, stats,
+                               blockStartIndex);
+      if (__builtin_expect(awFmReturnCodeIsFailure(rc), 0)) {
+#pragma omp atomic write
+        returnCode = rc;
+      }
+    }
+    return returnCode;
+  } else {
+    for (size_t blockStartIndex = 0; blockStartIndex < searchListCount;
+         blockStartIndex += AW_FM_NUM_CONCURRENT_QUERIES) {
+      const enum AwFmReturnCode rc =
+          locateLimitedInBlock(index, searchList, hitLimit, sample, seed,
+                               cache, suffixArrayCache, counts, stats,
+                               blockStartIndex);
+      if (__builtin_expect(awFmReturnCodeIsFailure(rc), 0)) {
+        return rc;
+      }
+    }
+    return AwFmSuccess;
+  }
+}
@@ -0,0 +1,419 @@
+#define _DEFAULT_SOURCE
+
+#include <omp.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include "AwFmIndex.h"
+#include "AwFmIndexStruct.h"
+#include "DfiIndex.h"
+#include "FastaVector.h"
+
+// index of the sequence holding the global position, found by binary search
+// over the sequence end positions. Returns count if it lies past the end.
+static size_t
+findSequenceNumber(const struct FastaVectorMetadataVector *_RESTRICT_ metadata,
+                   const uint64_t globalPosition) {
+  size_t lowerBound = 0;
+  size_t upperBound = metadata->count;
+  while (lowerBound < upperBound) {
+    const size_t midpoint = lowerBound + (upperBound - lowerBound) / 2;
+    if (globalPosition < metadata->data[midpoint].sequenceEndPosition) {
+      upperBound = midpoint;
+    } else {
+      lowerBound = midpoint + 1;
+    }
+  }
+  return lowerBound;
+}
+
+enum AwFmReturnCode dfiGetLocalSequencePositions(
+    const struct AwFmIndex *_RESTRICT_ const index,
+    const uint64_t *_RESTRICT_ const globalPositions, const size_t count,
+    uint64_t *_RESTRICT_ const sequenceNumbers,
+    uint64_t *_RESTRICT_ const localPositions, const uint32_t numThreads) {
+  if (index->fastaVector == NULL || index->fastaVector->metadata.count == 0) {
+    return AwFmUnsupportedVersionError;
+  }
+  const struct FastaVectorMetadataVector *metadata =
+      &index->fastaVector->metadata;
+
+  bool illegalPosition = false;
+#pragma omp parallel for num_threads(numThreads) if (numThreads > 1)           \
+    reduction(|| : illegalPosition)
+  for (size_t i = 0; i < count; i++) {
+    const uint64_t globalPosition = globalPositions[i];
+    const size_t sequenceNumber = findSequenceNumber(metadata, globalPosition);
+    if (sequenceNumber == metadata->count) {
+      illegalPosition = true;
+      sequenceNumbers[i] = UINT64_MAX;
+      localPositions[i] = 0;
+      continue;
+    }
+    sequenceNumbers[i] = sequenceNumber;
+    localPositions[i] =
+        sequenceNumber == 0
+            ? globalPosition
+            : globalPosition -
+                  metadata->data[sequenceNumber - 1].sequenceEndPosition;
+  }
+  return illegalPosition ? AwFmIllegalPositionError : AwFmSuccess;
+}
+
+// requests closer than the gap are coalesced, but never into reads longer
+// than this, unless a single request is longer itself.
+#define DFI_MAX_COALESCED_READ_LENGTH (4UL << 20)
+
+struct DfiSequenceBlock {
+  uint64_t blockIndex;
+  char *data;
+  struct DfiSequenceBlock *newer;
+  struct DfiSequenceBlock *older;
+  struct DfiSequenceBlock *bucketNext;
+};
+
+struct DfiSequenceCache {
+  uint64_t blockSize;
+  size_t maxBlocks;
+  size_t numBlocks;
+  size_t numBuckets;
+  struct DfiSequenceBlock **buckets;
+  struct DfiSequenceBlock *newest;
+  struct DfiSequenceBlock *oldest;
+  uint64_t hits;
+  uint64_t misses;
+  omp_lock_t lock;
+};
+
+struct DfiSequenceRequest {
+  uint64_t start;
+  uint64_t length;
+  uint64_t outputOffset;
+};
+
+struct DfiSequenceCache *dfiCreateSequenceCache(const uint64_t blockSize,
+                                                const size_t maxBlocks) {
+  if (blockSize == 0 || maxBlocks == 0) {
+    return NULL;
+  }
+  struct DfiSequenceCache *cache = calloc(1, sizeof(struct DfiSequenceCache));
+  if (cache == NULL) {
+    return NULL;
+  }
+  cache->blockSize = blockSize;
+  cache->maxBlocks = maxBlocks;
+  cache->numBuckets = 2 * maxBlocks;
+  cache->buckets = calloc(cache->numBuckets, sizeof(struct DfiSequenceBlock *));
+  if (cache->buckets == NULL) {
+    free(cache);
+    return NULL;
+  }
+  omp_init_lock(&cache->lock);
+  return cache;
+}
+
+void dfiDeallocSequenceCache(struct DfiSequenceCache *cache) {
+  if (cache == NULL) {
+    return;
+  }
+  struct DfiSequenceBlock *block = cache->newest;
+  while (block != NULL) {
+    struct DfiSequenceBlock *older = block->older;
+    free(block->data);
+    free(block);
+    block = older;
+  }
+  omp_destroy_lock(&cache->lock);
+  free(cache->buckets);
+  free(cache);
+}
+
+void dfiSequenceCacheStats(const struct DfiSequenceCache *_RESTRICT_ cache,
+                           uint64_t *_RESTRICT_ const hits,
+                           uint64_t *_RESTRICT_ const misses) {
+  *hits = cache->hits;
+  *misses = cache->misses;
+}
+
+static inline struct DfiSequenceBlock **
+findBucket(struct DfiSequenceCache *cache, const uint64_t blockIndex) {
+  return &cache->buckets[blockIndex % cache->numBuckets];
+}
+
+static struct DfiSequenceBlock *findBlock(struct DfiSequenceCache *cache,
+                                          const uint64_t blockIndex) {
+  struct DfiSequenceBlock *block = *findBucket(cache, blockIndex);
+  while (block != NULL && block->blockIndex != blockIndex) {
+    block = block->bucketNext;
+  }
+  return block;
+}
+
+static void unlinkBlock(struct DfiSequenceCache *cache,
+                        struct DfiSequenceBlock *block) {
+  if (block->newer != NULL) {
+    block->newer->older = block->older;
+  } else {
+    cache->newest = block->older;
+  }
+  if (block->older != NULL) {
+    block->older->newer = block->newer;
+  } else {
+    cache->oldest = block->newer;
+  }
+}
+
+static void linkNewestBlock(struct DfiSequenceCache *cache,
+                            struct DfiSequenceBlock *block) {
+  block->newer = NULL;
+  block->older = cache->newest;
+  if (cache->newest != NULL) {
+    cache->newest->newer = block;
+  } else {
+    cache->oldest = block;
+  }
+  cache->newest = block;
+}
+
+static void evictOldestBlock(struct DfiSequenceCache *cache) {
+  struct DfiSequenceBlock *block = cache->oldest;
+  unlinkBlock(cache, block);
+  struct DfiSequenceBlock **bucketEntry = findBucket(cache, block->blockIndex);
+  while (*bucketEntry != block) {
+    bucketEntry = &(*bucketEntry)->bucketNext;
+  }
+  *bucketEntry = block->bucketNext;
+  free(block->data);
+  free(block);
+  cache->numBlocks--;
+}
+
+// copies length bytes at offset into the block out of the cache, reading the
+// block from the index file on a miss. The file read happens outside of the
+// lock, so concurrent misses on different blocks don't serialize.
+static enum AwFmReturnCode
+readThroughCache(const struct AwFmIndex *_RESTRICT_ const index,
+                 struct DfiSequenceCache *cache, struct DfiStats *stats,
+                 const uint64_t blockIndex, const uint64_t offset,
+                 const uint64_t length, char *_RESTRICT_ const output) {
+  omp_set_lock(&cache->lock);
+  struct DfiSequenceBlock *block = findBlock(cache, blockIndex);
+  if (block != NULL) {
+    unlinkBlock(cache, block);
+    linkNewestBlock(cache, block);
+    memcpy(output, block->data + offset, length);
+    cache->hits++;
+    omp_unset_lock(&cache->lock);
+    return AwFmFileReadOkay;
+  }
+  cache->misses++;
+  omp_unset_lock(&cache->lock);
+
+  const uint64_t sequenceLength = index->bwtLength - 1;
+  const uint64_t blockStart = blockIndex * cache->blockSize;
+  const uint64_t blockLength = blockStart + cache->blockSize > sequenceLength
+                                   ? sequenceLength - blockStart
+                                   : cache->blockSize;
+  struct DfiSequenceBlock *newBlock = malloc(sizeof(struct DfiSequenceBlock));
+  char *data = malloc(blockLength);
+  if (newBlock == NULL || data == NULL) {
+    free(newBlock);
+    free(data);
+    return AwFmAllocationFailure;
+  }
+  const ssize_t bytesRead = pread(index->fileDescriptor, data, blockLength,
+                                  index->sequenceFileOffset + blockStart);
+  if (bytesRead != (ssize_t)blockLength) {
+    free(newBlock);
+    free(data);
+    return AwFmFileReadFail;
+  }
+  if (stats != NULL) {
+#pragma omp atomic
+    stats->bytesRead += blockLength;
+  }
+  memcpy(output, data + offset, length);
+
+  omp_set_lock(&cache->lock);
+  if (findBlock(cache, blockIndex) != NULL) {
+    // another thread loaded the block in the meantime.
+    free(newBlock);
+    free(data);
+  } else {
+    if (cache->numBlocks == cache->maxBlocks) {
+      evictOldestBlock(cache);
+    }
+    newBlock->blockIndex = blockIndex;
+    newBlock->data = data;
+    struct DfiSequenceBlock **bucket = findBucket(cache, blockIndex);
+    newBlock->bucketNext = *bucket;
+    *bucket = newBlock;
+    linkNewestBlock(cache, newBlock);
+    cache->numBlocks++;
+  }
+  omp_unset_lock(&cache->lock);
+  return AwFmFileReadOkay;
+}
+
+static enum AwFmReturnCode
+readRequestThroughCache(const struct AwFmIndex *_RESTRICT_ const index,
+                        struct DfiSequenceCache *cache, struct DfiStats *stats,
+                        uint64_t start, uint64_t length, char *output) {
+  while (length > 0) {
+    const uint64_t blockIndex = start / cache->blockSize;
+    const uint64_t offset = start % cache->blockSize;
+    const uint64_t chunkLength =
+        cache->blockSize - offset < length ? cache->blockSize - offset : length;
+    const enum AwFmReturnCode rc = readThroughCache(
+        index, cache, stats, blockIndex, offset, chunkLength, output);
+    if (rc != AwFmFileReadOkay) {
+      return rc;
+    }
+    start += chunkLength;
+    length -= chunkLength;
+    output += chunkLength;
+  }
+  return AwFmFileReadOkay;
+}
+
+static int compareRequests(const void *a, const void *b) {
+  const struct DfiSequenceRequest *requestA = a;
+  const struct DfiSequenceRequest *requestB = b;
+  return (requestA->start > requestB->start) -
+         (requestA->start < requestB->start);
+}
+
+// reads the requests sorted by start with one pread per run of requests that
+// lie within maxGap of each other.
+static enum AwFmReturnCode
+readCoalesced(const struct AwFmIndex *_RESTRICT_ const index,
+              const uint64_t *_RESTRICT_ const starts,
+              const uint64_t *_RESTRICT_ const lengths, const size_t count,
+              const uint64_t maxGap, char *_RESTRICT_ const output,
+              const uint64_t *_RESTRICT_ const offsets, struct DfiStats *stats,
+              const uint32_t numThreads) {
+  struct DfiSequenceRequest *requests =
+      malloc(count * sizeof(struct DfiSequenceRequest));
+  size_t *runStarts = malloc((count + 1) * sizeof(size_t));
+  if (requests == NULL || runStarts == NULL) {
+    free(requests);
+    free(runStarts);
+    return AwFmAllocationFailure;
+  }
+  size_t numRequests = 0;
+  for (size_t i = 0; i < count; i++) {
+    if (lengths[i] > 0) {
+      requests[numRequests++] = (struct DfiSequenceRequest){
+          .start = starts[i], .length = lengths[i], .outputOffset = offsets[i]};
+    }
+  }
+  qsort(requests, numRequests, sizeof(struct DfiSequenceRequest),
+        compareRequests);
+
+  size_t numRuns = 0;
+  uint64_t runStart = 0;
+  uint64_t runEnd = 0;
+  for (size_t i = 0; i < numRequests; i++) {
+    const uint64_t requestEnd = requests[i].start + requests[i].length;
+    const uint64_t newEnd = requestEnd > runEnd ? requestEnd : runEnd;
+    if (i == 0 || requests[i].start > runEnd + maxGap ||
+        newEnd - runStart > DFI_MAX_COALESCED_READ_LENGTH) {
+      runStarts[numRuns++] = i;
+      runStart = requests[i].start;
+      runEnd = requestEnd;
+    } else {
+      runEnd = newEnd;
+    }
+  }
+  runStarts[numRuns] = numRequests;
+
+  enum AwFmReturnCode returnCode = AwFmFileReadOkay;
+#pragma omp parallel for schedule(dynamic) num_threads(numThreads)            \
+    if (numThreads > 1)
+  for (size_t run = 0; run < numRuns; run++) {
+    const size_t first = runStarts[run];
+    const size_t last = runStarts[run + 1];
+    const uint64_t start = requests[first].start;
+    uint64_t end = start;
+    for (size_t i = first; i < last; i++) {
+      const uint64_t requestEnd = requests[i].start + requests[i].length;
+      end = requestEnd > end ? requestEnd : end;
+    }
+
+    char *runBuffer = malloc(end - start);
+    if (runBuffer == NULL) {
+#pragma omp atomic write
+      returnCode = AwFmAllocationFailure;
+      continue;
+    }
+    const ssize_t bytesRead = pread(index->fileDescriptor, runBuffer,
+                                    end - start,
+                                    index->sequenceFileOffset + start);
+    if (bytesRead != (ssize_t)(end - start)) {
+#pragma omp atomic write
+      returnCode = AwFmFileReadFail;
+    } else {
+      if (stats != NULL) {
+#pragma omp atomic
+        stats->bytesRead += end - start;
+      }
+      for (size_t i = first; i < last; i++) {
+        memcpy(output + requests[i].outputOffset,
+               runBuffer + (requests[i].start - start), requests[i].length);
+      }
+    }
+    free(runBuffer);
+  }
+
+  free(requests);
+  free(runStarts);
+  return returnCode;
+}
+
+enum AwFmReturnCode
+dfiReadSequences(const struct AwFmIndex *_RESTRICT_ const index,
+                 const char *_RESTRICT_ const sequence,
+                 struct DfiSequenceCache *cache,
+                 const uint64_t *_RESTRICT_ const starts,
+                 const uint64_t *_RESTRICT_ const lengths, const size_t count,
+                 const uint64_t maxGap, char *_RESTRICT_ const output,
+                 uint64_t *_RESTRICT_ const offsets, struct DfiStats *stats,
+                 const uint32_t numThreads) {
+  if (sequence == NULL && !index->config.storeOriginalSequence) {
+    return AwFmUnsupportedVersionError;
+  }
+  const uint64_t sequenceLength = index->bwtLength - 1;
+  uint64_t offset = 0;
+  for (size_t i = 0; i < count; i++) {
+    if (starts[i] > sequenceLength || lengths[i] > sequenceLength - starts[i]) {
+      return AwFmIllegalPositionError;
+    }
+    offsets[i] = offset;
+    offset += lengths[i];
+  }
+  offsets[count] = offset;
+
+  if (sequence == NULL && cache == NULL) {
+    return readCoalesced(index, starts, lengths, count, maxGap, output,
+                         offsets, stats, numThreads);
+  }
+
+  enum AwFmReturnCode returnCode = AwFmFileReadOkay;
+#pragma omp parallel for schedule(dynamic, 64) num_threads(numThreads)        \
+    if (numThreads > 1)
+  for (size_t i = 0; i < count; i++) {
+    if (sequence != NULL) {
+      memcpy(output + offsets[i], sequence + starts[i], lengths[i]);
+      continue;
+    }
+    const enum AwFmReturnCode rc = readRequestThroughCache(
+        index, cache, stats, starts[i], lengths[i], output + offsets[i]);
+    if (rc != AwFmFileReadOkay) {
+#pragma omp atomic write
+      returnCode = rc;
+    }
+  }
+  return returnCode;
+}
@@ -0,0 +1,383 @@
+#define _DEFAULT_SOURCE
+
+#include <omp.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include "AwFmIndex.h"
+#include "AwFmSuffixArray.h"
+#include "DfiClockTable.h"
+#include "DfiIndex.h"
+
+// neighbouring missing pages are read together, but never more than this
+// many at once.
+#define DFI_SUFFIX_ARRAY_CACHE_MAX_READ_PAGES 256
+
+// payload of a cached page: its bytes and how often they were read.
+struct DfiSuffixArrayPage {
+  uint64_t accesses;
+  uint8_t data[];
+};
+
+struct DfiSuffixArrayCache {
+  uint64_t pageSize;
+  uint64_t readaheadPages;
+  uint64_t hits;
+  uint64_t misses;
+  struct DfiClockTable table;
+};
+
+struct DfiSuffixArrayCache *
+dfiCreateSuffixArrayCache(const uint64_t pageSize, const uint64_t maxPages,
+                          const uint64_t readaheadPages) {
+  if (pageSize == 0) {
+    return NULL;
+  }
+  struct DfiSuffixArrayCache *cache =
+      calloc(1, sizeof(struct DfiSuffixArrayCache));
+  if (cache == NULL) {
+    return NULL;
+  }
+  cache->pageSize = pageSize;
+  cache->readaheadPages = readaheadPages;
+  if (!dfiClockTableInit(&cache->table, maxPages,
+                         sizeof(struct DfiSuffixArrayPage) + pageSize)) {
+    free(cache);
+    return NULL;
+  }
+  return cache;
+}
+
+void dfiDeallocSuffixArrayCache(struct DfiSuffixArrayCache *cache) {
+  if (cache == NULL) {
+    return;
+  }
+  dfiClockTableFree(&cache->table);
+  free(cache);
+}
+
+void dfiSuffixArrayCacheStats(struct DfiSuffixArrayCache *cache,
+                              uint64_t *_RESTRICT_ const hits,
+                              uint64_t *_RESTRICT_ const misses) {
+#pragma omp atomic read
+  *hits = cache->hits;
+#pragma omp atomic read
+  *misses = cache->misses;
+}
+
+static bool pageIsResident(struct DfiSuffixArrayCache *cache,
+                           const uint64_t pageIndex) {
+  struct DfiClockShard *shard = dfiClockTableLock(&cache->table, pageIndex);
+  const bool resident =
+      dfiClockTableFind(&cache->table, shard, pageIndex) != NULL;
+  dfiClockTableUnlock(shard);
+  return resident;
+}
+
+// caches a page read from the file, evicting a page that was not used since
+// the clock hand last passed it when the cache is full.
+static void insertPage(struct DfiSuffixArrayCache *cache,
+                       const uint64_t pageIndex,
+                       const uint8_t *_RESTRICT_ const data,
+                       const uint64_t length) {
+  struct DfiClockShard *shard = dfiClockTableLock(&cache->table, pageIndex);
+  bool inserted;
+  struct DfiSuffixArrayPage *page =
+      dfiClockTableInsert(&cache->table, shard, pageIndex, &inserted);
+  if (inserted) {
+    page->accesses = 0;
+    memcpy(page->data, data, length);
+  }
+  dfiClockTableUnlock(shard);
+}
+
+// bytes of the page that lie inside the compressed suffix array.
+static inline uint64_t pageLength(const struct AwFmIndex *_RESTRICT_ index,
+                                  const struct DfiSuffixArrayCache *cache,
+                                  const uint64_t pageIndex) {
+  const uint64_t pageStart = pageIndex * cache->pageSize;
+  const uint64_t byteLength = index->suffixArray.compressedByteLength;
+  if (pageStart >= byteLength) {
+    return 0;
+  }
+  return byteLength - pageStart < cache->pageSize ? byteLength - pageStart
+                                                  : cache->pageSize;
+}
+
+static bool readFully(const struct AwFmIndex *_RESTRICT_ index,
+                      uint8_t *_RESTRICT_ buffer, const uint64_t length,
+                      const uint64_t byteOffset) {
+  uint64_t totalBytesRead = 0;
+  while (totalBytesRead < length) {
+    const ssize_t bytesRead = pread(
+        index->fileDescriptor, buffer + totalBytesRead, length - totalBytesRead,
+        index->suffixArrayFileOffset + byteOffset + totalBytesRead);
+    if (bytesRead <= 0) {
+      return false;
+    }
+    totalBytesRead += bytesRead;
+  }
+  return true;
+}
+
+// reads pages first to last with a single pread and caches all of them.
+static enum AwFmReturnCode
+loadPageSpan(const struct AwFmIndex *_RESTRICT_ const index,
+             struct DfiSuffixArrayCache *cache, struct DfiStats *stats,
+             const uint64_t firstPage, const uint64_t lastPage) {
+  uint64_t spanLength = 0;
+  for (uint64_t page = firstPage; page <= lastPage; page++) {
+    spanLength += pageLength(index, cache, page);
+  }
+  if (spanLength == 0) {
+    return AwFmSuccess;
+  }
+  uint8_t *buffer = malloc(spanLength);
+  if (buffer == NULL) {
+    return AwFmAllocationFailure;
+  }
+  if (!readFully(index, buffer, spanLength, firstPage * cache->pageSize)) {
+    free(buffer);
+    return AwFmFileReadFail;
+  }
+  if (stats != NULL) {
+#pragma omp atomic
+    stats->bytesRead += spanLength;
+  }
+  for (uint64_t page = firstPage; page <= lastPage; page++) {
+    const uint64_t length = pageLength(index, cache, page);
+    if (length == 0) {
+      break;
+    }
+    insertPage(cache, page, buffer + (page - firstPage) * cache->pageSize,
+               length);
+  }
+  free(buffer);
+  return AwFmSuccess;
+}
+
+// caches sorted, distinct pages. Pages at most readaheadPages apart are read
+// with one pread, together with the pages between them.
+static enum AwFmReturnCode
+loadSortedPages(const struct AwFmIndex *_RESTRICT_ const index,
+                struct DfiSuffixArrayCache *cache, struct DfiStats *stats,
+                const uint64_t *_RESTRICT_ const pages,
+                const uint64_t numPages) {
+  uint64_t i = 0;
+  while (i < numPages) {
+    const uint64_t firstPage = pages[i];
+    uint64_t lastPage = firstPage;
+    for (i++; i < numPages; i++) {
+      if (pages[i] - lastPage > cache->readaheadPages + 1 ||
+          pages[i] - firstPage >= DFI_SUFFIX_ARRAY_CACHE_MAX_READ_PAGES) {
+        break;
+      }
+      lastPage = pages[i];
+    }
+    const enum AwFmReturnCode rc =
+        loadPageSpan(index, cache, stats, firstPage, lastPage);
+    if (rc != AwFmSuccess) {
+      return rc;
+    }
+  }
+  return AwFmSuccess;
+}
+
+static int compareUint64(const void *a, const void *b) {
+  const uint64_t x = *(const uint64_t *)a;
+  const uint64_t y = *(const uint64_t *)b;
+  return (x > y) - (x < y);
+}
+
+// sorts the pages and drops duplicates, returning the new count.
+static uint64_t sortDistinctPages(uint64_t *_RESTRICT_ const pages,
+                                  const uint64_t numPages) {
+  if (numPages == 0) {
+    return 0;
+  }
+  qsort(pages, numPages, sizeof(uint64_t), compareUint64);
+  uint64_t numDistinct = 1;
+  for (uint64_t i = 1; i < numPages; i++) {
+    if (pages[i] != pages[numDistinct - 1]) {
+      pages[numDistinct++] = pages[i];
+    }
+  }
+  return numDistinct;
+}
+
+// copies length bytes at offset into the page out of the cache, reading the
+// page from the index file if it was evicted.
+static enum AwFmReturnCode
+copyFromPage(const struct AwFmIndex *_RESTRICT_ const index,
+             struct DfiSuffixArrayCache *cache, struct DfiStats *stats,
+             const uint64_t pageIndex, const uint64_t offset,
+             const uint64_t length, uint8_t *_RESTRICT_ const output) {
+  struct DfiClockShard *shard = dfiClockTableLock(&cache->table, pageIndex);
+  struct DfiSuffixArrayPage *page =
+      dfiClockTableFind(&cache->table, shard, pageIndex);
+  if (page != NULL) {
+    page->accesses++;
+    memcpy(output, page->data + offset, length);
+    dfiClockTableUnlock(shard);
+    return AwFmSuccess;
+  }
+  dfiClockTableUnlock(shard);
+
+  const uint64_t pageBytes = pageLength(index, cache, pageIndex);
+  uint8_t *buffer = malloc(cache->pageSize);
+  if (buffer == NULL) {
+    return AwFmAllocationFailure;
+  }
+  if (!readFully(index, buffer, pageBytes, pageIndex * cache->pageSize)) {
+    free(buffer);
+    return AwFmFileReadFail;
+  }
+  if (stats != NULL) {
+#pragma omp atomic
+    stats->bytesRead += pageBytes;
+  }
+  memcpy(output, buffer + offset, length);
+  insertPage(cache, pageIndex, buffer, pageBytes);
+  free(buffer);
+  return AwFmSuccess;
+}
+
+// reads a sampled suffix array value like awFmGetSuffixArrayValueFromFile.
+static enum AwFmReturnCode
+readValue(const struct AwFmIndex *_RESTRICT_ const index,
+          struct DfiSuffixArrayCache *cache, struct DfiStats *stats,
+          const uint64_t sampleIndex, uint64_t *_RESTRICT_ const value) {
+  const uint8_t valueBitWidth = index->suffixArray.valueBitWidth;
+  const struct AwFmSuffixArrayOffset offset =
+      awFmGetOffsetIntoSuffixArrayByteArray(valueBitWidth, sampleIndex);
+  // 9 bytes hold any value, ceil((7 + 64) / 8).
+  uint8_t valueBuffer[9] = {0};
+  const uint64_t bytesToRead = (offset.bitOffset + valueBitWidth + 7) / 8;
+  uint64_t bytesCopied = 0;
+  while (bytesCopied < bytesToRead) {
+    // a value may straddle two pages.
+    const uint64_t byteOffset = offset.byteOffset + bytesCopied;
+    const uint64_t pageIndex = byteOffset / cache->pageSize;
+    const uint64_t pageOffset = byteOffset % cache->pageSize;
+    const uint64_t available = cache->pageSize - pageOffset;
+    const uint64_t length = bytesToRead - bytesCopied < available
+                                ? bytesToRead - bytesCopied
+                                : available;
+    const enum AwFmReturnCode rc =
+        copyFromPage(index, cache, stats, pageIndex, pageOffset, length,
+                     valueBuffer + bytesCopied);
+    if (rc != AwFmSuccess) {
+      return rc;
+    }
+    bytesCopied += length;
+  }
+
+  uint64_t result;
+  memcpy(&result, valueBuffer, 8);
+  result >>= offset.bitOffset;
+  if (offset.bitOffset != 0) {
+    result |= ((uint64_t)valueBuffer[8]) << (64 - offset.bitOffset);
+  }
+  if (valueBitWidth < 64) {
+    result &= (1ULL << valueBitWidth) - 1;
+  }
+  *value = result;
+  return AwFmSuccess;
+}
+
+enum AwFmReturnCode
+dfiSuffixArrayCacheReadPositions(const struct AwFmIndex *_RESTRICT_ const index,
+                                 struct DfiSuffixArrayCache *cache,
+                                 struct DfiStats *stats,
+                                 uint64_t *_RESTRICT_ const positions,
+                                 const uint64_t numPositions) {
+  if (numPositions == 0) {
+    return AwFmFileReadOkay;
+  }
+  // the first and last page of every value.
+  uint64_t *missingPages = malloc(2 * numPositions * sizeof(uint64_t));
+  if (missingPages == NULL) {
+    return AwFmAllocationFailure;
+  }
+  const uint8_t valueBitWidth = index->suffixArray.valueBitWidth;
+  const uint64_t compressionRatio = index->config.suffixArrayCompressionRatio;
+  uint64_t numMissing = 0;
+  uint64_t hits = 0;
+  for (uint64_t i = 0; i < numPositions; i++) {
+    const struct AwFmSuffixArrayOffset offset =
+        awFmGetOffsetIntoSuffixArrayByteArray(valueBitWidth,
+                                              positions[i] / compressionRatio);
+    const uint64_t lastByte =
+        offset.byteOffset + (offset.bitOffset + valueBitWidth - 1) / 8;
+    const uint64_t firstPage = offset.byteOffset / cache->pageSize;
+    const uint64_t lastPage = lastByte / cache->pageSize;
+    bool resident = true;
+    for (uint64_t page = firstPage; page <= lastPage; page++) {
+      if (!pageIsResident(cache, page)) {
+        missingPages[numMissing++] = page;
+        resident = false;
+      }
+    }
+    hits += resident;
+  }
+#pragma omp atomic
+  cache->hits += hits;
+#pragma omp atomic
+  cache->misses += numPositions - hits;
+
+  numMissing = sortDistinctPages(missingPages, numMissing);
+  enum AwFmReturnCode rc =
+      loadSortedPages(index, cache, stats, missingPages, numMissing);
+  free(missingPages);
+  for (uint64_t i = 0; i < numPositions && rc == AwFmSuccess; i++) {
+    // pages evicted since the prefetch by a full cache are read again.
+    rc = readValue(index, cache, stats, positions[i] / compressionRatio,
+                   &positions[i]);
+  }
+  return rc == AwFmSuccess ? AwFmFileReadOkay : rc;
+}
+
+enum AwFmReturnCode
+dfiSuffixArrayCacheWarm(const struct AwFmIndex *_RESTRICT_ const index,
+                        struct DfiSuffixArrayCache *cache,
+                        const uint64_t *_RESTRICT_ const pages,
+                        const uint64_t numPages) {
+  uint64_t *sortedPages = malloc((numPages + 1) * sizeof(uint64_t));
+  if (sortedPages == NULL) {
+    return AwFmAllocationFailure;
+  }
+  uint64_t numSorted = 0;
+  for (uint64_t i = 0; i < numPages; i++) {
+    if (pageLength(index, cache, pages[i]) != 0) {
+      sortedPages[numSorted++] = pages[i];
+    }
+  }
+  numSorted = sortDistinctPages(sortedPages, numSorted);
+  const enum AwFmReturnCode rc =
+      loadSortedPages(index, cache, NULL, sortedPages, numSorted);
+  free(sortedPages);
+  return rc;
+}
+
+uint64_t dfiSuffixArrayCacheProfile(struct DfiSuffixArrayCache *cache,
+                                    uint64_t *_RESTRICT_ const pages,
+                                    uint64_t *_RESTRICT_ const accesses,
+                                    const uint64_t maxPages) {
+  uint64_t numPages = 0;
+  for (size_t i = 0; i < cache->table.numShards; i++) {
+    struct DfiClockShard *shard = &cache->table.shards[i];
+    omp_set_lock(&shard->lock);
+    for (uint32_t slot = 0; slot < shard->count && numPages < maxPages;
+         slot++) {
+      const struct DfiSuffixArrayPage *page =
+          dfiClockTablePayload(&cache->table, shard, slot);
+      pages[numPages] = shard->slots[slot].key;
+      accesses[numPages] = page->accesses;
+      numPages++;
+    }
+    omp_unset_lock(&shard->lock);
+  }
+  return numPages;
+}
@@ -12,7 +12,7 @@
  *    or 2 128-bit vectors on ARM neon.
  *
  *  Inputs:
- *    memAddr: Memory address to load, this should be aligned to a 32B boundary
+ *    memAddr: Memory address to load, ideally aligned to a 32B boundary
  *
  *  Returns:
  *    AwFmSimdVec256 containing the loaded data.
@@ -6,8 +6,19 @@ from ._dna_fm_index import (
     Index,
     read_index_from_file,
     KmerSearchList,
+    KmerSearchListPool,
+    BuildStage,
+    SearchCursor,
+    ApproximateHits,
+    CacheStats,
 )
+from ._stats import IndexStats
+from ._stream import ReadHits, SearchStream
+from ._sharded_index import ShardedIndex
+from ._tuning import TrialResult, TuningReport, tune_configuration
 
 __all__ = [ "IndexConfiguration", "SearchRange", "Index", "read_index_from_file",
-    "KmerSearchList",
+    "KmerSearchList", "KmerSearchListPool", "BuildStage", "SearchCursor", "ReadHits",
+    "SearchStream", "ApproximateHits", "CacheStats", "ShardedIndex",
+    "IndexStats", "TrialResult", "TuningReport", "tune_configuration",
 ]  # fmt: skip
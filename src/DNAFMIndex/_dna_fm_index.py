@@ -1,19 +1,87 @@
+from array import array
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from enum import IntEnum
+from functools import partial, wraps
+from itertools import accumulate, chain
+import json
 import logging
+import mmap
 import os
 from pathlib import Path
+import tempfile
+import threading
+from typing import BinaryIO
 
 import ctypes
 from . import _dna_fm_index_ctypes as _dfi
+from ._query_cache import QueryCache
+from ._stats import IndexStats
 
 logger = logging.getLogger(__name__)
 
 __all__ = [ "IndexConfiguration", "SearchRange", "Index", "read_index_from_file",
-    "KmerSearchList",
+    "KmerSearchList", "KmerSearchListPool", "BuildStage", "SearchCursor",
+    "ApproximateHits", "CacheStats",
 ]  # fmt: skip
 
 
+_default_executor: ThreadPoolExecutor | None = None
+_default_executor_lock = threading.Lock()
+
+
+def _get_default_executor() -> ThreadPoolExecutor:
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(thread_name_prefix="DNAFMIndex")
+        return _default_executor
+
+
+async def _run_in_executor(executor: Executor | None, func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor or _get_default_executor(), partial(func, *args)
+    )
+
+
+def _instrumented(operation: str, get_stats=None):
+    # Records the calls of the method when its index has stats enabled,
+    # self._stats unless get_stats finds the index among the arguments.
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if get_stats is None:
+                stats = self._stats
+            else:
+                stats = get_stats(self, *args, **kwargs)
+            if stats is None:
+                return method(self, *args, **kwargs)
+            with stats.operation(operation):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def _index_stats(_self, index, *args, **kwargs) -> IndexStats | None:
+    return index._stats
+
+
+def _call_native(stats: IndexStats | None, func, *args):
+    if stats is None:
+        return func(*args)
+    return stats.native(func, *args)
+
+
+def _stats_counters(stats: IndexStats | None):
+    return None if stats is None else stats.counters
+
+
 class ReturnCode(IntEnum):
     Success = 1
     FileReadOkay = 2
@@ -35,6 +103,25 @@ class ReturnCode(IntEnum):
     FileAlreadyExists = -15
 
 
+class BuildStage(IntEnum):
+    Sanitize = 0
+    SuffixArray = 1
+    Bwt = 2
+    KmerSeedTable = 3
+    CompressSuffixArray = 4
+    WriteFile = 5
+
+
+def _build_progress_callback(progress: Callable[[BuildStage, int, int], None] | None):
+    if progress is None:
+        return _dfi._BuildProgressCallback()
+
+    def callback(stage: int, done: int, total: int, _user_data) -> None:
+        progress(BuildStage(stage), done, total)
+
+    return _dfi._BuildProgressCallback(callback)
+
+
 class IndexConfiguration:
     def __init__(
         self,
@@ -99,17 +186,71 @@ class SearchRange:
     end_ptr: int
 
 
+@dataclass
+class CacheStats:
+    hits: int
+    misses: int
+
+
 class Index:
+    """FM-index over a DNA, RNA or amino acid database.
+
+    Thread safety: a loaded index is read-only, and every search and
+    sequence read only performs positional reads (pread) on the index file,
+    so any number of threads may call find_search_range_for_string, count,
+    locate and read_sequence_from_file, or search their own KmerSearchList,
+    against one shared index at the same time. The C calls release the GIL,
+    so these threads run in parallel. A single KmerSearchList must not be
+    used by two threads at once, and the index must outlive every call made
+    on it. The ``*_async`` methods run on ``executor``, or a shared module
+    level thread pool when it is None.
+    """
+
     _index = None
+    _index_address: int | None = None
+    _mapping_length: int | None = None
+    _sequence = None
+    _sequence_address: int | None = None
+    _sequence_cache = None
+    _locate_cache = None
+    _locate_cache_address: int | None = None
+    _suffix_array_cache = None
+    _suffix_array_cache_address: int | None = None
+    _suffix_array_cache_pages = 0
+    _suffix_array_page_size = 0
+    _query_cache: QueryCache | None = None
+    _stats: IndexStats | None = None
+    executor: Executor | None = None
 
     def __init__(
         self,
         config: IndexConfiguration | None = None,
         file_path: str | None = None,
-        sequence: str | None = None,
+        sequence: str | bytes | BinaryIO | os.PathLike | None = None,
         fasta_path: str | None = None,
         index_ptr: ctypes._Pointer | None = None,
+        num_threads: int = 1,
+        progress: Callable[[BuildStage, int, int], None] | None = None,
+        memory_limit: int | None = None,
+        temp_dir: str | None = None,
     ) -> None:
+        """Build a new index file from ``sequence`` or ``fasta_path``.
+
+        ``sequence`` may be a str, any bytes-like object, or a binary file
+        or path to a raw sequence file. Bytes-like objects are passed to the
+        build without a copy (read-only ones other than bytes are copied
+        once), and files are memory-mapped.
+
+        The build runs on ``num_threads`` threads (0 for the OpenMP default)
+        and writes the same file whatever the thread count. ``progress`` is
+        called as ``progress(stage, done, total)`` from the calling thread.
+
+        With ``memory_limit`` (in bytes) the suffix array is sorted in
+        partitions that fit the limit and spilled to a temporary file in
+        ``temp_dir`` instead of being held in memory, at the cost of a
+        slower build. Suffixes are compared letter by letter in this mode,
+        so sequences with long exact repeats sort much more slowly.
+        """
         if not index_ptr:
             if not all(( config.alphabet_type, config.keep_suffix_array_in_memory,
                     config.kmer_length_in_seed_table, config.store_original_sequence,
@@ -129,32 +270,49 @@ class Index:
                     raise FileNotFoundError(file_path)
 
             index_ptr = ctypes.POINTER(_dfi._Index)()
+            if num_threads < 0:
+                raise ValueError("Invalid number of threads")
+            progress_callback = _build_progress_callback(progress)
 
-            if sequence:
-                sequence_bytes = sequence.encode()
-                sequence_bytes_length = len(sequence_bytes)
-                sequence_array = (
-                    ctypes.c_uint8 * sequence_bytes_length
-                ).from_buffer_copy(sequence_bytes)
+            if memory_limit is not None and memory_limit <= 0:
+                raise ValueError("Invalid memory limit")
+            temp_dir_bytes = None
+            if memory_limit:
+                temp_dir_bytes = os.fsencode(temp_dir or tempfile.gettempdir())
 
-                return_code: int = _dfi._create_index(
-                    ctypes.byref(index_ptr),
-                    ctypes.byref(config._config),
-                    sequence_array,
-                    sequence_bytes_length,
-                    file_path_bytes,
-                )
+            if sequence is not None:
+                with _sequence_buffer(sequence) as (address, size):
+                    return_code: int = _dfi._create_index_parallel(
+                        ctypes.byref(index_ptr),
+                        ctypes.byref(config._config),
+                        address,
+                        size,
+                        None,
+                        file_path_bytes,
+                        num_threads,
+                        memory_limit or 0,
+                        temp_dir_bytes,
+                        progress_callback,
+                        None,
+                    )
             elif fasta_path:
                 if os.path.exists(fasta_path):
                     fasta_path_bytes = fasta_path.encode()
                 else:
                     raise FileNotFoundError(fasta_path)
 
-                return_code: int = _dfi._create_index_from_fasta(
+                return_code: int = _dfi._create_index_parallel(
                     ctypes.byref(index_ptr),
                     ctypes.byref(config._config),
+                    None,
+                    0,
                     fasta_path_bytes,
                     file_path_bytes,
+                    num_threads,
+                    memory_limit or 0,
+                    temp_dir_bytes,
+                    progress_callback,
+                    None,
                 )
             else:
                 raise ValueError("No data provided for index building.")
@@ -181,29 +339,360 @@ class Index:
             ):
                 raise TypeError("index_ptr is not a valid pointer type.")
         self._index = index_ptr
+        # The compiled fast paths take the index by address.
+        self._index_address = ctypes.cast(index_ptr, ctypes.c_void_p).value
+        # Lists grown by a large batch are freed instead of kept for the
+        # lifetime of the index.
+        self._search_lists = KmerSearchListPool(
+            64, max_idle=os.cpu_count() or 1, max_capacity=1 << 16
+        )
+        self._headers: dict[int, str] = {}
 
+    @_instrumented("find_search_range_for_string")
     def find_search_range_for_string(self, kmer: str) -> SearchRange | None:
+        cache = self._query_cache
+        native = _dfi._native
+        if native is not None and cache is None and self._stats is None:
+            if not kmer:
+                raise ValueError("Invalid length")
+            start_ptr, end_ptr = native.find_search_range(self._index_address, kmer)
+            if start_ptr >= end_ptr:
+                return None
+            return SearchRange(start_ptr, end_ptr)
         kmer_bytes = kmer.encode()
         kmer_length = len(kmer_bytes)
         if kmer_length == 0:
             raise ValueError("Invalid length")
-        search_range: _dfi._SearchRange = _dfi._find_search_range_for_string(
-            self._index, kmer_bytes, kmer_length
+        if cache is not None and (cached := cache.get_many([(_RANGE, kmer)])[0]):
+            start_ptr, end_ptr = cached
+        else:
+            search_range: _dfi._SearchRange = _call_native(
+                self._stats,
+                _dfi._find_search_range_for_string,
+                self._index,
+                kmer_bytes,
+                kmer_length,
+            )
+            start_ptr, end_ptr = search_range.start_ptr, search_range.end_ptr
+            if cache is not None:
+                cache.put_many([((_RANGE, kmer), (start_ptr, end_ptr), kmer_length)])
+        if start_ptr >= end_ptr:
+            return None
+        return SearchRange(start_ptr, end_ptr)
+
+    @_instrumented("count")
+    def count(
+        self, kmers: list[str], num_threads: int = 1, both_strands: bool = False
+    ) -> memoryview:
+        """Return the number of occurrences of every kmer as a uint64 array.
+
+        With ``both_strands`` the reverse complement of every kmer is counted
+        in the same pass and an (n, 2) array of (forward, reverse) counts is
+        returned.
+        """
+        return self.count_many(kmers, num_threads, both_strands=both_strands)
+
+    @_instrumented("count_many")
+    def count_many(
+        self,
+        patterns,
+        num_threads: int = 1,
+        kmer_length: int | None = None,
+        lengths=None,
+        both_strands: bool = False,
+    ) -> memoryview:
+        """Return the count of every pattern as a uint64 array.
+
+        ``patterns`` is a list of str, or a packed bytes-like buffer described
+        by ``kmer_length`` or ``lengths`` as in ``KmerSearchList.fill_packed``.
+        All patterns are searched in a single C call. With ``both_strands``
+        the result is an (n, 2) array of forward and reverse complement
+        counts.
+        """
+        _, counts = self._search_ranges(
+            patterns, num_threads, kmer_length, lengths, False, both_strands
+        )
+        return counts
+
+    @_instrumented("ranges_many")
+    def ranges_many(
+        self,
+        patterns,
+        num_threads: int = 1,
+        kmer_length: int | None = None,
+        lengths=None,
+    ) -> memoryview:
+        """Return the BWT range of every pattern as an (n, 2) uint64 array.
+
+        Rows are inclusive ``(start_ptr, end_ptr)`` pairs and patterns that
+        do not occur have ``start_ptr > end_ptr``. Takes the same patterns as
+        ``count_many``.
+        """
+        ranges, _ = self._search_ranges(
+            patterns, num_threads, kmer_length, lengths, ranges=True
+        )
+        return ranges
+
+    def _search_ranges(
+        self,
+        patterns,
+        num_threads: int,
+        kmer_length,
+        lengths,
+        ranges: bool,
+        both_strands: bool = False,
+    ) -> tuple[memoryview | None, memoryview]:
+        if both_strands:
+            self._check_nucleotide()
+        packed = kmer_length is not None or lengths is not None
+        if kmer_length is not None:
+            if kmer_length <= 0:
+                raise ValueError("Invalid length")
+            num_patterns = memoryview(patterns).nbytes // kmer_length
+        elif lengths is not None:
+            num_patterns = len(lengths)
+        else:
+            num_patterns = len(patterns)
+        if num_patterns == 0:
+            # memoryview can't take a (0, 2) shape, so no rows is just empty.
+            empty = _uint64_view((ctypes.c_uint64 * 0)())
+            return (empty if ranges else None), empty
+        if self._query_cache is not None and not packed and not both_strands:
+            return self._search_ranges_cached(patterns, num_threads, ranges)
+        native = _dfi._native
+        if native is not None and not (packed or both_strands or self._stats):
+            counts = bytearray(8 * num_patterns)
+            range_data = bytearray(16 * num_patterns) if ranges else None
+            native.search_ranges(
+                self._index_address, patterns, range_data, counts, num_threads
+            )
+            if range_data is None:
+                return None, memoryview(counts).cast("Q")
+            range_view = memoryview(range_data).cast("Q", [num_patterns, 2])
+            return range_view, memoryview(counts).cast("Q")
+        num_kmers = 2 * num_patterns if both_strands else num_patterns
+        with self._search_lists.search_list(num_kmers) as search_list:
+            if packed:
+                search_list.fill_packed(patterns, kmer_length, lengths)
+            else:
+                search_list.fill(patterns)
+            if not both_strands:
+                return search_list.parallel_search_ranges(self, num_threads, ranges)
+            search_list.add_reverse_complements()
+            _, counts = search_list.parallel_search_ranges(self, num_threads, False)
+            return None, counts.cast("B").cast("Q", [num_patterns, 2])
+
+    def _search_ranges_cached(
+        self, patterns: list[str], num_threads: int, ranges: bool
+    ) -> tuple[memoryview | None, memoryview]:
+        # Only the patterns missing from the query cache are searched.
+        cache = self._query_cache
+        cached = cache.get_many([(_RANGE, pattern) for pattern in patterns])
+        if misses := _group_misses(patterns, cached):
+            with self._search_lists.search_list(len(misses)) as search_list:
+                search_list.fill(list(misses))
+                miss_ranges, _ = search_list.parallel_search_ranges(self, num_threads)
+            for indices, (start_ptr, end_ptr) in zip(
+                misses.values(), miss_ranges.tolist()
+            ):
+                for i in indices:
+                    cached[i] = (start_ptr, end_ptr)
+            cache.put_many(
+                ((_RANGE, pattern), cached[indices[0]], len(pattern))
+                for pattern, indices in misses.items()
+            )
+        num_patterns = len(patterns)
+        counts = (ctypes.c_uint64 * num_patterns)(
+            *(end - start + 1 if end >= start else 0 for start, end in cached)
         )
-        if search_range.start_ptr >= search_range.end_ptr:
+        if not ranges:
+            return None, _uint64_view(counts)
+        range_array = (ctypes.c_uint64 * (2 * num_patterns))(*chain(*cached))
+        range_view = _uint64_view(range_array).cast("B").cast("Q", [num_patterns, 2])
+        return range_view, _uint64_view(counts)
+
+    @_instrumented("locate")
+    def locate(
+        self,
+        kmers: list[str],
+        num_threads: int = 1,
+        both_strands: bool = False,
+        max_hits: int | None = None,
+        sample: bool = False,
+        seed: int = 0,
+    ) -> tuple[memoryview, ...]:
+        """Return the positions of every kmer as CSR positions and offsets.
+
+        With ``both_strands`` the reverse complement of every kmer is located
+        in the same pass, its positions follow the forward ones and a third
+        uint8 array gives the strand of every position, 0 for forward and 1
+        for reverse complement.
+
+        ``max_hits`` locates at most that many positions per kmer (and per
+        strand), the first rows of its range or with ``sample`` a random
+        subset seeded by ``seed``. The full counts are then returned as a
+        last array, shaped like the result of ``count``.
+        """
+        if both_strands:
+            self._check_nucleotide()
+        if max_hits is not None:
+            _check_max_hits(max_hits)
+        if not kmers:
+            result = (
+                _uint64_view((ctypes.c_uint64 * 0)()),
+                _uint64_view((ctypes.c_uint64 * 1)()),
+            )
+            if both_strands:
+                result += (memoryview(b""),)
+            if max_hits is not None:
+                result += (_uint64_view((ctypes.c_uint64 * 0)()),)
+            return result
+        cache = self._query_cache
+        if cache is not None and cache.positions and not both_strands:
+            if max_hits is None:
+                return self._locate_cached(kmers, num_threads)
+        native = _dfi._native
+        if native is not None and max_hits is None:
+            if not (both_strands or self._stats):
+                positions, offsets = native.locate(
+                    self._index_address,
+                    kmers,
+                    self._locate_cache_address,
+                    self._suffix_array_cache_address,
+                    num_threads,
+                )
+                return memoryview(positions).cast("Q"), memoryview(offsets).cast("Q")
+        num_kmers = 2 * len(kmers) if both_strands else len(kmers)
+        with self._search_lists.search_list(num_kmers) as search_list:
+            search_list.fill(kmers)
+            if both_strands:
+                search_list.add_reverse_complements()
+            search_list.parallel_search_locate(
+                self, num_threads, max_hits, sample, seed
+            )
+            if both_strands:
+                result = search_list.strand_positions_csr()
+            else:
+                result = search_list.positions_csr()
+            if max_hits is None:
+                return result
+            counts = search_list.total_counts()
+            if both_strands:
+                counts = counts.cast("B").cast("Q", [len(kmers), 2])
+            return (*result, counts)
+
+    def _locate_cached(
+        self, kmers: list[str], num_threads: int
+    ) -> tuple[memoryview, memoryview]:
+        # Positions are cached as packed uint64 bytes per kmer.
+        cache = self._query_cache
+        cached = cache.get_many([(_POSITIONS, kmer) for kmer in kmers])
+        if misses := _group_misses(kmers, cached):
+            with self._search_lists.search_list(len(misses)) as search_list:
+                search_list.fill(list(misses))
+                search_list.parallel_search_locate(self, num_threads)
+                positions, offsets = search_list.positions_csr()
+            data = positions.cast("B")
+            for j, indices in enumerate(misses.values()):
+                kmer_positions = bytes(data[8 * offsets[j] : 8 * offsets[j + 1]])
+                for i in indices:
+                    cached[i] = kmer_positions
+            cache.put_many(
+                (
+                    (_POSITIONS, kmer),
+                    cached[indices[0]],
+                    len(cached[indices[0]]) + len(kmer),
+                )
+                for kmer, indices in misses.items()
+            )
+        offsets = (ctypes.c_uint64 * (len(kmers) + 1))(
+            *accumulate((len(positions) // 8 for positions in cached), initial=0)
+        )
+        data = b"".join(cached)
+        positions = (ctypes.c_uint64 * (len(data) // 8)).from_buffer_copy(data)
+        return _uint64_view(positions), _uint64_view(offsets)
+
+    def enable_query_cache(self, max_bytes: int = 64 << 20, positions: bool = False):
+        """Cache search results per pattern for patterns that recur.
+
+        ``count``, ``count_many`` and ``ranges_many`` (with a list of str),
+        and ``find_search_range_for_string``, then look every pattern up
+        first and only search the misses. With ``positions`` the positions
+        found by ``locate`` are cached as well. Entries are evicted least
+        recently used first once their estimated size exceeds
+        ``max_bytes``. Replaces any previous cache.
+        """
+        self._query_cache = QueryCache(max_bytes, positions)
+
+    @property
+    def query_cache_stats(self) -> CacheStats | None:
+        """Hits and misses of the query cache, or None without a cache."""
+        if (cache := self._query_cache) is None:
             return None
-        return SearchRange(search_range.start_ptr, search_range.end_ptr)
+        return CacheStats(cache.hits, cache.misses)
+
+    def _check_nucleotide(self):
+        if self.config.alphabet_type == 1:
+            raise ValueError("Reverse complements need a nucleotide index.")
+
+    async def count_async(
+        self, kmers: list[str], num_threads: int = 1, both_strands: bool = False
+    ) -> memoryview:
+        return await _run_in_executor(
+            self.executor, self.count, kmers, num_threads, both_strands
+        )
 
+    async def locate_async(
+        self,
+        kmers: list[str],
+        num_threads: int = 1,
+        both_strands: bool = False,
+        max_hits: int | None = None,
+        sample: bool = False,
+        seed: int = 0,
+    ) -> tuple[memoryview, ...]:
+        return await _run_in_executor(
+            self.executor,
+            self.locate,
+            kmers,
+            num_threads,
+            both_strands,
+            max_hits,
+            sample,
+            seed,
+        )
+
+    async def find_search_range_for_string_async(self, kmer: str) -> SearchRange | None:
+        return await _run_in_executor(
+            self.executor, self.find_search_range_for_string, kmer
+        )
+
+    async def read_sequence_from_file_async(
+        self, start: int, segment_length: int
+    ) -> str:
+        return await _run_in_executor(
+            self.executor, self.read_sequence_from_file, start, segment_length
+        )
+
+    @_instrumented("read_sequence_from_file")
     def read_sequence_from_file(self, start: int, segment_length: int) -> str:
         if start < 0:
             raise ValueError("The start position must be more or equal to 0")
         if segment_length <= 0:
             return ""
+        native = _dfi._native
+        if native is not None and self._stats is None:
+            return native.read_sequence(self._index_address, start, segment_length)
 
         buffer_size = segment_length + 1
         buffer = ctypes.create_string_buffer(buffer_size)
-        return_code: int = _dfi._read_sequence_from_file(
-            self._index, start, segment_length, buffer
+        return_code: int = _call_native(
+            self._stats,
+            _dfi._read_sequence_from_file,
+            self._index,
+            start,
+            segment_length,
+            buffer,
         )
 
         if return_code == ReturnCode.FileReadFail:
@@ -216,6 +705,519 @@ class Index:
             )
         return buffer.value.decode()
 
+    @_instrumented("read_sequences")
+    def read_sequences(
+        self, starts, lengths, num_threads: int = 1, max_gap: int = 4096
+    ) -> tuple[memoryview, memoryview]:
+        """Read many segments of the stored sequence in a single call.
+
+        ``starts`` and ``lengths`` are sequences or uint64 buffers, and
+        ``lengths`` may also be one int shared by every segment. The
+        segments are copied back to back into one preallocated buffer,
+        returned as a uint8 array with uint64 offsets: segment i is
+        ``sequences[offsets[i]:offsets[i + 1]]``.
+
+        Segments are copied from the copy made by ``load_sequence``, else
+        read through the block cache of ``enable_sequence_cache``, else
+        read from the index file, where segments within ``max_gap`` bytes of
+        each other share one read. Reads run on ``num_threads`` threads.
+        """
+        starts_array = _as_uint64_array(starts)
+        num_segments = len(starts_array)
+        if isinstance(lengths, int):
+            if lengths < 0:
+                raise ValueError("Invalid length")
+            total = lengths * num_segments
+            lengths = array("Q", [lengths]) * num_segments
+            lengths_array = _as_uint64_array(lengths)
+        else:
+            lengths_array = _as_uint64_array(lengths)
+            total = sum(_uint64_view(lengths_array))
+        if len(lengths_array) != num_segments:
+            raise ValueError("Starts and lengths must have the same size.")
+        sequences = (ctypes.c_char * total)()
+        offsets = (ctypes.c_uint64 * (num_segments + 1))()
+        return_code = _call_native(
+            self._stats,
+            _dfi._read_sequences,
+            self._index,
+            self._sequence_address,
+            self._sequence_cache,
+            starts_array,
+            lengths_array,
+            num_segments,
+            max_gap,
+            sequences,
+            offsets,
+            _stats_counters(self._stats),
+            num_threads,
+        )
+        if return_code == ReturnCode.FileReadFail:
+            raise IOError("Could not read the index file.")
+        elif return_code == ReturnCode.IllegalPositionError:
+            raise ValueError("Segment reaches past the end of the sequence.")
+        elif return_code == ReturnCode.UnsupportedVersionError:
+            raise Exception(
+                "The index was configured to not store the original sequence."
+            )
+        elif return_code == ReturnCode.AllocationFailure:
+            raise MemoryError("Could not allocate the read buffers.")
+        return memoryview(sequences).cast("B"), _uint64_view(offsets)
+
+    def load_sequence(self, use_mmap: bool = True):
+        """Serve ``read_sequences`` from memory instead of the index file.
+
+        With ``use_mmap`` the stored sequence is memory mapped, paged in on
+        demand and shared through the page cache. Otherwise it is read into
+        private memory once. Must not be called while other threads read.
+        """
+        if not self.config.store_original_sequence:
+            raise Exception(
+                "The index was configured to not store the original sequence."
+            )
+        length = self.bwt_length - 1
+        offset = self.sequence_file_offset
+        if use_mmap:
+            aligned_offset = offset - offset % mmap.ALLOCATIONGRANULARITY
+            # Copy-on-write so ctypes can take its address; it is never written.
+            sequence = mmap.mmap(
+                self.file_descriptor,
+                length + offset - aligned_offset,
+                access=mmap.ACCESS_COPY,
+                offset=aligned_offset,
+            )
+            start = offset - aligned_offset
+        else:
+            sequence = bytearray(length)
+            view = memoryview(sequence)
+            read = 0
+            while read < length:
+                n = os.preadv(self.file_descriptor, [view[read:]], offset + read)
+                if n == 0:
+                    raise IOError("Could not read the index file.")
+                read += n
+            start = 0
+        self._sequence = (ctypes.c_char * length).from_buffer(sequence, start)
+        self._sequence_address = ctypes.addressof(self._sequence)
+
+    def enable_sequence_cache(self, block_size: int = 65536, max_blocks: int = 1024):
+        """Read ``read_sequences`` segments through an LRU block cache.
+
+        Up to ``max_blocks`` blocks of ``block_size`` bytes of the stored
+        sequence are kept, for workloads that keep returning to the same
+        regions. Replaces any previous cache, so it must not be called while
+        other threads read.
+        """
+        if block_size <= 0 or max_blocks <= 0:
+            raise ValueError("Invalid cache size")
+        if not (cache := _dfi._create_sequence_cache(block_size, max_blocks)):
+            raise MemoryError("Could not allocate the sequence cache.")
+        previous, self._sequence_cache = self._sequence_cache, cache
+        if previous:
+            _dfi._dealloc_sequence_cache(previous)
+
+    @property
+    def sequence_cache_stats(self) -> CacheStats | None:
+        """Hits and misses of the sequence cache, or None without a cache."""
+        if not self._sequence_cache:
+            return None
+        hits, misses = ctypes.c_uint64(), ctypes.c_uint64()
+        _dfi._sequence_cache_stats(
+            self._sequence_cache, ctypes.byref(hits), ctypes.byref(misses)
+        )
+        return CacheStats(hits.value, misses.value)
+
+    def enable_locate_cache(self, capacity: int = 1 << 20):
+        """Cache the positions of located BWT rows for repeated locates.
+
+        With a compressed suffix array every located row costs up to
+        ``suffix_array_compression_ratio`` backtrace steps. With the cache,
+        ``KmerSearchList.parallel_search_locate``, ``locate`` and
+        ``SearchCursor.locate`` resolve rows seen before without them. Up
+        to ``capacity`` rows are kept, with CLOCK eviction. Replaces any
+        previous cache, so it must not be called while other threads
+        locate.
+        """
+        if capacity <= 0:
+            raise ValueError("Invalid cache size")
+        if not (cache := _dfi._create_locate_cache(capacity)):
+            raise MemoryError("Could not allocate the locate cache.")
+        previous, self._locate_cache = self._locate_cache, cache
+        self._locate_cache_address = ctypes.cast(cache, ctypes.c_void_p).value
+        if previous:
+            _dfi._dealloc_locate_cache(previous)
+
+    def enable_stats(
+        self, hook: Callable[[str, float, float], None] | None = None
+    ) -> IndexStats:
+        """Start recording call statistics, returned as an ``IndexStats``.
+
+        Searches, locates and sequence reads on the index and on search
+        lists searching it then record their wall time, native time and
+        native work counters. ``count`` and ``locate`` take the native
+        search paths that keep the counters. ``hook`` is passed on to
+        ``IndexStats``. Replaces any previous statistics.
+        """
+        self._stats = IndexStats(hook)
+        return self._stats
+
+    def disable_stats(self):
+        self._stats = None
+
+    @property
+    def stats(self) -> IndexStats | None:
+        """The statistics of ``enable_stats``, or None while disabled."""
+        return self._stats
+
+    def enable_suffix_array_cache(
+        self,
+        max_bytes: int = 64 << 20,
+        page_size: int = 4096,
+        readahead: int = 4,
+        profile: str | None = None,
+    ):
+        """Read the on-disk suffix array through a paged cache.
+
+        For an index loaded with ``keep_suffix_array_in_memory=False``,
+        whose locates otherwise read every sampled suffix array value from
+        the file. Pages of ``page_size`` bytes are cached on demand, up to
+        ``max_bytes``, with CLOCK eviction. Every locate batch reads its
+        missing pages in order, and pages at most ``readahead`` pages apart
+        are read with one ``pread`` together with the pages between them.
+        ``profile`` is a file written by ``save_suffix_array_profile``
+        whose hottest pages are read in right away. Replaces any previous
+        cache, so it must not be called while other threads locate.
+        """
+        if self.config.keep_suffix_array_in_memory:
+            raise ValueError("The suffix array is already in memory.")
+        if page_size <= 0 or max_bytes < page_size or readahead < 0:
+            raise ValueError("Invalid cache size")
+        max_pages = max_bytes // page_size
+        if not (
+            cache := _dfi._create_suffix_array_cache(page_size, max_pages, readahead)
+        ):
+            raise MemoryError("Could not allocate the suffix array cache.")
+        previous, self._suffix_array_cache = self._suffix_array_cache, cache
+        self._suffix_array_cache_address = ctypes.cast(cache, ctypes.c_void_p).value
+        self._suffix_array_cache_pages = max_pages
+        self._suffix_array_page_size = page_size
+        if previous:
+            _dfi._dealloc_suffix_array_cache(previous)
+        if profile is not None:
+            self._warm_suffix_array_cache(profile)
+
+    def _warm_suffix_array_cache(self, profile: str):
+        with open(profile) as profile_file:
+            saved = json.load(profile_file)
+        # Pages saved with another page size are mapped to the pages
+        # covering the same bytes, hottest first.
+        saved_size, page_size = saved["page_size"], self._suffix_array_page_size
+        pages = dict.fromkeys(
+            page
+            for saved_page in saved["pages"]
+            for page in range(
+                saved_page * saved_size // page_size,
+                ((saved_page + 1) * saved_size - 1) // page_size + 1,
+            )
+        )
+        pages = list(pages)[: self._suffix_array_cache_pages]
+        return_code = _dfi._suffix_array_cache_warm(
+            self._index, self._suffix_array_cache, _as_uint64_array(pages), len(pages)
+        )
+        if return_code == ReturnCode.FileReadFail:
+            raise IOError("Could not read the index file.")
+        elif return_code == ReturnCode.AllocationFailure:
+            raise MemoryError("Could not allocate the suffix array pages.")
+
+    def save_suffix_array_profile(self, path: str):
+        """Write the resident suffix array cache pages as a JSON profile.
+
+        Pages are listed hottest first, by the values read from them, for
+        ``enable_suffix_array_cache(profile=path)`` in a later process.
+        """
+        if not self._suffix_array_cache:
+            raise ValueError("The suffix array cache is not enabled.")
+        max_pages = self._suffix_array_cache_pages
+        pages = (ctypes.c_uint64 * max_pages)()
+        accesses = (ctypes.c_uint64 * max_pages)()
+        num_pages = _dfi._suffix_array_cache_profile(
+            self._suffix_array_cache, pages, accesses, max_pages
+        )
+        hottest = sorted(range(num_pages), key=lambda i: (-accesses[i], pages[i]))
+        with open(path, "w") as profile_file:
+            json.dump(
+                {
+                    "page_size": self._suffix_array_page_size,
+                    "pages": [pages[i] for i in hottest],
+                },
+                profile_file,
+            )
+
+    @property
+    def suffix_array_cache_stats(self) -> CacheStats | None:
+        """Hits and misses of the suffix array cache, or None without one."""
+        if not self._suffix_array_cache:
+            return None
+        hits, misses = ctypes.c_uint64(), ctypes.c_uint64()
+        _dfi._suffix_array_cache_stats(
+            self._suffix_array_cache, ctypes.byref(hits), ctypes.byref(misses)
+        )
+        return CacheStats(hits.value, misses.value)
+
+    @property
+    def locate_cache_stats(self) -> CacheStats | None:
+        """Hits and misses of the locate cache, or None without a cache."""
+        if not self._locate_cache:
+            return None
+        hits, misses = ctypes.c_uint64(), ctypes.c_uint64()
+        _dfi._locate_cache_stats(
+            self._locate_cache, ctypes.byref(hits), ctypes.byref(misses)
+        )
+        return CacheStats(hits.value, misses.value)
+
+    @_instrumented("to_local_coordinates")
+    def to_local_coordinates(
+        self, positions, num_threads: int = 1
+    ) -> tuple[memoryview, memoryview]:
+        """Translate global positions into sequence ids and local offsets.
+
+        ``positions`` is a sequence or uint64 buffer (such as a NumPy array or
+        the positions returned by ``locate``) of positions into the indexed
+        FASTA records. Returns uint64 arrays of the sequence id and of the
+        offset within that sequence of every position, translated by binary
+        search over the record ends in a single C call. Pair the ids with
+        ``header`` to name the records.
+        """
+        positions_array = _as_uint64_array(positions)
+        num_positions = len(positions_array)
+        sequence_ids = (ctypes.c_uint64 * num_positions)()
+        local_positions = (ctypes.c_uint64 * num_positions)()
+        return_code = _call_native(
+            self._stats,
+            _dfi._get_local_sequence_positions,
+            self._index,
+            positions_array,
+            num_positions,
+            sequence_ids,
+            local_positions,
+            num_threads,
+        )
+        if return_code == ReturnCode.UnsupportedVersionError:
+            raise ValueError("The index was not built from a FASTA file.")
+        elif return_code == ReturnCode.IllegalPositionError:
+            raise ValueError("Position lies past the end of the last sequence.")
+        return _uint64_view(sequence_ids), _uint64_view(local_positions)
+
+    @property
+    def num_sequences(self) -> int:
+        """Number of FASTA records in the index, 0 if built from a sequence."""
+        if not self.fasta_vector:
+            return 0
+        return self.fasta_vector.contents.metadata.count
+
+    def header(self, sequence_id: int) -> str:
+        """Return the FASTA header of a sequence id, without the '>'."""
+        if (header := self._headers.get(sequence_id)) is not None:
+            return header
+        if not 0 <= sequence_id < self.num_sequences:
+            raise IndexError("Sequence id out of range")
+        header_ptr = ctypes.POINTER(ctypes.c_char)()
+        header_length = ctypes.c_size_t()
+        _dfi.get_header_string_from_sequence_number(
+            self._index,
+            sequence_id,
+            ctypes.byref(header_ptr),
+            ctypes.byref(header_length),
+        )
+        header = ctypes.string_at(header_ptr, header_length.value).decode()
+        self._headers[sequence_id] = header
+        return header
+
+    def search_approximate(
+        self,
+        pattern: str,
+        max_mismatches: int = 1,
+        max_edits: int | None = None,
+        locate: bool = False,
+    ) -> "ApproximateHits":
+        """Find the text strings within a few errors of ``pattern``.
+
+        Errors are mismatches, at most ``max_mismatches`` of them, unless
+        ``max_edits`` is given, which allows that many substitutions,
+        insertions and deletions instead. Edits never add text letters in
+        front of the first or after the last pattern letter, so a matched
+        string starts and ends with a matched or substituted letter. The
+        search backtracks over single backward search steps in C and prunes
+        every branch that can't stay within the error budget.
+        """
+        return self.search_approximate_many(
+            [pattern], max_mismatches, max_edits, locate
+        )[0]
+
+    def search_approximate_many(
+        self,
+        patterns: list[str],
+        max_mismatches: int = 1,
+        max_edits: int | None = None,
+        locate: bool = False,
+        num_threads: int = 1,
+    ) -> list["ApproximateHits"]:
+        """Run ``search_approximate`` for every pattern in a single C call.
+
+        Patterns are spread over ``num_threads`` threads, and the hits of all
+        patterns share one set of arrays.
+        """
+        max_errors = max_mismatches if max_edits is None else max_edits
+        if not 0 <= max_errors < 255:
+            raise ValueError("Invalid number of errors")
+        if not all(patterns):
+            raise ValueError("Invalid length")
+        num_patterns = len(patterns)
+        if num_patterns == 0:
+            return []
+        buffer, offsets, lengths = _pack_strings(patterns)
+        results = _dfi._search_approximate(
+            self._index,
+            buffer,
+            offsets,
+            lengths,
+            num_patterns,
+            max_errors,
+            max_edits is not None,
+            num_threads,
+        )
+        if not results:
+            raise MemoryError("Could not allocate the approximate search results.")
+        try:
+            total_hits = _dfi._approximate_results_total_hits(results)
+            ranges = (ctypes.c_uint64 * (2 * total_hits))()
+            errors = (ctypes.c_uint64 * total_hits)()
+            counts = (ctypes.c_uint64 * total_hits)()
+            hit_offsets = (ctypes.c_uint64 * (num_patterns + 1))()
+            total_positions = _dfi._approximate_results_flatten(
+                results, ranges, errors, counts, hit_offsets
+            )
+            positions = position_offsets = None
+            if locate:
+                position_array = (ctypes.c_uint64 * total_positions)()
+                return_code = _dfi._approximate_results_locate(
+                    self._index, results, position_array, num_threads
+                )
+                if return_code == ReturnCode.FileReadFail:
+                    raise IOError("Could not read the index file.")
+                elif return_code == ReturnCode.AllocationFailure:
+                    raise MemoryError("Could not allocate the backtrace offsets.")
+                positions = _uint64_view(position_array)
+                position_offsets = _uint64_view(
+                    (ctypes.c_uint64 * (total_hits + 1))(*accumulate(counts, initial=0))
+                )
+        finally:
+            _dfi._dealloc_approximate_results(results)
+
+        ranges_view = _uint64_view(ranges)
+        errors_view = _uint64_view(errors)
+        counts_view = _uint64_view(counts)
+        hits = []
+        for i in range(num_patterns):
+            start, end = hit_offsets[i], hit_offsets[i + 1]
+            hits.append(
+                ApproximateHits(
+                    ranges_view[2 * start : 2 * end],
+                    errors_view[start:end],
+                    counts_view[start:end],
+                    positions,
+                    position_offsets[start : end + 1] if locate else None,
+                )
+            )
+        return hits
+
+    def find_mems(self, read: str, min_length: int = 19) -> memoryview:
+        """Return the maximal exact matches of ``read`` as an (n, 4) array.
+
+        Rows are uint64 ``(query_offset, length, start_ptr, end_ptr)`` in
+        read order, for the longest match ending at every read position that
+        at least one of its occurrences can't extend to the right, and that
+        is at least ``min_length`` long. Matches start at the longest match
+        and are cut short where fewer occurrences continue, so a repetitive
+        read can report many more of them than ``find_smems``.
+        """
+        mems, _ = self.find_mems_many([read], min_length)
+        return mems
+
+    def find_smems(self, read: str, min_length: int = 19) -> memoryview:
+        """Return the super-maximal exact matches of ``read``.
+
+        Those are the substrings of the read that occur in the index and are
+        not part of a longer one that occurs, in the format of ``find_mems``.
+        """
+        mems, _ = self.find_mems_many([read], min_length, super_maximal=True)
+        return mems
+
+    def find_mems_many(
+        self,
+        reads: list[str],
+        min_length: int = 19,
+        num_threads: int = 1,
+        super_maximal: bool = False,
+    ) -> tuple[memoryview, memoryview]:
+        """Run ``find_mems`` or ``find_smems`` for every read in one C call.
+
+        Reads are spread over ``num_threads`` threads. Returns the matches of
+        all reads as one (n, 4) array plus offsets, the matches of read i
+        being rows ``offsets[i]`` to ``offsets[i + 1]``.
+        """
+        if min_length <= 0:
+            raise ValueError("Invalid length")
+        num_reads = len(reads)
+        offsets = (ctypes.c_uint64 * (num_reads + 1))()
+        if num_reads == 0:
+            return _uint64_view((ctypes.c_uint64 * 0)()), _uint64_view(offsets)
+        buffer, read_offsets, read_lengths = _pack_strings(reads)
+        results = _dfi._find_mems(
+            self._index,
+            buffer,
+            read_offsets,
+            read_lengths,
+            num_reads,
+            min_length,
+            super_maximal,
+            num_threads,
+        )
+        if not results:
+            raise MemoryError("Could not allocate the exact match results.")
+        try:
+            total = _dfi._mem_results_total(results)
+            mems = (ctypes.c_uint64 * (4 * total))()
+            _dfi._mem_results_flatten(results, mems, offsets)
+        finally:
+            _dfi._dealloc_mem_results(results)
+        mems_view = _uint64_view(mems)
+        if total:
+            mems_view = mems_view.cast("B").cast("Q", [total, 4])
+        return mems_view, _uint64_view(offsets)
+
+    def cursor(self, pattern: str = "") -> "SearchCursor":
+        """Return a ``SearchCursor`` positioned on ``pattern``."""
+        return SearchCursor(self, pattern)
+
+    def search_stream(
+        self,
+        source,
+        k: int,
+        batch_size: int = 10000,
+        num_threads: int = 4,
+        locate: bool = False,
+    ):
+        """Search every kmer of every read in a FASTA/FASTQ file or stream.
+
+        ``source`` is a path or binary file object, plain or gzip compressed.
+        Returns a ``SearchStream`` yielding one ``ReadHits`` per read, which
+        also reports the achieved throughput as ``reads_per_second``.
+        """
+        from ._stream import SearchStream
+
+        return SearchStream(self, source, k, batch_size, num_threads, locate)
+
     @property
     def version_number(self):
         return self._index.contents.version_number
@@ -269,11 +1271,36 @@ class Index:
         return self._index.contents.suffix_array
 
     def __del__(self):
+        if self._sequence_cache:
+            _dfi._dealloc_sequence_cache(self._sequence_cache)
+        if self._locate_cache:
+            _dfi._dealloc_locate_cache(self._locate_cache)
+        if self._suffix_array_cache:
+            _dfi._dealloc_suffix_array_cache(self._suffix_array_cache)
         if self._index is not None:
-            _dfi._dealloc_index(self._index)
+            if self._mapping_length is not None:
+                _dfi._dealloc_mapped_index(self._index, self._mapping_length)
+            else:
+                _dfi._dealloc_index(self._index)
+
 
+def read_index_from_file(
+    file_path: str,
+    keep_suffix_array_in_memory: bool = False,
+    use_mmap: bool = False,
+    will_need: bool = False,
+    huge_pages: bool = False,
+):
+    """Load an index from an .awfmi file.
 
-def read_index_from_file(file_path: str, keep_suffix_array_in_memory: bool = False):
+    With ``use_mmap`` the file is memory mapped read-only instead of read into
+    private memory: the bwt, kmer seed table and suffix array are used
+    straight from the page cache, so loading is near instant and processes
+    mapping the same file share its physical pages. The suffix array is then
+    always memory resident and ``keep_suffix_array_in_memory`` is ignored.
+    ``will_need`` and ``huge_pages`` pass MADV_WILLNEED / MADV_HUGEPAGE hints
+    for the mapping.
+    """
     if os.path.exists(file_path):
         file_path_bytes = file_path.encode()
     else:
@@ -287,15 +1314,28 @@ def read_index_from_file(file_path: str, keep_suffix_array_in_memory: bool = Fal
             raise FileNotFoundError(file_path)
 
     index_ptr = ctypes.POINTER(_dfi._Index)()
+    mapping_length = ctypes.c_size_t()
 
-    return_code: int = _dfi._read_index_from_file(
-        ctypes.byref(index_ptr),
-        file_path_bytes,
-        keep_suffix_array_in_memory,
-    )
+    if use_mmap:
+        return_code: int = _dfi._read_index_from_file_mapped(
+            ctypes.byref(index_ptr),
+            file_path_bytes,
+            will_need,
+            huge_pages,
+            ctypes.byref(mapping_length),
+        )
+    else:
+        return_code: int = _dfi._read_index_from_file(
+            ctypes.byref(index_ptr),
+            file_path_bytes,
+            keep_suffix_array_in_memory,
+        )
 
     if return_code == ReturnCode.FileReadOkay:
-        return Index(index_ptr=index_ptr)
+        index = Index(index_ptr=index_ptr)
+        if use_mmap:
+            index._mapping_length = mapping_length.value
+        return index
     elif return_code == ReturnCode.FileAlreadyExists:
         raise FileNotFoundError(
             f"No file could be opened at the given file_path: {file_path}"
@@ -305,6 +1345,250 @@ def read_index_from_file(file_path: str, keep_suffix_array_in_memory: bool = Fal
     raise Exception(f"ERROR: {ReturnCode(return_code)}")
 
 
+@contextmanager
+def _sequence_buffer(sequence):
+    # Yields the address and size of the sequence bytes for the build.
+    if isinstance(sequence, str):
+        sequence = sequence.encode()
+    if isinstance(sequence, os.PathLike):
+        with open(sequence, "rb") as f:
+            with _sequence_buffer(f) as buffer:
+                yield buffer
+        return
+    mapping = None
+    if hasattr(sequence, "fileno"):
+        if os.fstat(sequence.fileno()).st_size == 0:
+            raise ValueError("No data provided for index building.")
+        # A private mapping is writable without touching the file, so its
+        # address can be taken without copying.
+        mapping = mmap.mmap(sequence.fileno(), 0, access=mmap.ACCESS_COPY)
+        sequence = mapping
+    owner = None
+    try:
+        address, size, owner = _buffer_address(sequence)
+        if size == 0:
+            raise ValueError("No data provided for index building.")
+        yield address, size
+    finally:
+        # The exported buffer has to be released before the mapping closes.
+        del owner
+        if mapping is not None:
+            mapping.close()
+
+
+def _pack_strings(strings: list[str]) -> tuple[bytes, ctypes.Array, ctypes.Array]:
+    # One buffer of all strings back to back, with their offsets and lengths.
+    encoded = [string.encode() for string in strings]
+    lengths = (ctypes.c_uint64 * len(encoded))(*map(len, encoded))
+    offsets = (ctypes.c_uint64 * len(encoded))(*accumulate(lengths[:-1], initial=0))
+    return b"".join(encoded), offsets, lengths
+
+
+# Kinds of query cache entries.
+_RANGE = 0
+_POSITIONS = 1
+
+
+def _group_misses(patterns: list[str], cached: list) -> dict[str, list[int]]:
+    # The indices of every distinct pattern missing from the query cache, in
+    # order of first appearance, so repeats are searched once.
+    misses: dict[str, list[int]] = {}
+    for i, value in enumerate(cached):
+        if value is None:
+            misses.setdefault(patterns[i], []).append(i)
+    return misses
+
+
+def _check_max_hits(max_hits: int) -> int:
+    # Position list counts are 32 bit in the C search data.
+    if not 0 <= max_hits < 2**32:
+        raise ValueError("Invalid max_hits")
+    return max_hits
+
+
+def _uint64_view(array: ctypes.Array, owner: object = None) -> memoryview:
+    # ctypes exports "<Q", which memoryview can't index; recast to native "Q".
+    # The owner is pinned on the array so the view keeps it alive.
+    if owner is not None:
+        array._owner = owner
+    return memoryview(array).cast("B").cast("Q")
+
+
+def _buffer_address(buffer) -> tuple[int, int, object]:
+    # Returns the address and size of a bytes-like object together with the
+    # object that has to be kept alive for the address to stay valid.
+    if isinstance(buffer, bytes):
+        address = ctypes.cast(ctypes.c_char_p(buffer), ctypes.c_void_p).value
+        return address, len(buffer), buffer
+    view = memoryview(buffer).cast("B")
+    array_type = ctypes.c_char * view.nbytes
+    if view.readonly:
+        array = array_type.from_buffer_copy(view)
+    else:
+        array = array_type.from_buffer(view)
+    return ctypes.addressof(array), view.nbytes, array
+
+
+def _as_uint64_array(values) -> ctypes.Array:
+    try:
+        view = memoryview(values)
+    except TypeError:
+        return (ctypes.c_uint64 * len(values))(*values)
+    if view.itemsize != 8 or view.format.lstrip("@=<") not in ("Q", "L", "q", "l"):
+        return (ctypes.c_uint64 * len(view))(*view.tolist())
+    array_type = ctypes.c_uint64 * len(view)
+    if view.readonly:
+        return array_type.from_buffer_copy(view)
+    return array_type.from_buffer(view)
+
+
+class ApproximateHits:
+    """Approximate matches of one pattern, one hit per distinct BWT range.
+
+    ``ranges`` holds the inclusive BWT range of every hit as (start_ptr,
+    end_ptr) rows, ``errors`` and ``counts`` its fewest errors and its number
+    of positions, all as uint64 arrays sorted by range. Matched strings that
+    share a range, like a string and its only extension, are one hit. With
+    edits, different hits can still start at the same text position.
+    """
+
+    __slots__ = ("_ranges", "errors", "counts", "_positions", "_offsets")
+
+    def __init__(
+        self,
+        ranges: memoryview,
+        errors: memoryview,
+        counts: memoryview,
+        positions: memoryview | None = None,
+        offsets: memoryview | None = None,
+    ) -> None:
+        self._ranges = ranges
+        self.errors = errors
+        self.counts = counts
+        self._positions = positions
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.errors)
+
+    @property
+    def ranges(self) -> memoryview:
+        if not len(self):
+            return self._ranges
+        return self._ranges.cast("B").cast("Q", [len(self), 2])
+
+    @property
+    def located(self) -> bool:
+        return self._positions is not None
+
+    def positions(self, i: int) -> memoryview:
+        """Return the located positions of the i-th hit."""
+        if self._positions is None:
+            raise ValueError("The search was not run with locate=True.")
+        return self._positions[self._offsets[i] : self._offsets[i + 1]]
+
+    @property
+    def all_positions(self) -> memoryview:
+        if self._positions is None:
+            raise ValueError("The search was not run with locate=True.")
+        return self._positions[self._offsets[0] : self._offsets[-1]]
+
+
+class SearchCursor:
+    """Backward search state of a pattern that grows to the left.
+
+    Every letter passed to ``extend`` is prepended to the pattern with a
+    single FM-index step, and ``fork`` copies the current range, so
+    tree-shaped searches pay for a shared suffix once instead of searching
+    every pattern from scratch. Letters outside the index alphabet leave the
+    cursor empty.
+    """
+
+    __slots__ = ("_index", "_range", "length")
+
+    def __init__(self, index: Index, pattern: str = "") -> None:
+        self._index = index
+        # The full range stands for the empty pattern.
+        self._range = _dfi._SearchRange(0, index.bwt_length - 1)
+        self.length = 0
+        self.extend_many(pattern)
+
+    def extend(self, letter: str) -> "SearchCursor":
+        """Prepend one letter to the pattern and return the cursor."""
+        if len(letter) != 1:
+            raise ValueError("Expected a single letter.")
+        return self.extend_many(letter)
+
+    def extend_many(self, letters: str) -> "SearchCursor":
+        """Prepend ``letters`` to the pattern in one C call.
+
+        The pattern becomes ``letters + pattern``, as if every letter of
+        ``letters`` was passed to ``extend`` from last to first.
+        """
+        letters_bytes = letters.encode()
+        if letters_bytes:
+            _dfi._extend_search_range(
+                self._index._index,
+                ctypes.byref(self._range),
+                letters_bytes,
+                len(letters_bytes),
+            )
+            self.length += len(letters_bytes)
+        return self
+
+    def fork(self) -> "SearchCursor":
+        """Return an independent copy of the cursor."""
+        cursor = SearchCursor.__new__(SearchCursor)
+        cursor._index = self._index
+        cursor._range = _dfi._SearchRange(self._range.start_ptr, self._range.end_ptr)
+        cursor.length = self.length
+        return cursor
+
+    @property
+    def count(self) -> int:
+        start_ptr, end_ptr = self._range.start_ptr, self._range.end_ptr
+        return end_ptr - start_ptr + 1 if end_ptr >= start_ptr else 0
+
+    @property
+    def search_range(self) -> SearchRange | None:
+        if not self.count:
+            return None
+        return SearchRange(self._range.start_ptr, self._range.end_ptr)
+
+    def locate(
+        self, max_hits: int | None = None, sample: bool = False, seed: int = 0
+    ) -> memoryview:
+        """Return the positions of the pattern as a uint64 array.
+
+        ``max_hits``, ``sample`` and ``seed`` bound the positions located as
+        in ``KmerSearchList.parallel_search_locate``; ``count`` stays the
+        full count.
+        """
+        num_hits = self.count
+        if max_hits is not None:
+            num_hits = min(num_hits, _check_max_hits(max_hits))
+        positions = (ctypes.c_uint64 * num_hits)()
+        _dfi._select_search_range_rows(
+            ctypes.byref(self._range), num_hits, sample, seed, positions
+        )
+        stats = self._index._stats
+        return_code = _call_native(
+            stats,
+            _dfi._locate_bwt_rows,
+            self._index._index,
+            self._index._locate_cache,
+            self._index._suffix_array_cache,
+            _stats_counters(stats),
+            positions,
+            num_hits,
+        )
+        if return_code == ReturnCode.FileReadFail:
+            raise IOError("Could not read the index file.")
+        elif return_code == ReturnCode.AllocationFailure:
+            raise MemoryError("Could not allocate the backtrace offsets.")
+        return _uint64_view(positions)
+
+
 class KmerSearchList:
     def __init__(self, capacity: int) -> None:
         if capacity <= 0:
@@ -312,30 +1596,320 @@ class KmerSearchList:
         if (_ksl := _dfi._create_kmer_search_list(capacity)) is None:
             raise Exception("Something went wrong while creating the search list")
         self._kmer_search_list = _ksl
+        self._located = False
+        self._total_counts = None
 
     def fill(self, kmers: list[str]):
-        num_kmers = len(kmers)
-        if num_kmers >= self.capacity:
-            raise ValueError(
-                "Provided amount of kmers is more than KmerSearchList capacity."
+        self.check_capacity(len(kmers))
+        encoded = [kmer.encode() for kmer in kmers]
+        # Null-separated so every kmer_string is still a valid C string.
+        lengths = [len(kmer) for kmer in encoded]
+        offsets = list(accumulate((length + 1 for length in lengths), initial=0))[:-1]
+        self.fill_packed(b"\0".join(encoded) + b"\0", lengths=lengths, offsets=offsets)
+
+    def fill_packed(
+        self,
+        buffer,
+        kmer_length: int | None = None,
+        lengths=None,
+        offsets=None,
+    ):
+        """Fill the search list from one contiguous buffer of kmers.
+
+        ``buffer`` may be any bytes-like object (bytes, bytearray, mmap, NumPy
+        ``S`` or uint8 array). Either all kmers are ``kmer_length`` long and
+        stored back to back, or ``lengths`` (and optionally ``offsets``) give
+        the length and byte offset of every kmer. Kmer strings point straight
+        into the buffer, which the search list keeps alive; read-only buffers
+        other than bytes are copied once.
+        """
+        address, size, owner = _buffer_address(buffer)
+        if kmer_length is not None:
+            if kmer_length <= 0 or size % kmer_length:
+                raise ValueError("Invalid length")
+            num_kmers = size // kmer_length
+            self.check_capacity(num_kmers)
+            _dfi._kmer_search_list_fill_fixed_length(
+                self._kmer_search_list, address, kmer_length, num_kmers
             )
-        for i in range(num_kmers):
-            kmer = kmers[i].encode()
-            self.kmer_search_data[i].kmer_string = kmer
-            self.kmer_search_data[i].kmer_length = len(kmer)
-        self._kmer_search_list.contents.count = num_kmers
+        elif lengths is not None:
+            lengths_array = _as_uint64_array(lengths)
+            num_kmers = len(lengths_array)
+            self.check_capacity(num_kmers)
+            offsets_array = None
+            if offsets is not None:
+                offsets_array = _as_uint64_array(offsets)
+                if len(offsets_array) != num_kmers:
+                    raise ValueError("Offsets and lengths must have the same size.")
+            if not _dfi._kmer_search_list_fill_packed(
+                self._kmer_search_list,
+                address,
+                size,
+                offsets_array,
+                lengths_array,
+                num_kmers,
+            ):
+                raise ValueError("Kmer lies outside of the provided buffer.")
+        else:
+            raise ValueError("Either kmer_length or lengths must be provided.")
+        self._kmer_buffer = owner
+        self._located = False
+
+    def fill_windows(self, buffer, read_offsets, read_lengths, kmer_length: int):
+        """Fill the search list with every overlapping kmer of packed reads.
+
+        ``read_offsets`` and ``read_lengths`` locate each read in ``buffer``.
+        Kmers are loaded read by read, reads shorter than ``kmer_length``
+        contribute none. The list grows to fit the batch.
+        """
+        if kmer_length <= 0:
+            raise ValueError("Invalid length")
+        address, size, owner = _buffer_address(buffer)
+        offsets_array = _as_uint64_array(read_offsets)
+        lengths_array = _as_uint64_array(read_lengths)
+        if len(offsets_array) != len(lengths_array):
+            raise ValueError("Offsets and lengths must have the same size.")
+        if any(
+            offset + length > size
+            for offset, length in zip(offsets_array, lengths_array)
+        ):
+            raise ValueError("Read lies outside of the provided buffer.")
+        num_kmers = sum(
+            length - kmer_length + 1
+            for length in lengths_array
+            if length >= kmer_length
+        )
+        self.reserve(num_kmers)
+        _dfi._kmer_search_list_fill_windows(
+            self._kmer_search_list,
+            address,
+            offsets_array,
+            lengths_array,
+            len(lengths_array),
+            kmer_length,
+        )
+        self._kmer_buffer = owner
+        self._located = False
+
+    def add_reverse_complements(self):
+        """Interleave every nucleotide kmer with its reverse complement.
 
-    def parallel_search_locate(self, index: Index, num_threads: int = 4):
+        Kmer i becomes entry 2i and its reverse complement entry 2i + 1, so
+        both orientations are searched in the same block. The list must have
+        room for twice its kmers. Letters other than ACGTU complement to N.
+        """
         self.check_count()
-        return_code = _dfi._parallel_search_locate(
-            index._index, self._kmer_search_list, num_threads
+        self.check_capacity(2 * self.count)
+        total = _dfi._kmer_search_list_total_kmer_length(self._kmer_search_list)
+        reverse_complements = ctypes.create_string_buffer(max(total, 1))
+        _dfi._kmer_search_list_add_reverse_complements(
+            self._kmer_search_list, reverse_complements
         )
+        self._kmer_buffer = (self._kmer_buffer, reverse_complements)
+        self._located = False
+
+    @_instrumented("parallel_search_locate", _index_stats)
+    def parallel_search_locate(
+        self,
+        index: Index,
+        num_threads: int = 4,
+        max_hits: int | None = None,
+        sample: bool = False,
+        seed: int = 0,
+    ):
+        """Locate every kmer of the search list.
+
+        ``max_hits`` bounds the positions backtraced per kmer, so repetitive
+        kmers cost no more than ``max_hits`` tracebacks and position list
+        growth. The first rows of each range are located, or with ``sample``
+        a random subset that only depends on ``seed`` and the kmer.
+        ``total_counts`` still reports every occurrence.
+        """
+        self.check_count()
+        stats = index._stats
+        # The native counters are only kept on the limited path.
+        if (
+            max_hits is None
+            and not index._locate_cache
+            and not index._suffix_array_cache
+            and stats is None
+        ):
+            return_code = _dfi._parallel_search_locate(
+                index._index, self._kmer_search_list, num_threads
+            )
+            self._total_counts = None
+        else:
+            counts = None
+            if max_hits is None:
+                max_hits = 2**32 - 1
+            else:
+                _check_max_hits(max_hits)
+                counts = (ctypes.c_uint64 * self.count)()
+            return_code = _call_native(
+                stats,
+                _dfi._parallel_search_locate_limited,
+                index._index,
+                self._kmer_search_list,
+                max_hits,
+                sample,
+                seed,
+                index._locate_cache,
+                index._suffix_array_cache,
+                counts,
+                _stats_counters(stats),
+                num_threads,
+            )
+            self._total_counts = counts
         if return_code == ReturnCode.FileReadFail:
             raise Exception("The file could not be read sucessfully.")
+        elif return_code == ReturnCode.AllocationFailure:
+            raise MemoryError("Could not grow the position lists.")
+        self._located = True
 
+    @_instrumented("parallel_search_count", _index_stats)
     def parallel_search_count(self, index: Index, num_threads: int = 4):
         self.check_count()
-        _dfi._parallel_search_count(index._index, self._kmer_search_list, num_threads)
+        if (stats := index._stats) is None:
+            _dfi._parallel_search_count(
+                index._index, self._kmer_search_list, num_threads
+            )
+        else:
+            # Counts the same way, with the native counters.
+            stats.native(
+                _dfi._parallel_search_ranges,
+                index._index,
+                self._kmer_search_list,
+                None,
+                None,
+                stats.counters,
+                num_threads,
+            )
+        self._located = False
+
+    @_instrumented("parallel_search_ranges", _index_stats)
+    def parallel_search_ranges(
+        self, index: Index, num_threads: int = 4, ranges: bool = True
+    ) -> tuple[memoryview | None, memoryview]:
+        """Search every kmer for its BWT range and its 64 bit count.
+
+        Returns the ranges as an (n, 2) uint64 array of inclusive
+        ``(start_ptr, end_ptr)`` rows, or None when ``ranges`` is False,
+        and the counts as a uint64 array.
+        """
+        self.check_count()
+        counts = (ctypes.c_uint64 * self.count)()
+        range_array = (ctypes.c_uint64 * (2 * self.count))() if ranges else None
+        _call_native(
+            index._stats,
+            _dfi._parallel_search_ranges,
+            index._index,
+            self._kmer_search_list,
+            range_array,
+            counts,
+            _stats_counters(index._stats),
+            num_threads,
+        )
+        self._located = False
+        if range_array is None:
+            return None, _uint64_view(counts)
+        range_view = _uint64_view(range_array).cast("B").cast("Q", [self.count, 2])
+        return range_view, _uint64_view(counts)
+
+    def counts(self) -> memoryview:
+        """Return the count of every kmer as a uint64 array."""
+        counts = (ctypes.c_uint64 * self.count)()
+        _dfi._kmer_search_list_get_counts(self._kmer_search_list, counts)
+        return _uint64_view(counts)
+
+    def total_counts(self) -> memoryview:
+        """Return the full occurrence count of every located kmer.
+
+        Unlike ``counts`` this includes the positions left out by
+        ``max_hits``.
+        """
+        self.check_located()
+        if self._total_counts is None:
+            return self.counts()
+        return _uint64_view(self._total_counts)
+
+    async def parallel_search_locate_async(
+        self,
+        index: Index,
+        num_threads: int = 4,
+        executor: Executor | None = None,
+        max_hits: int | None = None,
+        sample: bool = False,
+        seed: int = 0,
+    ):
+        await _run_in_executor(
+            executor or index.executor,
+            self.parallel_search_locate,
+            index,
+            num_threads,
+            max_hits,
+            sample,
+            seed,
+        )
+
+    async def parallel_search_count_async(
+        self, index: Index, num_threads: int = 4, executor: Executor | None = None
+    ):
+        await _run_in_executor(
+            executor or index.executor, self.parallel_search_count, index, num_threads
+        )
+
+    def positions(self, i: int) -> memoryview:
+        """Return the located positions of the i-th kmer without copying.
+
+        The returned uint64 memoryview aliases the C position list, so it is
+        only valid until the search list is searched again or refilled.
+        Wrap it with ``numpy.asarray`` to get an array view.
+        """
+        self.check_located()
+        if not 0 <= i < self.count:
+            raise IndexError("Kmer index out of range.")
+        search_data = self.kmer_search_data[i]
+        positions = (ctypes.c_uint64 * search_data.count).from_address(
+            ctypes.cast(search_data.position_list, ctypes.c_void_p).value
+        )
+        return _uint64_view(positions, self)
+
+    def positions_csr(self) -> tuple[memoryview, memoryview]:
+        """Return all located positions as one flat array plus offsets.
+
+        The positions of kmer i are ``positions[offsets[i]:offsets[i + 1]]``.
+        Both arrays are copied out in a single C call and own their memory.
+        """
+        self.check_located()
+        total = _dfi._kmer_search_list_total_positions(self._kmer_search_list)
+        positions = (ctypes.c_uint64 * total)()
+        offsets = (ctypes.c_uint64 * (self.count + 1))()
+        _dfi._kmer_search_list_flatten_positions(
+            self._kmer_search_list, positions, offsets
+        )
+        return _uint64_view(positions), _uint64_view(offsets)
+
+    def strand_positions_csr(self) -> tuple[memoryview, memoryview, memoryview]:
+        """Return the positions of a list filled by ``add_reverse_complements``.
+
+        Like ``positions_csr`` over the original kmers, with the positions of
+        both orientations merged, forward strand first. The third array
+        holds one uint8 per position, 0 for forward and 1 for reverse
+        complement hits.
+        """
+        self.check_located()
+        total = _dfi._kmer_search_list_total_positions(self._kmer_search_list)
+        positions = (ctypes.c_uint64 * total)()
+        offsets = (ctypes.c_uint64 * (self.count // 2 + 1))()
+        strands = (ctypes.c_uint8 * total)()
+        _dfi._kmer_search_list_flatten_strand_positions(
+            self._kmer_search_list, positions, offsets, strands
+        )
+        return (
+            _uint64_view(positions),
+            _uint64_view(offsets),
+            memoryview(strands).cast("B"),
+        )
 
     def check_count(self):
         if self.count <= 0:
@@ -343,6 +1917,41 @@ class KmerSearchList:
                 "Search list is empty. You must fill out the search list with kmers."
             )
 
+    def reserve(self, capacity: int):
+        """Grow the search list to hold at least ``capacity`` kmers.
+
+        Position lists of the existing entries are kept, including any that
+        were enlarged by earlier locate calls.
+        """
+        if not _dfi._kmer_search_list_reserve(self._kmer_search_list, capacity):
+            raise MemoryError("Could not grow the search list.")
+
+    def reset(self, trim_capacity: int | None = None) -> int:
+        """Empty the search list so it can be refilled in place.
+
+        Position lists keep their grown buffers for the next batch unless
+        they hold more than ``trim_capacity`` positions, in which case they
+        are shrunk back to it. Returns the number of bytes released.
+        """
+        self._kmer_search_list.contents.count = 0
+        self._kmer_buffer = None
+        self._located = False
+        if trim_capacity is None:
+            return 0
+        return _dfi._kmer_search_list_trim(self._kmer_search_list, trim_capacity)
+
+    def check_capacity(self, num_kmers: int):
+        if num_kmers > self.capacity:
+            raise ValueError(
+                "Provided amount of kmers is more than KmerSearchList capacity."
+            )
+
+    def check_located(self):
+        if not self._located:
+            raise ValueError(
+                "Positions are only available after parallel_search_locate."
+            )
+
     @property
     def capacity(self) -> int:
         return self._kmer_search_list.contents.capacity
@@ -358,3 +1967,56 @@ class KmerSearchList:
     def __del__(self):
         if self._kmer_search_list:
             _dfi._dealloc_kmer_search_list(self._kmer_search_list)
+
+
+class KmerSearchListPool:
+    """Thread-safe pool of search lists reused across query batches.
+
+    Released lists are reset and trimmed to ``trim_capacity`` positions per
+    kmer, and at most ``max_idle`` of them are kept for later batches. Lists
+    grown past ``max_capacity`` kmers are freed instead of kept.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        trim_capacity: int | None = 1024,
+        max_idle: int | None = None,
+        max_capacity: int | None = None,
+    ) -> None:
+        if capacity <= 0:
+            raise ValueError("Invalid capacity")
+        self.capacity = capacity
+        self.trim_capacity = trim_capacity
+        self.max_idle = max_idle
+        self.max_capacity = max_capacity
+        self._idle: list[KmerSearchList] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, num_kmers: int = 0) -> KmerSearchList:
+        with self._lock:
+            search_list = self._idle.pop() if self._idle else None
+        if search_list is None:
+            search_list = KmerSearchList(max(self.capacity, num_kmers))
+        elif num_kmers > search_list.capacity:
+            search_list.reserve(num_kmers)
+        return search_list
+
+    def release(self, search_list: KmerSearchList):
+        if self.max_capacity is not None and search_list.capacity > self.max_capacity:
+            return
+        search_list.reset(self.trim_capacity)
+        with self._lock:
+            if self.max_idle is None or len(self._idle) < self.max_idle:
+                self._idle.append(search_list)
+
+    @contextmanager
+    def search_list(self, num_kmers: int = 0):
+        search_list = self.acquire(num_kmers)
+        try:
+            yield search_list
+        finally:
+            self.release(search_list)
+
+    def __len__(self) -> int:
+        return len(self._idle)
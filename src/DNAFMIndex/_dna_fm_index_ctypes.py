@@ -1,7 +1,9 @@
 # ruff: noqa F403, F405
 
+import importlib.util
 import os
 from pathlib import Path
+import sysconfig
 from ctypes import *
 
 AMINO_VECTORS_PER_WINDOW = 5
@@ -24,6 +26,24 @@ else:
     raise OSError("lib directory not found")
 
 
+def _load_native():
+    # The compiled fast paths built next to the library, None when they were
+    # not built for this interpreter or DNAFMINDEX_NO_NATIVE is set.
+    path = _lib_dir / f"_native{sysconfig.get_config_var('EXT_SUFFIX')}"
+    if os.environ.get("DNAFMINDEX_NO_NATIVE") or not path.exists():
+        return None
+    spec = importlib.util.spec_from_file_location("DNAFMIndex._native", path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except ImportError:
+        return None
+    return module
+
+
+_native = _load_native()
+
+
 SimdVec256 = c_uint8 * 32
 
 
@@ -232,7 +252,7 @@ create_initial_query_range.restype = _SearchRange
 create_initial_query_range_from_char = _awfmindex.awFmCreateInitialQueryRangeFromChar
 create_initial_query_range_from_char.argtypes = [
     POINTER(_Index),
-    c_char_p,
+    c_char,
 ]
 create_initial_query_range_from_char.restype = _SearchRange
 
@@ -308,9 +328,10 @@ get_header_string_from_sequence_number = (
 get_header_string_from_sequence_number.argtypes = [
     POINTER(_Index),
     c_size_t,
-    POINTER(POINTER(c_char_p)),
+    POINTER(POINTER(c_char)),
     POINTER(c_size_t),
 ]
+get_header_string_from_sequence_number.restype = c_int
 
 
 search_range_length = _awfmindex.awFmSearchRangeLength
@@ -330,3 +351,390 @@ return_code_is_success.restype = c_bool
 
 get_num_sequences = _awfmindex.awFmGetNumSequences
 get_num_sequences.argtypes = [POINTER(_Index)]
+
+
+_kmer_search_list_total_positions = _awfmindex.dfiKmerSearchListTotalPositions
+_kmer_search_list_total_positions.argtypes = [POINTER(_KmerSearchList)]
+_kmer_search_list_total_positions.restype = c_uint64
+
+
+_kmer_search_list_flatten_positions = _awfmindex.dfiKmerSearchListFlattenPositions
+_kmer_search_list_flatten_positions.argtypes = [
+    POINTER(_KmerSearchList),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+]
+_kmer_search_list_flatten_positions.restype = None
+
+
+_offset_positions = _awfmindex.dfiOffsetPositions
+_offset_positions.argtypes = [POINTER(c_uint64), c_uint64, c_uint64]
+_offset_positions.restype = None
+
+
+_kmer_search_list_fill_packed = _awfmindex.dfiKmerSearchListFillPacked
+_kmer_search_list_fill_packed.argtypes = [
+    POINTER(_KmerSearchList),
+    c_void_p,
+    c_size_t,
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    c_size_t,
+]
+_kmer_search_list_fill_packed.restype = c_bool
+
+
+_kmer_search_list_fill_fixed_length = _awfmindex.dfiKmerSearchListFillFixedLength
+_kmer_search_list_fill_fixed_length.argtypes = [
+    POINTER(_KmerSearchList),
+    c_void_p,
+    c_uint64,
+    c_size_t,
+]
+_kmer_search_list_fill_fixed_length.restype = None
+
+
+_kmer_search_list_reserve = _awfmindex.dfiKmerSearchListReserve
+_kmer_search_list_reserve.argtypes = [POINTER(_KmerSearchList), c_size_t]
+_kmer_search_list_reserve.restype = c_bool
+
+
+_kmer_search_list_trim = _awfmindex.dfiKmerSearchListTrim
+_kmer_search_list_trim.argtypes = [POINTER(_KmerSearchList), c_uint32]
+_kmer_search_list_trim.restype = c_uint64
+
+
+_kmer_search_list_fill_windows = _awfmindex.dfiKmerSearchListFillWindows
+_kmer_search_list_fill_windows.argtypes = [
+    POINTER(_KmerSearchList),
+    c_void_p,
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    c_size_t,
+    c_uint64,
+]
+_kmer_search_list_fill_windows.restype = c_size_t
+
+
+class _Stats(Structure):
+    _fields_ = [
+        ("kmers_searched", c_uint64),
+        ("seed_table_hits", c_uint64),
+        ("traceback_steps", c_uint64),
+        ("suffix_array_reads", c_uint64),
+        ("bytes_read", c_uint64),
+    ]
+
+
+_parallel_search_ranges = _awfmindex.dfiParallelSearchRanges
+_parallel_search_ranges.argtypes = [
+    POINTER(_Index),
+    POINTER(_KmerSearchList),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    POINTER(_Stats),
+    c_uint32,
+]
+_parallel_search_ranges.restype = None
+
+
+class _LocateCache(Structure):
+    pass
+
+
+_create_locate_cache = _awfmindex.dfiCreateLocateCache
+_create_locate_cache.argtypes = [c_uint64]
+_create_locate_cache.restype = POINTER(_LocateCache)
+
+_dealloc_locate_cache = _awfmindex.dfiDeallocLocateCache
+_dealloc_locate_cache.argtypes = [POINTER(_LocateCache)]
+_dealloc_locate_cache.restype = None
+
+_locate_cache_stats = _awfmindex.dfiLocateCacheStats
+_locate_cache_stats.argtypes = [
+    POINTER(_LocateCache),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+]
+_locate_cache_stats.restype = None
+
+
+class _SuffixArrayCache(Structure):
+    pass
+
+
+_create_suffix_array_cache = _awfmindex.dfiCreateSuffixArrayCache
+_create_suffix_array_cache.argtypes = [c_uint64, c_uint64, c_uint64]
+_create_suffix_array_cache.restype = POINTER(_SuffixArrayCache)
+
+_dealloc_suffix_array_cache = _awfmindex.dfiDeallocSuffixArrayCache
+_dealloc_suffix_array_cache.argtypes = [POINTER(_SuffixArrayCache)]
+_dealloc_suffix_array_cache.restype = None
+
+_suffix_array_cache_stats = _awfmindex.dfiSuffixArrayCacheStats
+_suffix_array_cache_stats.argtypes = [
+    POINTER(_SuffixArrayCache),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+]
+_suffix_array_cache_stats.restype = None
+
+_suffix_array_cache_warm = _awfmindex.dfiSuffixArrayCacheWarm
+_suffix_array_cache_warm.argtypes = [
+    POINTER(_Index),
+    POINTER(_SuffixArrayCache),
+    POINTER(c_uint64),
+    c_uint64,
+]
+_suffix_array_cache_warm.restype = c_int
+
+_suffix_array_cache_profile = _awfmindex.dfiSuffixArrayCacheProfile
+_suffix_array_cache_profile.argtypes = [
+    POINTER(_SuffixArrayCache),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    c_uint64,
+]
+_suffix_array_cache_profile.restype = c_uint64
+
+_parallel_search_locate_limited = _awfmindex.dfiParallelSearchLocateLimited
+_parallel_search_locate_limited.argtypes = [
+    POINTER(_Index),
+    POINTER(_KmerSearchList),
+    c_uint64,
+    c_bool,
+    c_uint64,
+    POINTER(_LocateCache),
+    POINTER(_SuffixArrayCache),
+    POINTER(c_uint64),
+    POINTER(_Stats),
+    c_uint32,
+]
+_parallel_search_locate_limited.restype = c_int
+
+_extend_search_range = _awfmindex.dfiExtendSearchRange
+_extend_search_range.argtypes = [
+    POINTER(_Index),
+    POINTER(_SearchRange),
+    c_char_p,
+    c_uint64,
+]
+_extend_search_range.restype = c_bool
+
+_find_search_range_positions = _awfmindex.dfiFindSearchRangePositions
+_find_search_range_positions.argtypes = [
+    POINTER(_Index),
+    POINTER(_SearchRange),
+    POINTER(c_uint64),
+]
+_find_search_range_positions.restype = c_int
+
+_locate_bwt_rows = _awfmindex.dfiLocateBwtRows
+_locate_bwt_rows.argtypes = [
+    POINTER(_Index),
+    POINTER(_LocateCache),
+    POINTER(_SuffixArrayCache),
+    POINTER(_Stats),
+    POINTER(c_uint64),
+    c_uint64,
+]
+_locate_bwt_rows.restype = c_int
+
+_select_search_range_rows = _awfmindex.dfiSelectSearchRangeRows
+_select_search_range_rows.argtypes = [
+    POINTER(_SearchRange),
+    c_uint64,
+    c_bool,
+    c_uint64,
+    POINTER(c_uint64),
+]
+_select_search_range_rows.restype = c_uint64
+
+
+class _ApproximateResults(Structure):
+    pass
+
+
+_search_approximate = _awfmindex.dfiSearchApproximate
+_search_approximate.argtypes = [
+    POINTER(_Index),
+    c_void_p,
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    c_size_t,
+    c_uint8,
+    c_bool,
+    c_uint32,
+]
+_search_approximate.restype = POINTER(_ApproximateResults)
+
+_approximate_results_total_hits = _awfmindex.dfiApproximateResultsTotalHits
+_approximate_results_total_hits.argtypes = [POINTER(_ApproximateResults)]
+_approximate_results_total_hits.restype = c_uint64
+
+_approximate_results_flatten = _awfmindex.dfiApproximateResultsFlatten
+_approximate_results_flatten.argtypes = [
+    POINTER(_ApproximateResults),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+]
+_approximate_results_flatten.restype = c_uint64
+
+_approximate_results_locate = _awfmindex.dfiApproximateResultsLocate
+_approximate_results_locate.argtypes = [
+    POINTER(_Index),
+    POINTER(_ApproximateResults),
+    POINTER(c_uint64),
+    c_uint32,
+]
+_approximate_results_locate.restype = c_int
+
+_dealloc_approximate_results = _awfmindex.dfiDeallocApproximateResults
+_dealloc_approximate_results.argtypes = [POINTER(_ApproximateResults)]
+_dealloc_approximate_results.restype = None
+
+
+class _MemResults(Structure):
+    pass
+
+
+_find_mems = _awfmindex.dfiFindMems
+_find_mems.argtypes = [
+    POINTER(_Index),
+    c_void_p,
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    c_size_t,
+    c_uint64,
+    c_bool,
+    c_uint32,
+]
+_find_mems.restype = POINTER(_MemResults)
+
+_mem_results_total = _awfmindex.dfiMemResultsTotal
+_mem_results_total.argtypes = [POINTER(_MemResults)]
+_mem_results_total.restype = c_uint64
+
+_mem_results_flatten = _awfmindex.dfiMemResultsFlatten
+_mem_results_flatten.argtypes = [
+    POINTER(_MemResults),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+]
+_mem_results_flatten.restype = None
+
+_dealloc_mem_results = _awfmindex.dfiDeallocMemResults
+_dealloc_mem_results.argtypes = [POINTER(_MemResults)]
+_dealloc_mem_results.restype = None
+
+_kmer_search_list_get_counts = _awfmindex.dfiKmerSearchListGetCounts
+_kmer_search_list_get_counts.argtypes = [POINTER(_KmerSearchList), POINTER(c_uint64)]
+_kmer_search_list_get_counts.restype = None
+
+
+_kmer_search_list_total_kmer_length = _awfmindex.dfiKmerSearchListTotalKmerLength
+_kmer_search_list_total_kmer_length.argtypes = [POINTER(_KmerSearchList)]
+_kmer_search_list_total_kmer_length.restype = c_uint64
+
+_kmer_search_list_add_reverse_complements = (
+    _awfmindex.dfiKmerSearchListAddReverseComplements
+)
+_kmer_search_list_add_reverse_complements.argtypes = [
+    POINTER(_KmerSearchList),
+    c_void_p,
+]
+_kmer_search_list_add_reverse_complements.restype = None
+
+_kmer_search_list_flatten_strand_positions = (
+    _awfmindex.dfiKmerSearchListFlattenStrandPositions
+)
+_kmer_search_list_flatten_strand_positions.argtypes = [
+    POINTER(_KmerSearchList),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    POINTER(c_uint8),
+]
+_kmer_search_list_flatten_strand_positions.restype = None
+
+_read_index_from_file_mapped = _awfmindex.dfiReadIndexFromFileMapped
+_read_index_from_file_mapped.argtypes = [
+    POINTER(POINTER(_Index)),
+    c_char_p,
+    c_bool,
+    c_bool,
+    POINTER(c_size_t),
+]
+
+
+_dealloc_mapped_index = _awfmindex.dfiDeallocMappedIndex
+_dealloc_mapped_index.argtypes = [POINTER(_Index), c_size_t]
+_dealloc_mapped_index.restype = None
+
+
+_BuildProgressCallback = CFUNCTYPE(None, c_int, c_uint64, c_uint64, c_void_p)
+
+
+_create_index_parallel = _awfmindex.dfiCreateIndex
+_create_index_parallel.argtypes = [
+    POINTER(POINTER(_Index)),
+    POINTER(_IndexConfiguration),
+    c_void_p,
+    c_size_t,
+    c_char_p,
+    c_char_p,
+    c_uint32,
+    c_uint64,
+    c_char_p,
+    _BuildProgressCallback,
+    c_void_p,
+]
+
+_get_local_sequence_positions = _awfmindex.dfiGetLocalSequencePositions
+_get_local_sequence_positions.argtypes = [
+    POINTER(_Index),
+    POINTER(c_uint64),
+    c_size_t,
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    c_uint32,
+]
+_get_local_sequence_positions.restype = c_int
+
+
+class _SequenceCache(Structure):
+    pass
+
+
+_create_sequence_cache = _awfmindex.dfiCreateSequenceCache
+_create_sequence_cache.argtypes = [c_uint64, c_size_t]
+_create_sequence_cache.restype = POINTER(_SequenceCache)
+
+_dealloc_sequence_cache = _awfmindex.dfiDeallocSequenceCache
+_dealloc_sequence_cache.argtypes = [POINTER(_SequenceCache)]
+_dealloc_sequence_cache.restype = None
+
+_sequence_cache_stats = _awfmindex.dfiSequenceCacheStats
+_sequence_cache_stats.argtypes = [
+    POINTER(_SequenceCache),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+]
+_sequence_cache_stats.restype = None
+
+_read_sequences = _awfmindex.dfiReadSequences
+_read_sequences.argtypes = [
+    POINTER(_Index),
+    c_void_p,
+    POINTER(_SequenceCache),
+    POINTER(c_uint64),
+    POINTER(c_uint64),
+    c_size_t,
+    c_uint64,
+    c_void_p,
+    POINTER(c_uint64),
+    POINTER(_Stats),
+    c_uint32,
+]
+_read_sequences.restype = c_int
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+import threading
+
+__all__ = ["QueryCache"]
+
+# Rough cost of one entry beyond its payload: the dict slot, the key tuple
+# and the value objects.
+_ENTRY_OVERHEAD = 160
+
+
+class QueryCache:
+    """Thread-safe LRU cache of search results within a memory budget.
+
+    Keys are ``(kind, pattern)`` tuples and every entry is charged its
+    payload size plus a fixed overhead. When the charged total exceeds
+    ``max_bytes`` the least recently used entries are evicted. With
+    ``positions`` located positions are cached as well as ranges.
+    """
+
+    def __init__(self, max_bytes: int, positions: bool = False) -> None:
+        if max_bytes <= 0:
+            raise ValueError("Invalid cache size")
+        self.max_bytes = max_bytes
+        self.positions = positions
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(self, keys) -> list:
+        """Return the cached value of every key, None for misses.
+
+        A key that misses more than once in a batch is one miss, its copies
+        are served by the search of the first and count as hits.
+        """
+        values = []
+        missed = set()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    if key in missed:
+                        self.hits += 1
+                    else:
+                        missed.add(key)
+                        self.misses += 1
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    values.append(entry[0])
+        return values
+
+    def put_many(self, items):
+        """Cache ``(key, value, payload_size)`` items, evicting as needed."""
+        with self._lock:
+            for key, value, payload_size in items:
+                size = payload_size + _ENTRY_OVERHEAD
+                if (previous := self._entries.pop(key, None)) is not None:
+                    self.size -= previous[1]
+                self._entries[key] = (value, size)
+                self.size += size
+            while self.size > self.max_bytes and self._entries:
+                _, (_, size) = self._entries.popitem(last=False)
+                self.size -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
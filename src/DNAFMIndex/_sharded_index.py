@@ -0,0 +1,435 @@
+from array import array
+from bisect import bisect_right
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import accumulate
+import json
+import logging
+import os
+from pathlib import Path
+import random
+import tempfile
+
+from . import _dna_fm_index_ctypes as _dfi
+from ._dna_fm_index import (
+    Index,
+    IndexConfiguration,
+    _as_uint64_array,
+    _check_max_hits,
+    _get_default_executor,
+    _uint64_view,
+    read_index_from_file,
+)
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["ShardedIndex"]
+
+_MANIFEST = "shards.json"
+
+
+def _record_lengths(fasta_path: str) -> list[int]:
+    # Number of sequence bytes of every record, newlines excluded.
+    lengths = []
+    with open(fasta_path, "rb") as fasta:
+        for line in fasta:
+            if line.startswith(b">"):
+                lengths.append(0)
+            elif lengths:
+                lengths[-1] += len(line.rstrip(b"\r\n"))
+    return lengths
+
+
+def _partition(lengths: list[int], num_shards: int) -> list[int]:
+    """Return the first record of every shard, shards hold consecutive records.
+
+    Shards are cut where the running total of stored bytes (records and their
+    separators) first reaches an even share, so they are about equally large.
+    """
+    num_shards = min(num_shards, len(lengths))
+    ends = list(accumulate(length + 1 for length in lengths))
+    firsts = [0]
+    for shard in range(1, num_shards):
+        target = ends[-1] * shard // num_shards
+        first = max(bisect_right(ends, target - 1) + 1, firsts[-1] + 1)
+        # Leave at least one record for every later shard.
+        firsts.append(min(first, len(lengths) - (num_shards - shard)))
+    return firsts
+
+
+def _split_fasta(fasta_path: str, firsts: list[int], directory: str) -> list[str]:
+    paths = [os.path.join(directory, f"shard_{i}.fasta") for i in range(len(firsts))]
+    record = -1
+    shard = -1
+    output = None
+    # Holds the open shard file, so it is closed even if a read or write fails.
+    with open(fasta_path, "rb") as fasta, ExitStack() as shard_file:
+        for line in fasta:
+            if line.startswith(b">"):
+                record += 1
+                if shard + 1 < len(firsts) and record == firsts[shard + 1]:
+                    shard_file.close()
+                    shard += 1
+                    output = shard_file.enter_context(open(paths[shard], "wb"))
+            if output is not None:
+                output.write(line)
+    return paths
+
+
+class ShardedIndex:
+    """A reference split by FASTA record across several index files.
+
+    The shards hold consecutive records of one multi-FASTA and are queried
+    concurrently on ``executor`` (a shared thread pool by default), each
+    shard call using ``num_threads`` threads of its own. Results are merged
+    so positions, sequence ids and headers are the ones a single index of
+    the whole FASTA would give: shard i starts where the stored sequence of
+    shard i - 1 ends.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        keep_suffix_array_in_memory: bool = False,
+        use_mmap: bool = False,
+        executor: Executor | None = None,
+    ) -> None:
+        """Load the shards listed in the manifest of ``directory``."""
+        self.directory = Path(directory)
+        with open(self.directory / _MANIFEST) as manifest:
+            shard_files = json.load(manifest)["shards"]
+        self.executor = executor
+        self.shards: list[Index] = list(
+            self._map(
+                lambda shard_file: read_index_from_file(
+                    str(self.directory / shard_file),
+                    keep_suffix_array_in_memory,
+                    use_mmap,
+                ),
+                shard_files,
+            )
+        )
+        # Global start of every shard's sequence and of its first record id.
+        self._starts = list(
+            accumulate((shard.bwt_length - 1 for shard in self.shards), initial=0)
+        )
+        self._first_ids = list(
+            accumulate((shard.num_sequences for shard in self.shards), initial=0)
+        )
+
+    @classmethod
+    def build(
+        cls,
+        config: IndexConfiguration,
+        directory: str | os.PathLike,
+        fasta_path: str,
+        num_shards: int,
+        num_threads: int = 1,
+        max_workers: int | None = None,
+        temp_dir: str | None = None,
+        **load_options,
+    ) -> "ShardedIndex":
+        """Split ``fasta_path`` into ``num_shards`` shards and index them.
+
+        Records are never split and shards get about the same number of
+        bases. Up to ``max_workers`` shards (all by default) are built at
+        once, each on ``num_threads`` threads. The shard indexes and their
+        manifest are written to ``directory``, which is then loaded with
+        ``load_options``.
+        """
+        if num_shards <= 0:
+            raise ValueError("Invalid number of shards")
+        if not os.path.exists(fasta_path):
+            raise FileNotFoundError(fasta_path)
+        lengths = _record_lengths(fasta_path)
+        if not lengths:
+            raise ValueError("The fasta file holds no records.")
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        firsts = _partition(lengths, num_shards)
+        shard_files = [f"shard_{i}.awfmi" for i in range(len(firsts))]
+
+        with tempfile.TemporaryDirectory(dir=temp_dir) as split_dir:
+            fasta_paths = _split_fasta(fasta_path, firsts, split_dir)
+
+            def build_shard(shard_file: str, shard_fasta: str):
+                # The built index is dropped, the shards are loaded below.
+                Index(
+                    config,
+                    str(directory / shard_file),
+                    fasta_path=shard_fasta,
+                    num_threads=num_threads,
+                )
+                logger.debug("Built %s", shard_file)
+
+            with ThreadPoolExecutor(max_workers or len(firsts)) as builders:
+                list(builders.map(build_shard, shard_files, fasta_paths))
+
+        with open(directory / _MANIFEST, "w") as manifest:
+            json.dump({"shards": shard_files}, manifest)
+        return cls(directory, **load_options)
+
+    def _map(self, func, *iterables) -> list:
+        return list((self.executor or _get_default_executor()).map(func, *iterables))
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    @property
+    def sequence_length(self) -> int:
+        """Length of the stored sequence of all shards, separators included."""
+        return self._starts[-1]
+
+    @property
+    def num_sequences(self) -> int:
+        return self._first_ids[-1]
+
+    def header(self, sequence_id: int) -> str:
+        """Return the FASTA header of a global sequence id, without the '>'."""
+        if not 0 <= sequence_id < self.num_sequences:
+            raise IndexError("Sequence id out of range")
+        shard = bisect_right(self._first_ids, sequence_id) - 1
+        return self.shards[shard].header(sequence_id - self._first_ids[shard])
+
+    def count(
+        self, kmers: list[str], num_threads: int = 1, both_strands: bool = False
+    ) -> memoryview:
+        """Return the number of occurrences of every kmer over all shards."""
+        return self.count_many(kmers, num_threads, both_strands=both_strands)
+
+    def count_many(
+        self,
+        patterns,
+        num_threads: int = 1,
+        kmer_length: int | None = None,
+        lengths=None,
+        both_strands: bool = False,
+    ) -> memoryview:
+        """Return the count of every pattern summed over the shards.
+
+        Takes the same arguments as ``Index.count_many``.
+        """
+        shard_counts = self._map(
+            lambda shard: shard.count_many(
+                patterns, num_threads, kmer_length, lengths, both_strands
+            ).tolist(),
+            self.shards,
+        )
+        if both_strands:
+            totals = array(
+                "Q",
+                (
+                    total
+                    for rows in zip(*shard_counts)
+                    for total in map(sum, zip(*rows))
+                ),
+            )
+            return memoryview(totals).cast("B").cast("Q", [len(totals) // 2, 2])
+        return memoryview(array("Q", map(sum, zip(*shard_counts))))
+
+    def locate(
+        self,
+        kmers: list[str],
+        num_threads: int = 1,
+        both_strands: bool = False,
+        max_hits: int | None = None,
+        sample: bool = False,
+        seed: int = 0,
+    ) -> tuple[memoryview, ...]:
+        """Return the global positions of every kmer as CSR positions and offsets.
+
+        Takes the same arguments and returns the same arrays as
+        ``Index.locate``. Positions are grouped by shard. With ``max_hits``
+        the first shards fill the quota first, and with ``sample`` the
+        positions are a uniform sample over all shards.
+        """
+        if max_hits is not None:
+            _check_max_hits(max_hits)
+        results = self._map(
+            lambda shard: shard.locate(
+                kmers, num_threads, both_strands, max_hits, sample, seed
+            ),
+            self.shards,
+        )
+        num_strands = 2 if both_strands else 1
+        # Move the hits of every shard to global positions in a single C
+        # call, then split them into (kmer, strand) groups.
+        shard_groups = []
+        for shard_start, result in zip(self._starts, results):
+            positions, offsets = result[0], result[1].tolist()
+            if shard_start and len(positions):
+                position_array = _as_uint64_array(positions)
+                _dfi._offset_positions(position_array, len(position_array), shard_start)
+                positions = _uint64_view(position_array)
+            bounds = []
+            for i in range(len(kmers)):
+                start, end = offsets[i], offsets[i + 1]
+                if both_strands:
+                    middle = end - sum(result[2][start:end])
+                    bounds += ((start, middle), (middle, end))
+                else:
+                    bounds.append((start, end))
+            counts = (
+                result[-1].cast("B").cast("Q").tolist()
+                if max_hits is not None
+                else [end - start for start, end in bounds]
+            )
+            shard_groups.append((positions, bounds, counts))
+
+        rng = random.Random(seed)
+        merged = array("Q")
+        strands = array("B")
+        kmer_offsets = array("Q", [0])
+        totals = array("Q")
+        for group in range(len(kmers) * num_strands):
+            counts = [groups[2][group] for groups in shard_groups]
+            totals.append(sum(counts))
+            taken = [end - start for start, end in (g[1][group] for g in shard_groups)]
+            if max_hits is not None and totals[-1] > max_hits:
+                if sample:
+                    # Draw which of all the hits are kept, then as many hits
+                    # from each shard's own uniform sample.
+                    picks = rng.sample(range(totals[-1]), max_hits)
+                    shard_ends = list(accumulate(counts))
+                    taken = [0] * len(counts)
+                    for pick in picks:
+                        taken[bisect_right(shard_ends, pick)] += 1
+                else:
+                    remaining = max_hits
+                    for shard, available in enumerate(taken):
+                        taken[shard] = min(available, remaining)
+                        remaining -= taken[shard]
+            for shard, (positions, bounds, _) in enumerate(shard_groups):
+                start, end = bounds[group]
+                if sample and taken[shard] < end - start:
+                    merged.extend(
+                        rng.sample(positions[start:end].tolist(), taken[shard])
+                    )
+                else:
+                    merged.frombytes(positions[start : start + taken[shard]].cast("B"))
+            if both_strands:
+                strands.extend(bytes([group % 2]) * (len(merged) - len(strands)))
+            if group % num_strands == num_strands - 1:
+                kmer_offsets.append(len(merged))
+
+        result = (memoryview(merged), memoryview(kmer_offsets))
+        if both_strands:
+            result += (memoryview(strands),)
+        if max_hits is not None:
+            counts = memoryview(totals)
+            if both_strands:
+                counts = counts.cast("B").cast("Q", [len(kmers), 2])
+            result += (counts,)
+        return result
+
+    def _shard_of(self, position: int) -> int:
+        return bisect_right(self._starts, position) - 1
+
+    def read_sequence_from_file(self, start: int, segment_length: int) -> str:
+        """Read a segment of the stored sequence like ``Index`` does.
+
+        The segment ends early at the end of a record, as in ``Index``.
+        """
+        if start < 0:
+            raise ValueError("The start position must be more or equal to 0")
+        if segment_length <= 0:
+            return ""
+        if start >= self.sequence_length:
+            raise ValueError("The start position is not less than the end position.")
+        shard = self._shard_of(start)
+        local_start = start - self._starts[shard]
+        shard_length = self._starts[shard + 1] - self._starts[shard]
+        return self.shards[shard].read_sequence_from_file(
+            local_start, min(segment_length, shard_length - local_start)
+        )
+
+    def read_sequences(
+        self, starts, lengths, num_threads: int = 1, max_gap: int = 4096
+    ) -> tuple[memoryview, memoryview]:
+        """Read many segments of the stored sequence of all shards.
+
+        Takes the same arguments and returns the same arrays as
+        ``Index.read_sequences``. Segments crossing into the next shard are
+        read piecewise, every shard gets one batched read.
+        """
+        starts = list(starts)
+        if isinstance(lengths, int):
+            if lengths < 0:
+                raise ValueError("Invalid length")
+            lengths = [lengths] * len(starts)
+        else:
+            lengths = list(lengths)
+        if len(lengths) != len(starts):
+            raise ValueError("Starts and lengths must have the same size.")
+        offsets = list(accumulate(lengths, initial=0))
+
+        # (output offset, local start, length) of every piece, per shard.
+        pieces = [[] for _ in self.shards]
+        for start, length, offset in zip(starts, lengths, offsets):
+            if start + length > self.sequence_length:
+                raise ValueError("Segment reaches past the end of the sequence.")
+            while length > 0:
+                shard = self._shard_of(start)
+                piece = min(length, self._starts[shard + 1] - start)
+                pieces[shard].append((offset, start - self._starts[shard], piece))
+                start += piece
+                offset += piece
+                length -= piece
+
+        def read_pieces(shard_pieces):
+            shard, shard_pieces = shard_pieces
+            if not shard_pieces:
+                return None
+            return self.shards[shard].read_sequences(
+                [piece[1] for piece in shard_pieces],
+                [piece[2] for piece in shard_pieces],
+                num_threads,
+                max_gap,
+            )
+
+        sequences = bytearray(offsets[-1])
+        for shard_pieces, result in zip(
+            pieces, self._map(read_pieces, enumerate(pieces))
+        ):
+            if result is None:
+                continue
+            data, data_offsets = result
+            for (offset, _, length), data_offset in zip(shard_pieces, data_offsets):
+                sequences[offset : offset + length] = data[
+                    data_offset : data_offset + length
+                ]
+        return memoryview(sequences), memoryview(array("Q", offsets))
+
+    def to_local_coordinates(
+        self, positions, num_threads: int = 1
+    ) -> tuple[memoryview, memoryview]:
+        """Translate global positions into global sequence ids and offsets."""
+        positions = list(positions)
+        by_shard = [[] for _ in self.shards]
+        for i, position in enumerate(positions):
+            if position >= self.sequence_length:
+                raise ValueError("Position lies past the end of the last sequence.")
+            by_shard[self._shard_of(position)].append(i)
+
+        def translate(shard_indices):
+            shard, indices = shard_indices
+            if not indices:
+                return None
+            return self.shards[shard].to_local_coordinates(
+                [positions[i] - self._starts[shard] for i in indices], num_threads
+            )
+
+        sequence_ids = array("Q", bytes(8 * len(positions)))
+        local_positions = array("Q", bytes(8 * len(positions)))
+        for shard, (indices, result) in enumerate(
+            zip(by_shard, self._map(translate, enumerate(by_shard)))
+        ):
+            if result is None:
+                continue
+            first_id = self._first_ids[shard]
+            for i, sequence_id, local_position in zip(
+                indices, result[0].tolist(), result[1].tolist()
+            ):
+                sequence_ids[i] = sequence_id + first_id
+                local_positions[i] = local_position
+        return memoryview(sequence_ids), memoryview(local_positions)
@@ -0,0 +1,113 @@
+from collections.abc import Callable
+from contextlib import contextmanager
+import ctypes
+import threading
+import time
+
+from . import _dna_fm_index_ctypes as _dfi
+
+__all__ = ["IndexStats"]
+
+# Bucket i of a wall time histogram counts the calls that took less than
+# 2**i microseconds and at least 2**(i - 1), the last bucket all slower ones.
+NUM_BUCKETS = 32
+
+
+class _OperationStats:
+    __slots__ = ("calls", "seconds", "native_seconds", "histogram")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.native_seconds = 0.0
+        self.histogram = [0] * NUM_BUCKETS
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "native_seconds": self.native_seconds,
+            "python_seconds": self.seconds - self.native_seconds,
+            "histogram": list(self.histogram),
+        }
+
+
+class IndexStats:
+    """Call statistics of an index and of the search lists used with it.
+
+    Every instrumented call records its wall time and the part of it spent
+    in native calls, the rest is Python overhead such as encoding queries
+    and building results. The native searches add their work to
+    ``counters``: kmers searched, seed table hits, traceback steps, suffix
+    array values read and bytes read from the index file. ``hook`` is
+    called as ``hook(operation, seconds, native_seconds)`` after every call,
+    to feed a metrics system.
+    """
+
+    def __init__(self, hook: Callable[[str, float, float], None] | None = None) -> None:
+        self.hook = hook
+        self.counters = _dfi._Stats()
+        self._operations: dict[str, _OperationStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def operation(self, name: str):
+        """Time a call, calls nested in it count towards it."""
+        local = self._local
+        if getattr(local, "native_seconds", None) is not None:
+            yield
+            return
+        local.native_seconds = 0.0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            native_seconds = local.native_seconds
+            local.native_seconds = None
+            self._record(name, seconds, native_seconds)
+
+    def native(self, func, *args):
+        """Call a native function, adding its time to the current operation."""
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            if getattr(self._local, "native_seconds", None) is not None:
+                self._local.native_seconds += time.perf_counter() - start
+
+    def _record(self, name: str, seconds: float, native_seconds: float):
+        bucket = min(int(seconds * 1e6).bit_length(), NUM_BUCKETS - 1)
+        with self._lock:
+            if (operation := self._operations.get(name)) is None:
+                operation = self._operations[name] = _OperationStats()
+            operation.calls += 1
+            operation.seconds += seconds
+            operation.native_seconds += native_seconds
+            operation.histogram[bucket] += 1
+        if self.hook is not None:
+            self.hook(name, seconds, native_seconds)
+
+    def as_dict(self) -> dict:
+        """Return the statistics as a dict of plain values."""
+        counters = self.counters
+        with self._lock:
+            operations = {
+                name: operation.as_dict()
+                for name, operation in self._operations.items()
+            }
+        return {
+            "operations": operations,
+            "kmers_searched": counters.kmers_searched,
+            "seed_table_hits": counters.seed_table_hits,
+            "full_searches": counters.kmers_searched - counters.seed_table_hits,
+            "traceback_steps": counters.traceback_steps,
+            "suffix_array_reads": counters.suffix_array_reads,
+            "bytes_read": counters.bytes_read,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            ctypes.memset(ctypes.byref(self.counters), 0, ctypes.sizeof(self.counters))
@@ -0,0 +1,303 @@
+from array import array
+from contextlib import contextmanager, nullcontext
+import gzip
+import io
+from itertools import accumulate
+import logging
+import os
+import queue
+import threading
+import time
+
+from ._dna_fm_index import KmerSearchList
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["ReadHits", "SearchStream"]
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_EMPTY = memoryview(b"").cast("Q")
+# CSR offsets of a read without kmers.
+_EMPTY_OFFSETS = memoryview(array("Q", [0]))
+
+
+class ReadHits:
+    """Search results for the kmers of one read, in read order."""
+
+    __slots__ = ("name", "counts", "_positions", "_offsets")
+
+    def __init__(
+        self,
+        name: str,
+        counts: memoryview,
+        positions: memoryview | None = None,
+        offsets: memoryview | None = None,
+    ) -> None:
+        self.name = name
+        self.counts = counts
+        self._positions = positions
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    @property
+    def located(self) -> bool:
+        return self._positions is not None
+
+    def positions(self, i: int) -> memoryview:
+        """Return the located positions of the i-th kmer of the read."""
+        if self._positions is None:
+            raise ValueError("The stream was not run with locate=True.")
+        return self._positions[self._offsets[i] : self._offsets[i + 1]]
+
+    @property
+    def all_positions(self) -> memoryview:
+        if self._positions is None or not len(self.counts):
+            return _EMPTY
+        return self._positions[self._offsets[0] : self._offsets[-1]]
+
+
+class _Batch:
+    __slots__ = ("names", "buffer", "read_offsets", "read_lengths", "kmer_offsets")
+
+    def __init__(self, names: list[str], sequences: list[bytes], k: int) -> None:
+        self.names = names
+        self.buffer = b"".join(sequences)
+        self.read_lengths = [len(sequence) for sequence in sequences]
+        self.read_offsets = list(accumulate(self.read_lengths, initial=0))[:-1]
+        self.kmer_offsets = list(
+            accumulate((max(0, n - k + 1) for n in self.read_lengths), initial=0)
+        )
+
+
+class SearchStream:
+    """Iterator over the per-read hits of a FASTA/FASTQ file of queries.
+
+    Reads are parsed in batches of ``batch_size`` on a background thread
+    while the previous batch is searched, with at most ``prefetch`` parsed
+    batches waiting, so memory stays bounded whatever the input size. Every
+    overlapping kmer of length ``k`` is searched in one reused search list.
+    """
+
+    def __init__(
+        self,
+        index,
+        source,
+        k: int,
+        batch_size: int = 10000,
+        num_threads: int = 4,
+        locate: bool = False,
+        prefetch: int = 2,
+        trim_capacity: int | None = 1024,
+    ) -> None:
+        if k <= 0:
+            raise ValueError("Invalid length")
+        if batch_size <= 0 or prefetch <= 0:
+            raise ValueError("Batch size and prefetch must be positive.")
+        self.index = index
+        self.source = source
+        self.k = k
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.locate = locate
+        self.prefetch = prefetch
+        self.trim_capacity = trim_capacity
+        self.reads = 0
+        self.kmers = 0
+        self.elapsed = 0.0
+        self._results = self._run()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> ReadHits:
+        return next(self._results)
+
+    def close(self):
+        self._results.close()
+
+    @property
+    def reads_per_second(self) -> float:
+        return self.reads / self.elapsed if self.elapsed else 0.0
+
+    def _run(self):
+        start = time.perf_counter()
+        batches = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce, args=(batches, stop), daemon=True
+        )
+        producer.start()
+        search_list = KmerSearchList(1)
+        try:
+            while (batch := batches.get()) is not None:
+                if isinstance(batch, BaseException):
+                    raise batch
+                yield from self._search_batch(search_list, batch)
+                self.elapsed = time.perf_counter() - start
+        finally:
+            stop.set()
+            producer.join()
+            self.elapsed = time.perf_counter() - start
+            logger.info(
+                "Searched %d reads (%d kmers) in %.2f s, %.0f reads/s.",
+                self.reads,
+                self.kmers,
+                self.elapsed,
+                self.reads_per_second,
+            )
+
+    def _search_batch(self, search_list: KmerSearchList, batch: _Batch):
+        search_list.fill_windows(
+            batch.buffer, batch.read_offsets, batch.read_lengths, self.k
+        )
+        counts = positions = offsets = None
+        if search_list.count:
+            if self.locate:
+                search_list.parallel_search_locate(self.index, self.num_threads)
+                positions, offsets = search_list.positions_csr()
+            else:
+                search_list.parallel_search_count(self.index, self.num_threads)
+            counts = search_list.counts()
+        self.kmers += search_list.count
+        search_list.reset(self.trim_capacity)
+
+        kmer_offsets = batch.kmer_offsets
+        for i, name in enumerate(batch.names):
+            start, end = kmer_offsets[i], kmer_offsets[i + 1]
+            self.reads += 1
+            if start == end:
+                if self.locate:
+                    yield ReadHits(name, _EMPTY, _EMPTY, _EMPTY_OFFSETS)
+                else:
+                    yield ReadHits(name, _EMPTY)
+                continue
+            yield ReadHits(
+                name,
+                counts[start:end],
+                positions,
+                offsets[start : end + 1] if self.locate else None,
+            )
+
+    def _produce(self, batches: queue.Queue, stop: threading.Event):
+        try:
+            with _open_sequence_file(self.source) as handle:
+                for batch in _read_batches(handle, self.batch_size, self.k):
+                    if not _put(batches, batch, stop):
+                        return
+            item = None
+        except BaseException as e:
+            item = e
+        _put(batches, item, stop)
+
+
+def _put(batches: queue.Queue, item, stop: threading.Event) -> bool:
+    # Blocks while the queue is full, but gives up once the consumer stops.
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+@contextmanager
+def _open_sequence_file(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            gzipped = f.read(2) == _GZIP_MAGIC
+        opener = gzip.open if gzipped else open
+        with opener(source, "rb") as handle:
+            yield handle
+    else:
+        peek = getattr(source, "peek", None)
+        if peek is not None:
+            magic = peek(2)[:2]
+        else:
+            # Without peek the magic bytes are consumed, so they are put back
+            # in front of the rest of the stream.
+            magic = source.read(2)
+            source = io.BufferedReader(_PrefixedReader(magic, source))
+        if magic == _GZIP_MAGIC:
+            with gzip.GzipFile(fileobj=source) as handle:
+                yield handle
+        else:
+            with nullcontext(source) as handle:
+                yield handle
+
+
+class _PrefixedReader(io.RawIOBase):
+    """Raw stream of ``prefix`` followed by the rest of ``source``."""
+
+    def __init__(self, prefix: bytes, source) -> None:
+        self._prefix = prefix
+        self._source = source
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._prefix:
+            data = self._prefix[: len(buffer)]
+            self._prefix = self._prefix[len(data) :]
+        else:
+            data = self._source.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _read_batches(handle, batch_size: int, k: int):
+    names: list[str] = []
+    sequences: list[bytes] = []
+    for name, sequence in _read_records(handle):
+        names.append(name.decode())
+        sequences.append(sequence)
+        if len(names) == batch_size:
+            yield _Batch(names, sequences, k)
+            names, sequences = [], []
+    if names:
+        yield _Batch(names, sequences, k)
+
+
+def _read_records(handle):
+    line = handle.readline()
+    while line and not line.strip():
+        line = handle.readline()
+    if not line:
+        return
+    if line.startswith(b">"):
+        yield from _read_fasta_records(handle, line)
+    elif line.startswith(b"@"):
+        yield from _read_fastq_records(handle, line)
+    else:
+        raise ValueError("Input is neither FASTA nor FASTQ.")
+
+
+def _read_fasta_records(handle, header: bytes):
+    name = header[1:].rstrip()
+    chunks: list[bytes] = []
+    for line in handle:
+        if line.startswith(b">"):
+            yield name, b"".join(chunks)
+            name = line[1:].rstrip()
+            chunks = []
+        else:
+            chunks.append(line.rstrip())
+    yield name, b"".join(chunks)
+
+
+def _read_fastq_records(handle, header: bytes):
+    line = header
+    while line:
+        if not line.startswith(b"@"):
+            raise ValueError("Malformed FASTQ record.")
+        name = line[1:].rstrip()
+        sequence = handle.readline().rstrip()
+        handle.readline()  # "+" separator
+        handle.readline()  # qualities
+        yield name, sequence
+        line = handle.readline()
+        while line and not line.strip():
+            line = handle.readline()
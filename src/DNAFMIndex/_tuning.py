@@ -0,0 +1,261 @@
+from dataclasses import asdict, dataclass, field
+import json
+import logging
+import os
+import tempfile
+import time
+
+from ._dna_fm_index import Index, IndexConfiguration, read_index_from_file
+from ._sharded_index import _record_lengths
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["TrialResult", "TuningReport", "tune_configuration"]
+
+_AMINO = 1
+# Bytes of one kmer seed table entry, an AwFmSearchRange.
+_SEED_ENTRY_SIZE = 16
+
+
+@dataclass
+class TrialResult:
+    """Measurements of one configuration, memory scaled to the full input."""
+
+    suffix_array_compression_ratio: int
+    kmer_length_in_seed_table: int
+    estimated_memory: int
+    count_seconds: float
+    locate_seconds: float
+    located_positions: int
+    within_budget: bool = False
+    pareto_optimal: bool = False
+
+    @property
+    def query_seconds(self) -> float:
+        """Count plus locate time per query."""
+        return self.count_seconds + self.locate_seconds
+
+
+@dataclass
+class TuningReport:
+    """Trial results of ``tune_configuration`` and the recommended setting.
+
+    ``recommended`` is the trial within the memory budget with the lowest
+    count plus locate time per query, the smaller one on ties, or None if
+    no trial fits the budget.
+    """
+
+    fasta_path: str
+    alphabet_type: int
+    sequence_length: int
+    sample_length: int
+    num_queries: int
+    memory_budget: int
+    trials: list[TrialResult] = field(default_factory=list)
+    recommended: TrialResult | None = None
+
+    def configuration(
+        self,
+        keep_suffix_array_in_memory: bool = True,
+        store_original_sequence: bool = True,
+    ) -> IndexConfiguration:
+        """Return the recommended configuration."""
+        if self.recommended is None:
+            raise ValueError("No configuration fits the memory budget.")
+        return IndexConfiguration(
+            self.recommended.suffix_array_compression_ratio,
+            self.recommended.kmer_length_in_seed_table,
+            self.alphabet_type,
+            keep_suffix_array_in_memory,
+            store_original_sequence,
+        )
+
+    def build(self, file_path: str, num_threads: int = 1, **options) -> Index:
+        """Index the whole tuned FASTA with the recommended configuration."""
+        return Index(
+            self.configuration(),
+            file_path,
+            fasta_path=self.fasta_path,
+            num_threads=num_threads,
+            **options,
+        )
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def save(self, path: str):
+        """Write the report as JSON."""
+        with open(path, "w") as report:
+            json.dump(self.as_dict(), report, indent=2)
+
+    def __str__(self) -> str:
+        lines = [
+            f"{self.fasta_path}: {self.sequence_length} bases, trials on "
+            f"{self.sample_length} with {self.num_queries} queries, "
+            f"budget {self.memory_budget / (1 << 20):.1f} MiB",
+            f"{'ratio':>6} {'seed k':>6} {'memory MiB':>11} {'count us':>9} "
+            f"{'locate us':>10}",
+        ]
+        for trial in self.trials:
+            marks = (" *" if trial.pareto_optimal else "") + (
+                " <" if trial is self.recommended else ""
+            )
+            lines.append(
+                f"{trial.suffix_array_compression_ratio:>6} "
+                f"{trial.kmer_length_in_seed_table:>6} "
+                f"{trial.estimated_memory / (1 << 20):>11.1f} "
+                f"{trial.count_seconds * 1e6:>9.2f} "
+                f"{trial.locate_seconds * 1e6:>10.2f}{marks}"
+            )
+        return "\n".join(lines)
+
+
+def _write_sample(fasta_path: str, sample_path: str, sample_length: int) -> int:
+    # Copies whole records from the start, cutting the last one at
+    # sample_length bases. Returns the number of bases copied.
+    copied = 0
+    with open(fasta_path, "rb") as fasta, open(sample_path, "wb") as sample:
+        for line in fasta:
+            if line.startswith(b">"):
+                if copied >= sample_length:
+                    break
+                sample.write(line)
+                continue
+            bases = line.rstrip(b"\r\n")[: sample_length - copied]
+            if bases:
+                sample.write(bases + b"\n")
+                copied += len(bases)
+    return copied
+
+
+def _estimate_memory(
+    trial: Index, seed_table_size: int, ratio: int, bwt_length: int
+) -> int:
+    """Memory of an index over ``bwt_length`` positions, from a trial index.
+
+    The bwt and prefix sums are scaled from the trial, the seed table does
+    not depend on the input and the sampled suffix array is computed.
+    """
+    bwt_size = trial.sequence_file_offset - seed_table_size
+    scaled_bwt_size = bwt_size * bwt_length // trial.bwt_length
+    suffix_array_values = -(-bwt_length // ratio)
+    suffix_array_size = -(-suffix_array_values * bwt_length.bit_length() // 8)
+    return seed_table_size + scaled_bwt_size + suffix_array_size
+
+
+def _best_of(repeat: int, func) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _mark_pareto_optimal(trials: list[TrialResult]):
+    # A trial is dominated when another one is no worse in memory, count and
+    # locate time and better in one of them.
+    def costs(trial):
+        return (trial.estimated_memory, trial.count_seconds, trial.locate_seconds)
+
+    for trial in trials:
+        trial.pareto_optimal = not any(
+            other is not trial
+            and all(a <= b for a, b in zip(costs(other), costs(trial)))
+            and costs(other) != costs(trial)
+            for other in trials
+        )
+
+
+def tune_configuration(
+    fasta_path: str,
+    sample_queries: list[str],
+    memory_budget: int,
+    seed_kmer_lengths=(8, 10, 12),
+    compression_ratios=(4, 8, 16, 32, 64),
+    alphabet_type: int = 2,
+    sample_length: int = 1 << 22,
+    num_threads: int = 1,
+    repeat: int = 3,
+    temp_dir: str | None = None,
+) -> TuningReport:
+    """Measure index configurations on a sample of a FASTA file.
+
+    The first ``sample_length`` bases of ``fasta_path`` are indexed with
+    every combination of ``seed_kmer_lengths`` and ``compression_ratios``,
+    and ``sample_queries`` are counted and located against each trial index
+    with ``num_threads`` threads, best of ``repeat`` runs. Memory is
+    estimated for an index of the whole file with the suffix array in
+    memory. Seed table lengths whose table alone exceeds ``memory_budget``
+    are skipped without building.
+
+    Returns a ``TuningReport``, whose ``recommended`` trial is the fastest
+    within the budget and whose ``build`` indexes the whole file with it.
+    """
+    if not sample_queries:
+        raise ValueError("No sample queries given.")
+    if memory_budget <= 0:
+        raise ValueError("Invalid memory budget")
+    if not os.path.exists(fasta_path):
+        raise FileNotFoundError(fasta_path)
+    record_lengths = _record_lengths(fasta_path)
+    if not record_lengths:
+        raise ValueError("The fasta file holds no records.")
+    # Every record is stored with a separator, plus the sentinel.
+    bwt_length = sum(record_lengths) + len(record_lengths) + 1
+    cardinality = 20 if alphabet_type == _AMINO else 4
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as trial_dir:
+        sample_path = os.path.join(trial_dir, "sample.fasta")
+        report = TuningReport(
+            fasta_path,
+            alphabet_type,
+            bwt_length - 1,
+            _write_sample(fasta_path, sample_path, sample_length),
+            len(sample_queries),
+            memory_budget,
+        )
+        index_path = os.path.join(trial_dir, "trial.awfmi")
+        for kmer_length in seed_kmer_lengths:
+            seed_table_size = cardinality**kmer_length * _SEED_ENTRY_SIZE
+            if seed_table_size > memory_budget:
+                logger.info("Skipping seed kmer length %d", kmer_length)
+                continue
+            for ratio in compression_ratios:
+                config = IndexConfiguration(
+                    ratio, kmer_length, alphabet_type, True, True
+                )
+                if os.path.exists(index_path):
+                    os.unlink(index_path)
+                Index(
+                    config, index_path, fasta_path=sample_path, num_threads=num_threads
+                )
+                trial = read_index_from_file(index_path, True)
+                count_seconds = _best_of(
+                    repeat, lambda: trial.count_many(sample_queries, num_threads)
+                )
+                located_positions = len(trial.locate(sample_queries, num_threads)[0])
+                locate_seconds = _best_of(
+                    repeat, lambda: trial.locate(sample_queries, num_threads)
+                )
+                memory = _estimate_memory(trial, seed_table_size, ratio, bwt_length)
+                report.trials.append(
+                    TrialResult(
+                        ratio,
+                        kmer_length,
+                        memory,
+                        count_seconds / len(sample_queries),
+                        locate_seconds / len(sample_queries),
+                        located_positions,
+                        memory <= memory_budget,
+                    )
+                )
+                logger.debug("Trial %s", report.trials[-1])
+                del trial
+
+    _mark_pareto_optimal(report.trials)
+    if candidates := [trial for trial in report.trials if trial.within_budget]:
+        report.recommended = min(
+            candidates, key=lambda trial: (trial.query_seconds, trial.estimated_memory)
+        )
+    return report
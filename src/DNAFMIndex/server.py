@@ -0,0 +1,338 @@
+"""Multi-process search server sharing one loaded index.
+
+``IndexServer`` starts a supervisor process with the ``spawn`` method, which
+loads the index once, binds a Unix socket and forks worker processes that
+inherit the loaded index copy-on-write (or, with the default
+``use_mmap=True``, share its page-cache mapping). Forking from a fresh
+process keeps the workers clear of the threads of the caller, an OpenMP pool
+inherited mid-use deadlocks the first multi-threaded search. Every worker
+accepts connections on the shared listening socket and answers batched
+requests.
+``IndexClient`` connects to the socket and mirrors the search methods of
+``Index``.
+
+Wire format, all integers little-endian:
+
+    request   op:u8  n:u64  payload
+    response  status:u8  n:u64  payload
+
+    COUNT / LOCATE   request payload is n u32 kmer lengths followed by the
+                     concatenated kmers. COUNT answers n u64 counts, LOCATE
+                     answers n + 1 u64 offsets followed by offsets[n] u64
+                     positions.
+    RANGE            request payload is one kmer of n bytes. Answers n = 2
+                     u64 (start_ptr, end_ptr), or n = 0 when not found.
+    READ_SEQUENCE    request payload is start:u64 length:u64, n is 0.
+                     Answers the n sequence bytes.
+
+A response with a non-zero status carries an n byte UTF-8 error message.
+"""
+
+from array import array
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+
+from ._dna_fm_index import SearchRange, read_index_from_file
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["IndexServer", "IndexClient"]
+
+OP_COUNT = 1
+OP_LOCATE = 2
+OP_RANGE = 3
+OP_READ_SEQUENCE = 4
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_HEADER = struct.Struct("<BQ")
+_READ_REQUEST = struct.Struct("<QQ")
+_RANGE_RESPONSE = struct.Struct("<QQ")
+
+
+class IndexServer:
+    """Pre-forking Unix socket server over one loaded index."""
+
+    def __init__(
+        self,
+        index_path: str,
+        socket_path: str,
+        num_workers: int = 4,
+        num_threads: int = 1,
+        use_mmap: bool = True,
+        keep_suffix_array_in_memory: bool = False,
+        backlog: int = 128,
+    ) -> None:
+        if num_workers <= 0:
+            raise ValueError("Invalid number of workers")
+        self.index_path = index_path
+        self.socket_path = socket_path
+        self.num_workers = num_workers
+        self.num_threads = num_threads
+        self.use_mmap = use_mmap
+        self.keep_suffix_array_in_memory = keep_suffix_array_in_memory
+        self.backlog = backlog
+        # Only set in the supervisor process.
+        self.index = None
+        self._socket: socket.socket | None = None
+        self._workers: list[int] = []
+        self._supervisor = None
+
+    def start(self):
+        """Start the supervisor and wait until its workers accept, then return."""
+        if self._supervisor is not None:
+            raise RuntimeError("Server is already running.")
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        supervisor = context.Process(
+            target=_supervise, args=(self, sender), daemon=True
+        )
+        supervisor.start()
+        self._supervisor = supervisor
+        sender.close()
+        try:
+            error = receiver.recv()
+        except EOFError:
+            error = "The index server supervisor exited during startup."
+        finally:
+            receiver.close()
+        if error is not None:
+            self.stop()
+            raise RuntimeError(error)
+        logger.info("Serving %s with %d workers.", self.socket_path, self.num_workers)
+
+    def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.terminate()
+            self._supervisor.join()
+            self._supervisor = None
+        # Left behind if the supervisor was killed before cleaning up.
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def serve_forever(self):
+        self.start()
+        try:
+            self._supervisor.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _fork_workers(self):
+        # Loaded before forking so every worker inherits the same index.
+        self.index = read_index_from_file(
+            self.index_path, self.keep_suffix_array_in_memory, use_mmap=self.use_mmap
+        )
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.socket_path)
+        self._socket.listen(self.backlog)
+        for _ in range(self.num_workers):
+            pid = os.fork()
+            if pid == 0:
+                status = 0
+                try:
+                    self._worker_loop()
+                except BaseException:
+                    logger.exception("Index server worker failed.")
+                    status = 1
+                finally:
+                    os._exit(status)
+            self._workers.append(pid)
+
+    def _stop_workers(self):
+        for pid in self._workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self._workers = []
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def _worker_loop(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        while True:
+            connection, _ = self._socket.accept()
+            with connection:
+                try:
+                    self._serve_connection(connection)
+                except ConnectionError:
+                    pass
+
+    def _serve_connection(self, connection: socket.socket):
+        while (header := _recv_exactly(connection, _HEADER.size)) is not None:
+            op, n = _HEADER.unpack(header)
+            try:
+                parts = self._handle(connection, op, n)
+            except ConnectionError:
+                raise
+            except Exception as e:
+                message = str(e).encode()
+                parts = [_HEADER.pack(STATUS_ERROR, len(message)), message]
+            for part in parts:
+                connection.sendall(part)
+
+    def _handle(self, connection: socket.socket, op: int, n: int) -> list:
+        index = self.index
+        if op in (OP_COUNT, OP_LOCATE):
+            lengths = array("I", _recv_required(connection, 4 * n))
+            kmers = _recv_required(connection, sum(lengths))
+            if n == 0:
+                # LOCATE still answers the single offset of an empty CSR.
+                empty = [] if op == OP_COUNT else [bytes(8)]
+                return [_HEADER.pack(STATUS_OK, 0), *empty]
+            with index._search_lists.search_list(n) as search_list:
+                search_list.fill_packed(kmers, lengths=lengths)
+                if op == OP_COUNT:
+                    search_list.parallel_search_count(index, self.num_threads)
+                    return [_HEADER.pack(STATUS_OK, n), search_list.counts()]
+                search_list.parallel_search_locate(index, self.num_threads)
+                positions, offsets = search_list.positions_csr()
+                return [_HEADER.pack(STATUS_OK, n), offsets, positions]
+        if op == OP_RANGE:
+            kmer = _recv_required(connection, n).decode()
+            search_range = index.find_search_range_for_string(kmer)
+            if search_range is None:
+                return [_HEADER.pack(STATUS_OK, 0)]
+            return [
+                _HEADER.pack(STATUS_OK, 2),
+                _RANGE_RESPONSE.pack(search_range.start_ptr, search_range.end_ptr),
+            ]
+        if op == OP_READ_SEQUENCE:
+            start, length = _READ_REQUEST.unpack(
+                _recv_required(connection, _READ_REQUEST.size)
+            )
+            segment = index.read_sequence_from_file(start, length).encode()
+            return [_HEADER.pack(STATUS_OK, len(segment)), segment]
+        raise ValueError(f"Unknown operation {op}")
+
+
+def _supervise(server: IndexServer, ready):
+    # Runs in the spawned supervisor: forks the workers, reports whether they
+    # started, then waits on them until it is terminated.
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        try:
+            server._fork_workers()
+        except Exception as e:
+            ready.send(str(e))
+            return
+        ready.send(None)
+        ready.close()
+        for pid in server._workers:
+            os.waitpid(pid, 0)
+    finally:
+        server._stop_workers()
+
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(0)
+
+
+class IndexClient:
+    """Client for ``IndexServer`` with the search methods of ``Index``."""
+
+    def __init__(self, socket_path: str, timeout: float | None = None) -> None:
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(socket_path)
+
+    def count(self, kmers: list[str]) -> memoryview:
+        n = self._request_kmers(OP_COUNT, kmers)
+        return memoryview(self._recv(8 * n)).cast("Q")
+
+    def locate(self, kmers: list[str]) -> tuple[memoryview, memoryview]:
+        n = self._request_kmers(OP_LOCATE, kmers)
+        offsets = memoryview(self._recv(8 * (n + 1))).cast("Q")
+        positions = memoryview(self._recv(8 * offsets[-1])).cast("Q")
+        return positions, offsets
+
+    def find_search_range_for_string(self, kmer: str) -> SearchRange | None:
+        kmer_bytes = kmer.encode()
+        if not kmer_bytes:
+            raise ValueError("Invalid length")
+        self._socket.sendall(_HEADER.pack(OP_RANGE, len(kmer_bytes)) + kmer_bytes)
+        if self._response() == 0:
+            return None
+        return SearchRange(*_RANGE_RESPONSE.unpack(self._recv(_RANGE_RESPONSE.size)))
+
+    def read_sequence_from_file(self, start: int, segment_length: int) -> str:
+        if start < 0:
+            raise ValueError("The start position must be more or equal to 0")
+        if segment_length <= 0:
+            return ""
+        self._socket.sendall(
+            _HEADER.pack(OP_READ_SEQUENCE, 0)
+            + _READ_REQUEST.pack(start, segment_length)
+        )
+        return self._recv(self._response()).decode()
+
+    def close(self):
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _request_kmers(self, op: int, kmers: list[str]) -> int:
+        encoded = [kmer.encode() for kmer in kmers]
+        lengths = array("I", map(len, encoded))
+        self._socket.sendall(_HEADER.pack(op, len(encoded)))
+        self._socket.sendall(lengths)
+        self._socket.sendall(b"".join(encoded))
+        return self._response()
+
+    def _response(self) -> int:
+        status, n = _HEADER.unpack(self._recv(_HEADER.size))
+        if status != STATUS_OK:
+            raise Exception(self._recv(n).decode())
+        return n
+
+    def _recv(self, size: int) -> bytearray:
+        return _recv_required(self._socket, size)
+
+
+def _recv_exactly(connection: socket.socket, size: int) -> bytearray | None:
+    # Returns None if the peer closed the connection before sending anything.
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = connection.recv_into(view[received:])
+        if n == 0:
+            if received == 0:
+                return None
+            raise ConnectionError("Connection closed mid-message.")
+        received += n
+    return buffer
+
+
+def _recv_required(connection: socket.socket, size: int) -> bytearray:
+    if size == 0:
+        return bytearray()
+    if (buffer := _recv_exactly(connection, size)) is None:
+        raise ConnectionError("Connection closed mid-message.")
+    return buffer
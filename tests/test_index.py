@@ -1,8 +1,13 @@
+import asyncio
+import ctypes
+import gzip
 import logging
+from itertools import product
 
 import pytest
 
 import DNAFMIndex as dfi
+from DNAFMIndex.server import IndexClient, IndexServer
 
 logger = logging.getLogger(__name__)
 
@@ -20,11 +25,100 @@ def test_index_creation_from_fasta_file(config):
     assert index is not None
 
 
+def test_parallel_index_creation(config, index, tmp_path):
+    stages = []
+    parallel_index = dfi.Index(
+        config,
+        str(tmp_path / "parallel.awfmi"),
+        SEQUENCE,
+        num_threads=4,
+        progress=lambda stage, done, total: stages.append((stage, done, total)),
+    )
+    assert (tmp_path / "parallel.awfmi").read_bytes() == open(
+        "./tests/index.awfmi", "rb"
+    ).read()
+    assert parallel_index.count(KMERS).tolist() == [_count(MER3), _count(MER4)]
+    assert stages[0] == (dfi.BuildStage.Sanitize, 0, 1)
+    assert stages[-1] == (dfi.BuildStage.WriteFile, 1, 1)
+    assert {stage for stage, _, _ in stages} == set(dfi.BuildStage)
+
+    (tmp_path / "seq.fasta").write_text(f">seq\n{SEQUENCE}\n")
+    fasta_index = dfi.Index(
+        config,
+        str(tmp_path / "fasta.awfmi"),
+        fasta_path=str(tmp_path / "seq.fasta"),
+        num_threads=2,
+    )
+    assert fasta_index.count(KMERS).tolist() == [_count(MER3), _count(MER4)]
+
+
+def test_bounded_memory_index_creation(config, index, tmp_path):
+    (tmp_path / "seq.raw").write_bytes(SEQUENCE.encode())
+    bounded_index = dfi.Index(
+        config,
+        str(tmp_path / "bounded.awfmi"),
+        tmp_path / "seq.raw",
+        memory_limit=1,
+        temp_dir=str(tmp_path),
+    )
+    assert bounded_index.count(KMERS).tolist() == index.count(KMERS).tolist()
+    positions, offsets = bounded_index.locate(KMERS)
+    assert sorted(positions[: offsets[1]].tolist()) == _positions(MER3)
+    assert bounded_index.read_sequence_from_file(10, 10) == "TGAAGATAAG"
+    # the temporary suffix array file is gone once the build returns
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "bounded.awfmi",
+        "seq.raw",
+    ]
+
+
 def test_read_index_from_file():
     index = dfi.read_index_from_file("./tests/index.awfmi", False)
     assert index is not None
 
 
+def test_read_index_from_file_mmap(index):
+    mapped_index = dfi.read_index_from_file(
+        "./tests/index.awfmi", use_mmap=True, will_need=True, huge_pages=True
+    )
+    assert mapped_index.bwt_length == index.bwt_length
+    assert mapped_index.count(KMERS).tolist() == index.count(KMERS).tolist()
+    positions, offsets = mapped_index.locate(KMERS)
+    assert sorted(positions[: offsets[1]].tolist()) == _positions(MER3)
+    assert mapped_index.read_sequence_from_file(10, 10) == "TGAAGATAAG"
+    del mapped_index
+
+
+def test_index_server(index, tmp_path):
+    socket_path = str(tmp_path / "index.sock")
+    with IndexServer("./tests/index.awfmi", socket_path, num_workers=2):
+        with IndexClient(socket_path) as client:
+            assert client.count(KMERS).tolist() == index.count(KMERS).tolist()
+            positions, offsets = client.locate(KMERS)
+            assert sorted(positions[: offsets[1]].tolist()) == _positions(MER3)
+            assert client.count([]).tolist() == []
+            search_range = client.find_search_range_for_string(MER3)
+            assert search_range.end_ptr - search_range.start_ptr + 1 == _count(MER3)
+            assert client.read_sequence_from_file(10, 10) == "TGAAGATAAG"
+        with IndexClient(socket_path) as client:
+            assert client.count([MER3]).tolist() == [_count(MER3)]
+
+
+def test_index_server_after_parallel_search(index, tmp_path):
+    # The workers must not inherit the OpenMP pool this search starts.
+    kmers = ["ACGT", "GGA"] * 100
+    counts = index.count_many(kmers, num_threads=4).tolist()
+    socket_path = str(tmp_path / "index.sock")
+    with IndexServer("./tests/index.awfmi", socket_path, num_threads=4):
+        with IndexClient(socket_path, timeout=30) as client:
+            assert client.count(kmers).tolist() == counts
+            positions, offsets = client.locate(KMERS)
+            assert sorted(positions[: offsets[1]].tolist()) == _positions(MER3)
+    assert not (tmp_path / "index.sock").exists()
+    with pytest.raises(RuntimeError):
+        IndexServer(str(tmp_path / "missing.awfmi"), socket_path).start()
+
+
 def test_find_search_range_for_string(index):
     search_range = index.find_search_range_for_string(MER3)
     assert search_range is not None
@@ -36,6 +130,68 @@ def test_create_kmer_search_list():
     assert kmer_search_list.count == 2
 
 
+def test_fill_to_capacity():
+    kmer_search_list = dfi.KmerSearchList(2)
+    kmer_search_list.fill(KMERS)
+    assert kmer_search_list.count == 2
+    with pytest.raises(ValueError):
+        kmer_search_list.fill(KMERS + [MER3])
+
+
+def test_kmer_search_list_reserve_and_reset(index):
+    kmer_search_list = dfi.KmerSearchList(2)
+    kmer_search_list.fill(KMERS)
+    kmer_search_list.parallel_search_locate(index)
+    position_list = kmer_search_list.kmer_search_data[0].position_list
+    address = ctypes.cast(position_list, ctypes.c_void_p).value
+    kmer_search_list.reserve(8)
+    assert kmer_search_list.capacity == 8
+    position_list = kmer_search_list.kmer_search_data[0].position_list
+    assert ctypes.cast(position_list, ctypes.c_void_p).value == address
+    kmer_search_list.reset()
+    assert kmer_search_list.count == 0
+    kmer_search_list.fill(KMERS * 4)
+    kmer_search_list.parallel_search_locate(index)
+    assert kmer_search_list.positions_csr()[1][-1] == 20
+
+
+def test_kmer_search_list_pool(index):
+    pool = dfi.KmerSearchListPool(4)
+    with pool.search_list(len(KMERS)) as kmer_search_list:
+        kmer_search_list.fill(KMERS)
+        kmer_search_list.parallel_search_count(index)
+    assert len(pool) == 1
+    assert pool.acquire(16) is kmer_search_list
+    assert kmer_search_list.capacity == 16
+    assert kmer_search_list.count == 0
+
+    bounded = dfi.KmerSearchListPool(4, max_idle=1, max_capacity=8)
+    lists = [bounded.acquire(), bounded.acquire(), bounded.acquire(16)]
+    for search_list in lists:
+        bounded.release(search_list)
+    # the grown list is freed and only one small list stays idle.
+    assert len(bounded) == 1
+    assert bounded.acquire() is lists[0]
+
+
+def test_fill_packed_fixed_length(index):
+    kmer_search_list = dfi.KmerSearchList(5)
+    kmer_search_list.fill_packed(b"CTGCAG", kmer_length=3)
+    kmer_search_list.parallel_search_count(index)
+    assert kmer_search_list.count == 2
+    assert kmer_search_list.kmer_search_data[0].count == 4
+    assert kmer_search_list.kmer_search_data[1].count == SEQUENCE.count("CAG")
+
+
+def test_fill_packed_lengths(index):
+    kmer_search_list = dfi.KmerSearchList(5)
+    kmer_search_list.fill_packed(bytearray((MER3 + MER4).encode()), lengths=[3, 4])
+    kmer_search_list.parallel_search_count(index)
+    assert [kmer_search_list.kmer_search_data[i].count for i in range(2)] == [4, 1]
+    with pytest.raises(ValueError):
+        kmer_search_list.fill_packed(b"CTG", lengths=[2, 2])
+
+
 def test_parallel_search_locate(index):
     kmer_search_list = dfi.KmerSearchList(5)
     kmer_search_list.fill(KMERS)
@@ -53,11 +209,685 @@ def test_parallel_search_count(index):
         assert kmer_search_list.kmer_search_data[i].count in kmers_count
 
 
+def test_kmer_search_list_positions(index):
+    kmer_search_list = dfi.KmerSearchList(5)
+    kmer_search_list.fill(KMERS)
+    kmer_search_list.parallel_search_locate(index)
+    for i, kmer in enumerate(KMERS):
+        expected = [j for j in range(len(SEQUENCE)) if SEQUENCE.startswith(kmer, j)]
+        assert sorted(kmer_search_list.positions(i).tolist()) == expected
+
+
+def test_kmer_search_list_positions_csr(index):
+    kmer_search_list = dfi.KmerSearchList(5)
+    kmer_search_list.fill(KMERS)
+    kmer_search_list.parallel_search_locate(index)
+    positions, offsets = kmer_search_list.positions_csr()
+    assert offsets.tolist() == [0, 4, 5]
+    for i in range(kmer_search_list.count):
+        assert (
+            positions[offsets[i] : offsets[i + 1]].tolist()
+            == kmer_search_list.positions(i).tolist()
+        )
+
+
+def test_search_stream_fasta(index, tmp_path):
+    reads = {"read1": SEQUENCE[:20], "read2": SEQUENCE[30:45] + "\n" + SEQUENCE[45:60]}
+    fasta = tmp_path / "reads.fa"
+    fasta.write_text("".join(f">{name}\n{seq}\n" for name, seq in reads.items()))
+    hits = list(index.search_stream(str(fasta), k=4, batch_size=1, num_threads=1))
+    assert [read_hits.name for read_hits in hits] == ["read1", "read2"]
+    for read_hits, sequence in zip(hits, (SEQUENCE[:20], SEQUENCE[30:60])):
+        assert read_hits.counts.tolist() == [
+            _count(sequence[i : i + 4]) for i in range(len(sequence) - 3)
+        ]
+
+
+def test_search_stream_fastq_gzip_locate(index, tmp_path):
+    fastq = tmp_path / "reads.fq.gz"
+    with gzip.open(fastq, "wt") as f:
+        f.write(f"@r1\n{MER3}CAG\n+\nIIIIII\n@short\nAC\n+\nII\n")
+    stream = index.search_stream(fastq, k=3, locate=True)
+    hits = list(stream)
+    assert stream.reads == 2
+    assert len(hits[1]) == 0
+    assert len(hits[1].all_positions) == 0
+    with pytest.raises(IndexError):
+        hits[1].positions(0)
+    assert sorted(hits[0].positions(0).tolist()) == _positions(MER3)
+    assert len(hits[0].all_positions) == sum(hits[0].counts)
+
+    # Unbuffered files have no peek, the magic bytes are read and put back.
+    fasta = tmp_path / "reads.fa"
+    fasta.write_text(f">r1\n{MER3}CAG\n")
+    for path in (fastq, fasta):
+        with open(path, "rb", buffering=0) as f:
+            raw_hits = list(index.search_stream(f, k=3))
+        assert raw_hits[0].name == "r1"
+        assert raw_hits[0].counts.tolist() == hits[0].counts.tolist()
+
+
+def test_index_count_and_locate(index):
+    assert index.count(KMERS).tolist() == [_count(kmer) for kmer in KMERS]
+    positions, offsets = index.locate(KMERS)
+    assert offsets.tolist() == [0, 4, 5]
+    assert sorted(positions[:4].tolist()) == _positions(MER3)
+
+
+def test_index_count_many_and_ranges_many(index):
+    missing = "T" * 40
+    kmers = KMERS + [missing]
+    counts = [_count(kmer) for kmer in kmers]
+    assert index.count_many(kmers, num_threads=2).tolist() == counts
+    ranges = index.ranges_many(kmers)
+    assert ranges.shape == (len(kmers), 2)
+    for kmer, (start, end), count in zip(kmers, ranges.tolist(), counts):
+        assert (end - start + 1 if end >= start else 0) == count
+        if count > 1:
+            search_range = index.find_search_range_for_string(kmer)
+            assert (search_range.start_ptr, search_range.end_ptr) == (start, end)
+    packed = "".join(KMERS).encode()
+    lengths = [len(kmer) for kmer in KMERS]
+    assert index.count_many(packed, lengths=lengths).tolist() == counts[:-1]
+    assert (
+        index.count_many(MER3.encode() * 3, kmer_length=len(MER3)).tolist()
+        == [_count(MER3)] * 3
+    )
+    assert len(index.count_many([])) == 0
+    assert len(index.ranges_many([])) == 0
+
+
+def test_both_strands(index):
+    kmers = KMERS + ["ACGT", "GTNA"]
+    reverse = [_reverse_complement(kmer) for kmer in kmers]
+    counts = index.count(kmers, num_threads=2, both_strands=True)
+    assert counts.shape == (len(kmers), 2)
+    assert counts.tolist() == [
+        [_count(kmer), _count(rc)] for kmer, rc in zip(kmers, reverse)
+    ]
+    assert (
+        index.count_many(
+            MER3.encode() * 2, kmer_length=len(MER3), both_strands=True
+        ).tolist()
+        == [[_count(MER3), _count(_reverse_complement(MER3))]] * 2
+    )
+
+    positions, offsets, strands = index.locate(kmers, both_strands=True)
+    for i, (kmer, rc) in enumerate(zip(kmers, reverse)):
+        hits = list(
+            zip(
+                strands[offsets[i] : offsets[i + 1]].tolist(),
+                positions[offsets[i] : offsets[i + 1]].tolist(),
+            )
+        )
+        assert [strand for strand, _ in hits] == sorted(strand for strand, _ in hits)
+        assert sorted(hits) == [(0, p) for p in _positions(kmer)] + [
+            (1, p) for p in _positions(rc)
+        ]
+    assert [len(array) for array in index.locate([], both_strands=True)] == [0, 1, 0]
+
+
+def test_locate_max_hits(index):
+    kmers = KMERS + ["A", "T" * 40]
+    positions, offsets, counts = index.locate(kmers, max_hits=3)
+    assert counts.tolist() == [_count(kmer) for kmer in kmers]
+    for i, kmer in enumerate(kmers):
+        hits = positions[offsets[i] : offsets[i + 1]].tolist()
+        assert len(hits) == min(_count(kmer), 3)
+        assert set(hits) <= set(_positions(kmer))
+        assert hits == index.cursor(kmer).locate(max_hits=3).tolist()
+
+    samples = set()
+    for seed in range(10):
+        positions, offsets, _ = index.locate(["A"], max_hits=3, sample=True, seed=seed)
+        assert len(set(positions.tolist())) == 3
+        assert set(positions.tolist()) <= set(_positions("A"))
+        assert (
+            positions.tolist()
+            == index.cursor("A").locate(max_hits=3, sample=True, seed=seed).tolist()
+        )
+        samples.add(tuple(positions.tolist()))
+    assert len(samples) > 1
+    full = index.locate(["A"], max_hits=_count("A"), sample=True)[0].tolist()
+    assert sorted(full) == _positions("A")
+
+    positions, offsets, counts = index.locate(KMERS, max_hits=0)
+    assert (len(positions), counts.tolist()) == (0, [_count(MER3), _count(MER4)])
+    *_, counts = index.locate(KMERS, both_strands=True, max_hits=1)
+    assert counts.shape == (len(KMERS), 2)
+    with pytest.raises(ValueError):
+        index.locate(KMERS, max_hits=-1)
+
+    search_list = dfi.KmerSearchList(2)
+    search_list.fill(["A", MER3])
+    search_list.parallel_search_locate(index, num_threads=2, max_hits=2)
+    assert search_list.counts().tolist() == [2, min(_count(MER3), 2)]
+    assert search_list.total_counts().tolist() == [_count("A"), _count(MER3)]
+
+
+def test_to_local_coordinates(config, index, tmp_path):
+    records = [("chr1 first", SEQUENCE[:40]), ("chr2", SEQUENCE[40:]), ("chr3", MER4)]
+    (tmp_path / "records.fasta").write_text(
+        "".join(f">{header}\n{sequence}\n" for header, sequence in records)
+    )
+    fasta_index = dfi.Index(
+        config,
+        str(tmp_path / "records.awfmi"),
+        fasta_path=str(tmp_path / "records.fasta"),
+    )
+    positions, _ = fasta_index.locate(["TA"])
+    sequence_ids, local_positions = fasta_index.to_local_coordinates(positions)
+    hits = sorted(zip(sequence_ids.tolist(), local_positions.tolist()))
+    assert hits == [
+        (i, j)
+        for i, (_, sequence) in enumerate(records)
+        for j in range(len(sequence))
+        if sequence.startswith("TA", j)
+    ]
+    assert fasta_index.num_sequences == 3
+    assert [fasta_index.header(i) for i in range(3)] == [h for h, _ in records]
+    assert fasta_index.header(1) == "chr2"
+    with pytest.raises(IndexError):
+        fasta_index.header(3)
+    with pytest.raises(ValueError):
+        fasta_index.to_local_coordinates([fasta_index.bwt_length + 1])
+    with pytest.raises(ValueError):
+        index.to_local_coordinates([0])
+    assert index.num_sequences == 0
+
+
+@pytest.mark.parametrize("num_shards", [1, 3, 8])
+def test_sharded_index(tmp_path, num_shards):
+    # A short seed table keeps the many small builds fast.
+    config = dfi.IndexConfiguration(
+        SUFFIX_ARRAY_COMPRESSION_RATIO, 4, ALPHABET_TYPE, True, True
+    )
+    records = [(f"chr{i}", SEQUENCE[i * 7 :] + SEQUENCE[: i * 5]) for i in range(6)]
+    (tmp_path / "records.fasta").write_text(
+        "".join(f">{header}\n{sequence}\n" for header, sequence in records)
+    )
+    single = dfi.Index(
+        config,
+        str(tmp_path / "records.awfmi"),
+        fasta_path=str(tmp_path / "records.fasta"),
+    )
+    sharded = dfi.ShardedIndex.build(
+        config, tmp_path / "shards", str(tmp_path / "records.fasta"), num_shards
+    )
+    assert len(sharded) == min(num_shards, len(records))
+    assert sharded.sequence_length == single.bwt_length - 1
+    assert sharded.num_sequences == len(records)
+    assert [sharded.header(i) for i in range(len(records))] == [
+        header for header, _ in records
+    ]
+
+    kmers = KMERS + ["A", "GATAA", "T" * 40]
+    assert sharded.count(kmers).tolist() == single.count(kmers).tolist()
+    assert (
+        sharded.count(kmers, both_strands=True).tolist()
+        == single.count(kmers, both_strands=True).tolist()
+    )
+
+    def hits(result, i):
+        positions, offsets = result[0], result[1]
+        return sorted(positions[offsets[i] : offsets[i + 1]].tolist())
+
+    result, expected = sharded.locate(kmers), single.locate(kmers)
+    assert [hits(result, i) for i in range(len(kmers))] == [
+        hits(expected, i) for i in range(len(kmers))
+    ]
+    positions, offsets, strands = sharded.locate(kmers, both_strands=True)
+    assert strands.tolist() == single.locate(kmers, both_strands=True)[2].tolist()
+    for sample in (False, True):
+        positions, offsets, counts = sharded.locate(kmers, max_hits=3, sample=sample)
+        assert counts.tolist() == single.count(kmers).tolist()
+        for i in range(len(kmers)):
+            located = hits((positions, offsets), i)
+            assert len(located) == min(3, counts[i])
+            assert set(located) <= set(hits(expected, i))
+
+    assert (
+        sharded.to_local_coordinates(result[0])[0].tolist()
+        == single.to_local_coordinates(result[0])[0].tolist()
+    )
+    starts = [0, 30, 85, sharded.sequence_length - 100]
+    sequences, offsets = sharded.read_sequences(starts, 100)
+    assert bytes(sequences) == bytes(single.read_sequences(starts, 100)[0])
+    assert offsets.tolist() == [0, 100, 200, 300, 400]
+    assert sharded.read_sequence_from_file(90, 50) == single.read_sequence_from_file(
+        90, 50
+    )
+    with pytest.raises(ValueError):
+        sharded.read_sequences([sharded.sequence_length], 1)
+    assert dfi.ShardedIndex(tmp_path / "shards").count(kmers).tolist() == (
+        single.count(kmers).tolist()
+    )
+
+
+def test_index_stats(index):
+    instrumented = dfi.read_index_from_file("./tests/index.awfmi")
+    assert instrumented.stats is None
+    calls = []
+    stats = instrumented.enable_stats(
+        hook=lambda operation, seconds, native: calls.append(operation)
+    )
+    kmers = KMERS + ["A"]
+    assert instrumented.count(kmers).tolist() == [_count(kmer) for kmer in kmers]
+    positions, offsets = instrumented.locate(kmers, num_threads=2)
+    assert sorted(positions[offsets[0] : offsets[1]].tolist()) == _positions(MER3)
+    instrumented.read_sequences([0, 10], 5)
+    assert calls == ["count", "locate", "read_sequences"]
+
+    report = stats.as_dict()
+    # Kmers shorter than the seed table kmers are searched in full.
+    assert report["kmers_searched"] == 2 * len(kmers)
+    assert report["seed_table_hits"] == 0
+    assert report["full_searches"] == 2 * len(kmers)
+    assert report["suffix_array_reads"] == len(positions)
+    assert report["traceback_steps"] > 0
+    assert report["bytes_read"] >= len(positions) + 10
+    for name in calls:
+        operation = report["operations"][name]
+        assert operation["calls"] == 1 == sum(operation["histogram"])
+        assert 0 < operation["native_seconds"] <= operation["seconds"]
+
+    stats.reset()
+    assert stats.as_dict()["kmers_searched"] == 0
+    assert stats.as_dict()["operations"] == {}
+    instrumented.disable_stats()
+    instrumented.count(kmers)
+    assert calls == ["count", "locate", "read_sequences"]
+
+
+def test_tune_configuration(tmp_path):
+    records = [(f"chr{i}", SEQUENCE[i * 7 :] * 20) for i in range(3)]
+    (tmp_path / "records.fasta").write_text(
+        "".join(f">{header}\n{sequence}\n" for header, sequence in records)
+    )
+    fasta_path = str(tmp_path / "records.fasta")
+    report = dfi.tune_configuration(
+        fasta_path,
+        KMERS + ["GATAA"],
+        1 << 20,
+        seed_kmer_lengths=(4, 6, 12),
+        compression_ratios=(2, 16),
+        sample_length=2000,
+        repeat=1,
+    )
+    # The seed table of kmer length 12 alone exceeds the budget.
+    assert [
+        (trial.kmer_length_in_seed_table, trial.suffix_array_compression_ratio)
+        for trial in report.trials
+    ] == [(4, 2), (4, 16), (6, 2), (6, 16)]
+    assert report.sample_length == 2000
+    assert report.recommended in report.trials
+    assert report.recommended.within_budget
+    assert any(trial.pareto_optimal for trial in report.trials)
+    assert report.trials[0].estimated_memory > report.trials[1].estimated_memory
+    report.save(str(tmp_path / "report.json"))
+    assert (tmp_path / "report.json").read_text().count("estimated_memory") == 5
+
+    built = report.build(str(tmp_path / "tuned.awfmi"))
+    assert built.count(KMERS).tolist() == [
+        sum(sequence.count(kmer) for _, sequence in records) for kmer in KMERS
+    ]
+    # The estimate is for the loaded index, without the stored sequence.
+    actual = (tmp_path / "tuned.awfmi").stat().st_size - (built.bwt_length - 1)
+    assert abs(report.recommended.estimated_memory - actual) < 1024
+
+    small = dfi.tune_configuration(
+        fasta_path, KMERS, 1 << 12, seed_kmer_lengths=(4,), compression_ratios=(8,)
+    )
+    assert small.recommended is None
+    with pytest.raises(ValueError):
+        small.configuration()
+
+
+@pytest.mark.parametrize("capacity", [4, 1024])
+def test_locate_cache(index, capacity):
+    cached = dfi.read_index_from_file("./tests/index.awfmi")
+    assert cached.locate_cache_stats is None
+    cached.enable_locate_cache(capacity)
+    kmers = KMERS + ["A"]
+    for _ in range(3):
+        positions, offsets = cached.locate(kmers, num_threads=2)
+        for i, kmer in enumerate(kmers):
+            hits = positions[offsets[i] : offsets[i + 1]].tolist()
+            assert sorted(hits) == _positions(kmer)
+        assert sorted(cached.cursor("A").locate().tolist()) == _positions("A")
+    stats = cached.locate_cache_stats
+    assert stats.misses >= sum(_count(kmer) for kmer in kmers)
+    assert stats.hits > 0
+    with pytest.raises(ValueError):
+        cached.enable_locate_cache(0)
+
+
+@pytest.mark.parametrize("max_bytes", [16, 4096])
+def test_suffix_array_cache(index, max_bytes, tmp_path):
+    on_disk = dfi.read_index_from_file("./tests/index.awfmi", False)
+    assert on_disk.suffix_array_cache_stats is None
+    on_disk.enable_suffix_array_cache(max_bytes, page_size=8, readahead=1)
+    kmers = KMERS + ["A"]
+    for _ in range(2):
+        positions, offsets = on_disk.locate(kmers, num_threads=2)
+        for i, kmer in enumerate(kmers):
+            hits = positions[offsets[i] : offsets[i + 1]].tolist()
+            assert sorted(hits) == _positions(kmer)
+        assert sorted(on_disk.cursor("A").locate().tolist()) == _positions("A")
+    stats = on_disk.suffix_array_cache_stats
+    assert stats.misses > 0
+    if max_bytes == 4096:
+        # The whole suffix array fits, so only the first locate misses.
+        assert stats.hits > stats.misses
+
+    profile = str(tmp_path / "profile.json")
+    on_disk.save_suffix_array_profile(profile)
+    warmed = dfi.read_index_from_file("./tests/index.awfmi", False)
+    warmed.enable_suffix_array_cache(4096, page_size=16, profile=profile)
+    positions, _ = warmed.locate(["A"])
+    assert sorted(positions.tolist()) == _positions("A")
+    if max_bytes == 4096:
+        assert warmed.suffix_array_cache_stats.misses == 0
+    with pytest.raises(ValueError):
+        index.enable_suffix_array_cache()
+
+
+def test_query_cache(index):
+    cached = dfi.read_index_from_file("./tests/index.awfmi")
+    assert cached.query_cache_stats is None
+    cached.enable_query_cache(positions=True)
+    kmers = KMERS + ["A", "T" * 40, MER3]
+    counts = [_count(kmer) for kmer in kmers]
+    for _ in range(2):
+        assert cached.count(kmers).tolist() == counts
+        assert cached.ranges_many(kmers).tolist() == index.ranges_many(kmers).tolist()
+        positions, offsets = cached.locate(kmers)
+        assert [
+            sorted(positions[offsets[i] : offsets[i + 1]].tolist())
+            for i in range(len(kmers))
+        ] == [_positions(kmer) for kmer in kmers]
+    assert cached.find_search_range_for_string(
+        "A"
+    ) == index.find_search_range_for_string("A")
+    stats = cached.query_cache_stats
+    # Only the first count and the first locate miss, MER3 once each.
+    assert stats.misses == 2 * len(set(kmers))
+    assert stats.hits == 4 * len(kmers) + 1 + 2
+
+    # A pattern repeated in a batch is searched once.
+    counted = dfi.read_index_from_file("./tests/index.awfmi")
+    counted.enable_query_cache()
+    stats = counted.enable_stats()
+    assert counted.count([MER3, MER4, MER3, MER3]).tolist() == [4, 1, 4, 4]
+    assert stats.as_dict()["kmers_searched"] == 2
+
+    cached.enable_query_cache(max_bytes=400)
+    cached.count(["A", "C", "G", "T"])
+    assert len(cached._query_cache) == 2
+    assert cached._query_cache.size <= 400
+
+
+def test_native_fast_paths(index, monkeypatch):
+    if dfi._dna_fm_index_ctypes._native is None:
+        pytest.skip("The compiled fast paths are not built.")
+    native_index = dfi.read_index_from_file("./tests/index.awfmi")
+    kmers = KMERS + ["A", "T" * 40, SEQUENCE[10:30]]
+
+    def results():
+        positions, offsets = native_index.locate(kmers, 2)
+        return (
+            [native_index.find_search_range_for_string(kmer) for kmer in kmers],
+            native_index.count(kmers, 2).tolist(),
+            native_index.ranges_many(kmers).tolist(),
+            sorted(positions.tolist()),
+            offsets.tolist(),
+            native_index.read_sequence_from_file(10, 20),
+            native_index.read_sequence_from_file(len(SEQUENCE) - 5, 5),
+        )
+
+    native = results()
+    assert native[1] == [_count(kmer) for kmer in kmers]
+    assert native[5] == SEQUENCE[10:30]
+    with pytest.raises(ValueError):
+        native_index.find_search_range_for_string("")
+    native_index.enable_locate_cache(64)
+    assert results() == native
+    monkeypatch.setattr(dfi._dna_fm_index_ctypes, "_native", None)
+    assert results() == native
+
+
+def test_search_cursor(index):
+    cursor = index.cursor("TG")
+    assert cursor.count == _count("TG")
+    ctg = cursor.fork().extend("C")
+    assert (ctg.length, ctg.count) == (3, _count(MER3))
+    assert sorted(ctg.locate().tolist()) == _positions(MER3)
+    assert cursor.length == 2
+    assert index.cursor().extend_many(MER4).count == _count(MER4)
+    assert index.cursor(SEQUENCE[10:30]).locate().tolist() == [10]
+    assert index.cursor("N" + MER3).count == 0
+    assert index.cursor(MER3).extend("X").extend("A").search_range is None
+
+    def walk(cursor, suffix, depth):
+        assert cursor.count == _count(suffix)
+        if depth and cursor.count:
+            for letter in "ACGT":
+                walk(cursor.fork().extend(letter), letter + suffix, depth - 1)
+
+    # The empty pattern spans the whole BWT, sentinel row included.
+    assert index.cursor().count == index.bwt_length
+    for letter in "ACGT":
+        walk(index.cursor(letter), letter, 3)
+
+
+def test_search_approximate(index):
+    pattern = "CTGA"
+    hits = index.search_approximate(pattern, max_mismatches=1, locate=True)
+    expected = [
+        j
+        for j in range(len(SEQUENCE) - len(pattern) + 1)
+        if sum(a != b for a, b in zip(SEQUENCE[j:], pattern)) <= 1
+    ]
+    assert sorted(hits.all_positions.tolist()) == expected
+    assert sum(hits.counts) == len(expected)
+    assert set(hits.errors.tolist()) == {1}
+    assert hits.ranges.shape == (len(hits), 2)
+    for i, (start, end) in enumerate(hits.ranges.tolist()):
+        assert len(hits.positions(i)) == end - start + 1
+
+    exact = index.search_approximate(MER3, max_mismatches=0)
+    assert (len(exact), exact.counts.tolist()) == (1, [_count(MER3)])
+    assert not exact.located
+
+    # "TTATGAA" with its "A" deleted and a "C" inserted.
+    edited = index.search_approximate("TTTGCAA", max_edits=2, locate=True)
+    assert 7 in edited.all_positions.tolist()
+    assert (
+        7
+        not in index.search_approximate(
+            "TTTGCAA", max_mismatches=2, locate=True
+        ).all_positions.tolist()
+    )
+
+    many = index.search_approximate_many(
+        [pattern, MER3, "N" * 3], max_mismatches=1, num_threads=2
+    )
+    near_mer3 = {
+        SEQUENCE[j : j + 3]
+        for j in range(len(SEQUENCE) - 2)
+        if sum(a != b for a, b in zip(SEQUENCE[j:], MER3)) <= 1
+    }
+    assert [len(pattern_hits) for pattern_hits in many] == [
+        len(hits),
+        len(near_mer3),
+        0,
+    ]
+    assert many[0].ranges.tolist() == hits.ranges.tolist()
+    with pytest.raises(ValueError):
+        index.search_approximate("")
+
+
+def test_search_approximate_edits(index):
+    # Strings that share a BWT range, like "GATAAGA" and "GATAAGAC", are one
+    # hit with the fewest errors of any of them.
+    for pattern, max_edits in product(["CTGA", "AGATAA", "GATAAGAC"], [1, 2]):
+        hits = index.search_approximate(pattern, max_edits=max_edits, locate=True)
+        found = {
+            tuple(hit_range): (hits.errors[i], sorted(hits.positions(i).tolist()))
+            for i, hit_range in enumerate(hits.ranges.tolist())
+        }
+        expected = {}
+        for match, errors in _edited_matches(pattern, max_edits).items():
+            search_range = index.cursor(match).search_range
+            key = (search_range.start_ptr, search_range.end_ptr)
+            best = expected.get(key, (errors,))[0]
+            expected[key] = (min(best, errors), _positions(match))
+        assert found == expected
+
+
+def test_find_mems(index):
+    read = SEQUENCE[5:25] + "N" + SEQUENCE[40:52] + "A" + SEQUENCE[60:75]
+    smems = index.find_smems(read, min_length=5).tolist()
+    assert [(offset, length) for offset, length, _, _ in smems] == _smems(read, 5)
+    assert smems[0][:2] == [0, 20]
+    for offset, length, start_ptr, end_ptr in smems:
+        assert end_ptr - start_ptr + 1 == _count(read[offset : offset + length])
+
+    mems = index.find_mems(read, min_length=5).tolist()
+    assert {tuple(mem) for mem in smems} <= {tuple(mem) for mem in mems}
+    for offset, length, start_ptr, end_ptr in mems:
+        match = read[offset : offset + length]
+        assert end_ptr - start_ptr + 1 == _count(match) > 0
+        assert offset == 0 or not _count(read[offset - 1] + match)
+
+    mems, offsets = index.find_mems_many(
+        [read, "NNNN", SEQUENCE], min_length=5, num_threads=2, super_maximal=True
+    )
+    n = len(smems)
+    assert offsets.tolist() == [0, n, n, n + 1]
+    assert mems.tolist()[:n] == smems
+    assert mems.tolist()[n][:2] == [0, len(SEQUENCE)]
+    assert len(index.find_smems("ACGT" * 3, min_length=19)) == 0
+
+
+def test_async_search(index):
+    async def search():
+        return await asyncio.gather(
+            *(index.count_async([kmer]) for kmer in KMERS * 8),
+            index.locate_async(KMERS),
+            index.read_sequence_from_file_async(10, 10),
+        )
+
+    *counts, (positions, offsets), segment = asyncio.run(search())
+    assert [c.tolist() for c in counts] == [[_count(kmer)] for kmer in KMERS * 8]
+    assert offsets.tolist() == [0, 4, 5]
+    assert segment == "TGAAGATAAG"
+
+
+def test_kmer_search_list_async(index):
+    kmer_search_list = dfi.KmerSearchList(2)
+    kmer_search_list.fill(KMERS)
+    asyncio.run(kmer_search_list.parallel_search_count_async(index, 1))
+    assert kmer_search_list.counts().tolist() == [4, 1]
+
+
 def test_read_sequence_from_file(index):
     segment = index.read_sequence_from_file(10, 10)
     assert segment == "TGAAGATAAG"
 
 
+@pytest.mark.parametrize("source", ["file", "cache", "mmap", "memory"])
+def test_read_sequences(index, source):
+    reader_index = dfi.read_index_from_file("./tests/index.awfmi")
+    if source == "cache":
+        reader_index.enable_sequence_cache(block_size=16, max_blocks=2)
+    elif source != "file":
+        reader_index.load_sequence(use_mmap=source == "mmap")
+    starts = [70, 10, 12, 0, len(SEQUENCE) - 4]
+    lengths = [10, 10, 30, 0, 4]
+    sequences, offsets = reader_index.read_sequences(starts, lengths, num_threads=2)
+    assert [
+        bytes(sequences[offsets[i] : offsets[i + 1]]).decode()
+        for i in range(len(starts))
+    ] == [SEQUENCE[start : start + length] for start, length in zip(starts, lengths)]
+    sequences, offsets = reader_index.read_sequences(starts[:3], 5, max_gap=0)
+    assert bytes(sequences).decode() == "".join(SEQUENCE[i : i + 5] for i in starts[:3])
+    with pytest.raises(ValueError):
+        reader_index.read_sequences([len(SEQUENCE) - 4], [5])
+    assert len(reader_index.read_sequences([], [])[0]) == 0
+    if source == "cache":
+        stats = reader_index.sequence_cache_stats
+        assert stats.misses > 0 and stats.hits > 0
+    else:
+        assert reader_index.sequence_cache_stats is None
+
+
+def _count(kmer):
+    return len(_positions(kmer))
+
+
+def _smems(read, min_length):
+    # Substrings of the read that occur and can't be extended either way.
+    return [
+        (i, j - i)
+        for i in range(len(read))
+        for j in range(i + min_length, len(read) + 1)
+        if _count(read[i:j])
+        and not (i > 0 and _count(read[i - 1 : j]))
+        and not (j < len(read) and _count(read[i : j + 1]))
+    ]
+
+
+def _edit_distance(a, b):
+    row = list(range(len(b) + 1))
+    for i, letter in enumerate(a, 1):
+        diagonal, row[0] = row[0], i
+        for j in range(1, len(b) + 1):
+            diagonal, row[j] = (
+                row[j],
+                min(row[j] + 1, row[j - 1] + 1, diagonal + (letter != b[j - 1])),
+            )
+    return row[-1]
+
+
+def _end_aligned_edits(pattern, text):
+    # Fewest edits with the first and last text letters aligned to pattern
+    # letters, pattern letters outside of them deleted.
+    if len(text) == 1:
+        return len(pattern) - (text in pattern)
+    return min(
+        first
+        + (pattern[first] != text[0])
+        + _edit_distance(pattern[first + 1 : last], text[1:-1])
+        + (pattern[last] != text[-1])
+        + len(pattern)
+        - 1
+        - last
+        for first in range(len(pattern))
+        for last in range(first + 1, len(pattern))
+    )
+
+
+def _edited_matches(pattern, max_edits):
+    matches = {}
+    m = len(pattern)
+    for length in range(max(1, m - max_edits), m + max_edits + 1):
+        for j in range(len(SEQUENCE) - length + 1):
+            text = SEQUENCE[j : j + length]
+            errors = _end_aligned_edits(pattern, text)
+            if errors <= max_edits:
+                matches[text] = errors
+    return matches
+
+
+def _reverse_complement(kmer):
+    return kmer[::-1].translate(str.maketrans("ACGTN", "TGCAN"))
+
+
+def _positions(kmer):
+    return [j for j in range(len(SEQUENCE)) if SEQUENCE.startswith(kmer, j)]
+
+
 @pytest.fixture(scope="session")
 def config():
     return dfi.IndexConfiguration(